@@ -1,3 +1,6 @@
+from functools import reduce
+from operator import add
+
 from litex.gen import *
 from litex.soc.interconnect import stream
 
@@ -30,6 +33,18 @@ dct_block_layout:
 block_layout:
             This will create ``dw`` with the name 'data' used in the ``DCT`` module.
 
+tagged_block_layout:
+            Same as ``block_layout`` with the ``component`` of the block (0 for ``y``,
+            1 for ``cb`` and 2 for ``cr``) used in the ``Quantization`` module.
+
+code_layout:
+            This will create ``dw`` with the name 'data' holding a variable length code
+            in its ``length`` LSBs, used in the ``HuffmanEncoder`` module.
+
+word_layout:
+            This will create ``dw`` with the name 'data' holding ``bytes`` bytes of the
+            output stream (first byte in the LSBs), used in the ``BitPacker`` module.
+
 
 
 Saturation of the values in the output of a module.
@@ -59,6 +74,25 @@ saturate :
 
 
 
+Size of the amplitudes:
+=======================
+
+Parameter:
+----------
+i : Signal
+   Magnitude of the amplitude.
+
+o : Signal
+   Gets the size of the amplitude.
+
+size_category :
+           Gives the statements setting ``o`` to the number of bits of ``i``
+           (the SIZE category of the JPEG amplitudes, 0 when ``i`` is 0) with a
+           priority encoder over the bits of ``i``. Used in ``comb`` it is a
+           single level of logic, used in ``sync`` a single register stage.
+
+
+
 Returning the cofficients depending on the  Parameters:
 =======================================================
 
@@ -74,6 +108,49 @@ cw : int
 return : int 
          This will return a value depending on the value of the parameters as ( value* 2**cw )
 
+
+
+Multiplication by a constant without multipliers:
+=================================================
+
+Parameter:
+----------
+
+value : int
+        Constant (positive or negative) by which the input is multiplied.
+
+These helpers allow the fixed coefficients of the datapaths to be realized
+with shifts and adds instead of DSP slices. This includes:
+
+csd :
+      Returns the canonical signed digit representation of ``value`` as a list
+      of (shift, sign) tuples, such as ``value = sum(sign*2**shift)``. No two
+      consecutive digits are non-zero, which gives the minimal number of
+      additions/subtractions.
+
+CSDMultiplier :
+      Multiply ``i`` by ``value`` with an adder tree built from the ``csd``
+      digits. The digits are split in two halves whose partial sums are
+      registered before being added, hence the ``latency`` of 2 clock cycles.
+
+
+
+Breaking the ready path of a stream:
+====================================
+
+Parameter:
+----------
+
+layout : list
+         Layout of the data of the stream.
+
+SkidBuffer :
+      Gives the data of the ``sink`` to the ``source`` and keeps it in a
+      register when the ``source`` is not ready, so ``sink.ready`` is
+      registered and no data is lost. A pipeline whose clock enable is
+      ``~buffer.sink.valid | buffer.sink.ready`` sustains one data per clock
+      cycle under any ``ready`` pattern of the ``source``.
+
 """
 
 def saturate(i, o, minimum, maximum):
@@ -88,10 +165,50 @@ def saturate(i, o, minimum, maximum):
     ]
 
 
+def size_category(i, o):
+    return [o.eq(0)] + [If(i[n], o.eq(n + 1)) for n in range(len(i))]
+
+
 def coef(value, cw=None):
     return int(value * 2**cw) if cw is not None else value
 
 
+def csd(value):
+    digits = []
+    shift = 0
+    while value:
+        if value & 1:
+            # 1 if the next bit is 0, -1 if we are in a run of 1s.
+            sign = 2 - (value & 3)
+            value -= sign
+            digits.append((shift, sign))
+        value >>= 1
+        shift += 1
+    return digits
+
+
+class CSDMultiplier(Module):
+    latency = 2
+
+    def __init__(self, i, o, value):
+        terms = []
+        for shift, sign in csd(value):
+            terms.append((i << shift) if sign > 0 else -(i << shift))
+        half = (len(terms) + 1)//2
+
+        # # #
+
+        # stage 1: partial sums
+        sums = [Signal((len(o), True)) for n in range(2)]
+        self.sync += [
+            sums[0].eq(reduce(add, terms[:half], 0)),
+            sums[1].eq(reduce(add, terms[half:], 0))
+        ]
+
+        # stage 2: final sum
+        self.sync += o.eq(sums[0] + sums[1])
+
+
 def rgb_layout(dw):
     return [("r", dw), ("g", dw), ("b", dw)]
 
@@ -108,3 +225,47 @@ def dct_block_layout(dw,ds):
 
 def block_layout(dw):
     return [("data", dw)]
+
+
+def tagged_block_layout(dw):
+    return [("data", dw), ("component", 2)]
+
+
+def code_layout(dw):
+    return [("data", dw), ("length", bits_for(dw))]
+
+
+def word_layout(dw):
+    return [("data", dw), ("bytes", bits_for(dw//8))]
+
+
+class SkidBuffer(Module):
+    def __init__(self, layout):
+        self.sink = sink = stream.Endpoint(stream.EndpointDescription(layout))
+        self.source = source = stream.Endpoint(stream.EndpointDescription(layout))
+
+        # # #
+
+        skid_valid = Signal()
+        skid_last = Signal()
+        skid_data = Signal(len(sink.payload.raw_bits()))
+
+        self.comb += [
+            sink.ready.eq(~skid_valid),
+            source.valid.eq(sink.valid | skid_valid),
+            If(skid_valid,
+                source.last.eq(skid_last),
+                source.payload.raw_bits().eq(skid_data)
+            ).Else(
+                source.last.eq(sink.last),
+                source.payload.raw_bits().eq(sink.payload.raw_bits())
+            )
+        ]
+        self.sync += \
+            If(source.ready,
+                skid_valid.eq(0)
+            ).Elif(sink.valid & sink.ready,
+                skid_valid.eq(1),
+                skid_last.eq(sink.last),
+                skid_data.eq(sink.payload.raw_bits())
+            )
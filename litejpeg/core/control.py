@@ -0,0 +1,178 @@
+"""
+Control
+=======
+CSRs and interrupt of the LiteJPEGEncoder for the softcore.
+
+The parameters of the frames (size, restart interval and quantization
+tables) are written in CSRs taken by the encoder with the first pixel of
+each frame: the softcore can write the parameters of the next frame while
+the current one is encoded, and is told by the ``frame_done`` event when a
+frame has been given.
+"""
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
+
+from litejpeg.core.common import *
+from litejpeg.core.encoder import LiteJPEGEncoder
+from litejpeg.core.quantization import quant_table, quant_values, \
+                                       chroma_quant_values
+
+
+class LiteJPEGEvents(Module, AutoCSR):
+    """
+    LiteJPEGEvents :
+    ----------------
+    ``frame_done`` event of the LiteJPEGCore, with the ``status``,
+    ``pending`` and ``enable`` CSRs and the ``irq`` of an EventManager.
+
+    The CSRs are named here: the EventManager leaves their names to be
+    extracted from its code, which fails with the recent versions of Python.
+    """
+    def __init__(self):
+        self.irq = Signal()
+        self.submodules.frame_done = frame_done = EventSourcePulse(
+                                                      name="frame_done")
+
+        self.status = CSRStatus(name="status")
+        self.pending = CSRStatus(name="pending", read_only=False)
+        self.enable = CSRStorage(name="enable")
+
+        # # #
+
+        self.comb += [
+            self.status.status.eq(frame_done.status),
+            self.pending.status.eq(frame_done.pending),
+            If(self.pending.re & self.pending.r[0],
+               frame_done.clear.eq(1)),
+            self.irq.eq(self.pending.status & self.enable.storage)
+        ]
+
+
+class LiteJPEGCore(Module, AutoCSR):
+    """
+    LiteJPEGCore :
+    --------------
+    LiteJPEGEncoder giving the JFIF file of each frame (with its headers).
+
+    The parameters are taken from the CSRs with the first pixel of each
+    frame and carried with the frame through the encoder: the pixels of the
+    next frame are taken right after the last pixel of the current one,
+    while its end is still encoded.
+
+    The quantization tables are built with the core, a set per quality of
+    ``qualities``, the frames select one of them with the ``table`` CSR
+    (the JFIF headers and the quantization use fixed ROMs).
+
+    Attributes :
+    ------------
+    sink   : pixels, ``rgb_layout(8)``, in MCU order, with ``last`` on the
+             last pixel of the frame.
+    source : bytes of the JFIF files, ``word_layout(dw)``, with ``last`` on
+             the last word of each file.
+
+    CSRs:
+    -----
+    enable           : the frames are taken when set, clearing it stops the
+                       core after the pixels of the current frame.
+    width            : width of the frames in pixels, a multiple of 8.
+    height           : height of the frames in pixels, a multiple of 8.
+    restart_interval : number of MCUs of the restart intervals, 0 for none.
+    table            : set of quantization tables of the frames, the index
+                       of the quality in ``qualities``.
+    busy             : a frame is being encoded.
+    frame_count      : number of frames given since the reset.
+    byte_count       : number of bytes of the last JFIF file given.
+
+    Events:
+    -------
+    frame_done : the last byte of a JFIF file has been given.
+
+    Parameters :
+    ------------
+    dw : int
+         Width of the words of the output (8, 32 or 64).
+    qualities : list
+         Qualities (1 to 100) of the sets of quantization tables, the
+         tables are ``quant_values`` and ``chroma_quant_values`` scaled
+         with ``quant_table``.
+    """
+    def __init__(self, dw=32, qualities=[50]):
+        tables = [(quant_table(quality, quant_values),
+                   quant_table(quality, chroma_quant_values))
+                  for quality in qualities]
+        self.submodules.encoder = encoder = LiteJPEGEncoder(
+                                                dw, headers=True,
+                                                tables=tables)
+        self.sink = sink = stream.Endpoint(EndpointDescription(rgb_layout(8)))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+
+        self._enable = CSRStorage(name="enable")
+        self._width = CSRStorage(16, name="width")
+        self._height = CSRStorage(16, name="height")
+        self._restart_interval = CSRStorage(16, name="restart_interval")
+        self._table = CSRStorage(len(encoder.table_select), name="table")
+        self._busy = CSRStatus(name="busy")
+        self._frame_count = CSRStatus(32, name="frame_count")
+        self._byte_count = CSRStatus(32, name="byte_count")
+
+        self.submodules.ev = LiteJPEGEvents()
+
+        # # #
+
+        # The encoder takes the parameters with the first pixel of the
+        # frames.
+        self.comb += [
+            encoder.width.eq(self._width.storage),
+            encoder.height.eq(self._height.storage),
+            encoder.restart_interval.eq(self._restart_interval.storage),
+            encoder.table_select.eq(self._table.storage)
+        ]
+
+        # The next pixel starts a frame, only taken when enabled.
+        first = Signal(reset=1)
+        active = Signal()
+        self.comb += [
+            active.eq(~first | self._enable.storage),
+            sink.connect(encoder.sink, omit={"valid", "ready"}),
+            encoder.sink.valid.eq(sink.valid & active),
+            sink.ready.eq(encoder.sink.ready & active),
+            encoder.source.connect(source)
+        ]
+        self.sync += \
+            If(sink.valid & sink.ready,
+               first.eq(sink.last))
+
+        # Frames taken and not given yet.
+        frames = Signal(8)
+        frame_start = Signal()
+        frame_end = Signal()
+        self.comb += [
+            frame_start.eq(sink.valid & sink.ready & first),
+            frame_end.eq(source.valid & source.ready & source.last),
+            self._busy.status.eq(frames != 0)
+        ]
+        self.sync += \
+            If(frame_start & ~frame_end,
+               frames.eq(frames + 1)
+            ).Elif(frame_end & ~frame_start,
+               frames.eq(frames - 1))
+
+        # Bytes of the JFIF file and frames given.
+        byte_count = Signal(32)
+        frame_count = Signal(32)
+        self.sync += \
+            If(source.valid & source.ready,
+               If(source.last,
+                  byte_count.eq(0),
+                  self._byte_count.status.eq(byte_count + source.bytes),
+                  frame_count.eq(frame_count + 1)
+               ).Else(
+                  byte_count.eq(byte_count + source.bytes)))
+        self.comb += [
+            self._frame_count.status.eq(frame_count),
+            self.ev.frame_done.trigger.eq(frame_end)
+        ]
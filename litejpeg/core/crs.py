@@ -144,3 +144,111 @@ class YCbCr422to444(PipelinedActor, Module):
             self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
         for name in ["y", "cb", "cr"]:
             self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+
+
+class YCbCr444to420(Module):
+    """YCbCr 444 to 420
+
+      Input:                      Output:
+      Y00  Y01  Y02  Y03            Y00  Y01  Y02  Y03
+      Y10  Y11  Y12  Y13    -->     Y10  Y11  Y12  Y13
+      (Cb, Cr for each Y)          Cb0011  Cb0213
+                                   Cr0011  Cr0213
+
+    The Y, Cb and Cr planes are given on their own streams (as taken by the
+    MCUScheduler, through a LineBuffer for each plane). The Cb and Cr
+    samples are the means of 2x2 pixels: the horizontal sums of the even
+    lines are kept in a line memory and added to the ones of the odd lines,
+    a Cb and a Cr sample being given with the odd pixel of each odd line,
+    so each chroma plane has a quarter of the samples of the luma one.
+
+    The pixels are given in raster order, ``last`` on the last pixel of the
+    frame, the width and the height of the frame are even. The planes are
+    given in raster order, ``last`` on the last sample of the frame.
+    """
+    def __init__(self, dw=8, width=64):
+        assert width % 2 == 0
+        self.sink = sink = stream.Endpoint(EndpointDescription(ycbcr444_layout(dw)))
+        self.source_y = source_y = stream.Endpoint(EndpointDescription(block_layout(dw)))
+        self.source_cb = source_cb = stream.Endpoint(EndpointDescription(block_layout(dw)))
+        self.source_cr = source_cr = stream.Endpoint(EndpointDescription(block_layout(dw)))
+
+        # # #
+
+        # position in the frame
+        x = Signal(max=width)
+        line = Signal()
+        self.sync += \
+            If(sink.valid & sink.ready,
+                If(sink.last,
+                    x.eq(0),
+                    line.eq(0)
+                ).Elif(x == width - 1,
+                    x.eq(0),
+                    line.eq(~line)
+                ).Else(
+                    x.eq(x + 1)
+                )
+            )
+
+        # chroma of the even pixel, waiting for the odd one
+        held_cb = Signal(dw)
+        held_cr = Signal(dw)
+        self.sync += \
+            If(sink.valid & sink.ready & ~x[0],
+                held_cb.eq(sink.cb),
+                held_cr.eq(sink.cr)
+            )
+
+        # horizontal sums, the ones of the even lines are kept in the
+        # line memory for the odd lines.
+        cb_sum = Signal(dw+1)
+        cr_sum = Signal(dw+1)
+        self.comb += [
+            cb_sum.eq(held_cb + sink.cb),
+            cr_sum.eq(held_cr + sink.cr)
+        ]
+
+        mem = Memory(2*(dw+1), width//2)
+        write_port = mem.get_port(write_capable=True)
+        read_port = mem.get_port(async_read=True)
+        self.specials += mem, write_port, read_port
+
+        cb_mean = Signal(dw)
+        cr_mean = Signal(dw)
+        self.comb += [
+            write_port.adr.eq(x[1:]),
+            write_port.dat_w.eq(Cat(cb_sum, cr_sum)),
+            write_port.we.eq(sink.valid & sink.ready & x[0] & ~line),
+
+            read_port.adr.eq(x[1:]),
+            cb_mean.eq((read_port.dat_r[:dw+1] + cb_sum + 2) >> 2),
+            cr_mean.eq((read_port.dat_r[dw+1:] + cr_sum + 2) >> 2)
+        ]
+
+        # output: a register per plane, the pixel is taken when the
+        # registers of its samples are free.
+        chroma = Signal()
+        self.comb += [
+            chroma.eq(line & x[0]),
+            sink.ready.eq((~source_y.valid | source_y.ready) &
+                          (~chroma |
+                           ((~source_cb.valid | source_cb.ready) &
+                            (~source_cr.valid | source_cr.ready))))
+        ]
+        for source in [source_y, source_cb, source_cr]:
+            self.sync += If(source.ready, source.valid.eq(0))
+        self.sync += \
+            If(sink.valid & sink.ready,
+                source_y.valid.eq(1),
+                source_y.data.eq(sink.y),
+                source_y.last.eq(sink.last),
+                If(chroma,
+                    source_cb.valid.eq(1),
+                    source_cb.data.eq(cb_mean),
+                    source_cb.last.eq(sink.last),
+                    source_cr.valid.eq(1),
+                    source_cr.data.eq(cr_mean),
+                    source_cr.last.eq(sink.last)
+                )
+            )
@@ -19,14 +19,23 @@ from litejpeg.core.common import *
 """
 
 
-def rgb2ycbcr_coefs(dw, cw=None):
+def rgb2ycbcr_coefs(dw, cw=None, jfif=False):
     # return : The value of various constants required for the modules below.
+    # With jfif, the full range YCbCr of JFIF (BT.601 without offset on Y)
+    # expected by the JPEG decoders.
+    if jfif:
+        ca, cb = 0.299, 0.114
+        cc, cd = 0.5/(1 - cb), 0.5/(1 - ca)
+        yoffset = 0
+    else:
+        ca, cb, cc, cd = 0.1819, 0.0618, 0.6495, 0.5512
+        yoffset = 2**(dw-4)
     return {
-        "ca" : coef(0.1819, cw),
-        "cb" : coef(0.0618, cw),
-        "cc" : coef(0.6495, cw),
-        "cd" : coef(0.5512, cw),
-        "yoffset" : 2**(dw-4),
+        "ca" : coef(ca, cw),
+        "cb" : coef(cb, cw),
+        "cc" : coef(cc, cw),
+        "cd" : coef(cd, cw),
+        "yoffset" : yoffset,
         "coffset" : 2**(dw-1),
         "ymax" : 2**dw-1,
         "cmax" : 2**dw-1,
@@ -57,20 +66,33 @@ class RGB2YCbCrDatapath(Module):
     -------
     y, cb and cr : each an 8 bit number formed from the r,g and b component obtained as input.
 
+    Parameters:
+    -----------
+    csd : bool
+          Realize the constant multiplications with CSDMultiplier shift/add trees
+          instead of multipliers. Each of the two multiplication stages then
+          takes CSDMultiplier.latency clock cycles, which is reflected in ``latency``.
+    jfif : bool
+          Give the full range YCbCr of JFIF instead of the one of XAPP930
+          (see rgb2ycbcr_coefs).
+
     """
-    def __init__(self, rgb_w, ycbcr_w, coef_w):
+    def __init__(self, rgb_w, ycbcr_w, coef_w, csd=False, jfif=False):
         self.sink = sink = Record(rgb_layout(rgb_w))
         self.source = source = Record(ycbcr444_layout(ycbcr_w))
 
+        mult_latency = CSDMultiplier.latency if csd else 1
+        self.latency = datapath_latency + 2*(mult_latency - 1)
+
         # # #
 
-        coefs = rgb2ycbcr_coefs(ycbcr_w, coef_w)
+        coefs = rgb2ycbcr_coefs(ycbcr_w, coef_w, jfif)
 
         # Since the output doesn't come in a single clock cycle. Hence there is a need of
-        # providing delay in the output which is determined by datapath_latency of the
+        # providing delay in the output which is determined by the latency of the
         # module and provided as below:
         rgb_delayed = [sink]
-        for i in range(datapath_latency):
+        for i in range(self.latency):
             rgb_n = Record(rgb_layout(rgb_w))
             for name in ["r", "g", "b"]:
                 self.sync += getattr(rgb_n, name).eq(getattr(rgb_delayed[-1], name))
@@ -95,10 +117,16 @@ class RGB2YCbCrDatapath(Module):
         # ca*(r-g) & cb*(b-g)
         ca_mult_rg = Signal((rgb_w + coef_w + 1, True))
         cb_mult_bg = Signal((rgb_w + coef_w + 1, True))
-        self.sync += [
-            ca_mult_rg.eq(r_minus_g * coefs["ca"]),
-            cb_mult_bg.eq(b_minus_g * coefs["cb"])
-        ]
+        if csd:
+            self.submodules += [
+                CSDMultiplier(r_minus_g, ca_mult_rg, coefs["ca"]),
+                CSDMultiplier(b_minus_g, cb_mult_bg, coefs["cb"])
+            ]
+        else:
+            self.sync += [
+                ca_mult_rg.eq(r_minus_g * coefs["ca"]),
+                cb_mult_bg.eq(b_minus_g * coefs["cb"])
+            ]
 
         # stage 3
         # ca*(r-g) + cb*(b-g)
@@ -111,7 +139,7 @@ class RGB2YCbCrDatapath(Module):
         # yraw = ca*(r-g) + cb*(b-g) + g
         yraw = Signal((rgb_w + 3, True))
         self.sync += [
-            yraw.eq(carg_plus_cbbg[coef_w:] + rgb_delayed[3].g)
+            yraw.eq(carg_plus_cbbg[coef_w:] + rgb_delayed[2 + mult_latency].g)
         ]
 
         # stage 5
@@ -119,11 +147,11 @@ class RGB2YCbCrDatapath(Module):
         # b - yraw
         b_minus_yraw = Signal((rgb_w + 4, True))
         r_minus_yraw = Signal((rgb_w + 4, True))
-        yraw_r0 = Signal((rgb_w + 3, True))
+        yraw_delayed = [Signal((rgb_w + 3, True))]
         self.sync += [
-            b_minus_yraw.eq(rgb_delayed[4].b - yraw),
-            r_minus_yraw.eq(rgb_delayed[4].r - yraw),
-            yraw_r0.eq(yraw)
+            b_minus_yraw.eq(rgb_delayed[3 + mult_latency].b - yraw),
+            r_minus_yraw.eq(rgb_delayed[3 + mult_latency].r - yraw),
+            yraw_delayed[0].eq(yraw)
         ]
 
         # stage 6
@@ -131,12 +159,20 @@ class RGB2YCbCrDatapath(Module):
         # cd*yraw
         cc_mult_ryraw = Signal((rgb_w + coef_w + 4, True))
         cd_mult_byraw = Signal((rgb_w + coef_w + 4, True))
-        yraw_r1 = Signal((rgb_w + 3, True))
-        self.sync += [
-            cc_mult_ryraw.eq(b_minus_yraw * coefs["cc"]),
-            cd_mult_byraw.eq(r_minus_yraw * coefs["cd"]),
-            yraw_r1.eq(yraw_r0)
-        ]
+        if csd:
+            self.submodules += [
+                CSDMultiplier(b_minus_yraw, cc_mult_ryraw, coefs["cc"]),
+                CSDMultiplier(r_minus_yraw, cd_mult_byraw, coefs["cd"])
+            ]
+        else:
+            self.sync += [
+                cc_mult_ryraw.eq(b_minus_yraw * coefs["cc"]),
+                cd_mult_byraw.eq(r_minus_yraw * coefs["cd"])
+            ]
+        for i in range(mult_latency):
+            yraw_n = Signal((rgb_w + 3, True))
+            self.sync += yraw_n.eq(yraw_delayed[-1])
+            yraw_delayed.append(yraw_n)
 
         # stage 7
         # y = (yraw + yoffset)
@@ -146,7 +182,7 @@ class RGB2YCbCrDatapath(Module):
         cb = Signal((rgb_w + 4, True))
         cr = Signal((rgb_w + 4, True))
         self.sync += [
-            y.eq(yraw_r1 + coefs["yoffset"]),
+            y.eq(yraw_delayed[-1] + coefs["yoffset"]),
             cb.eq(cc_mult_ryraw[coef_w:] + coefs["coffset"]),
             cr.eq(cd_mult_byraw[coef_w:] + coefs["coffset"])
         ]
@@ -167,28 +203,48 @@ class RGB2YCbCr(PipelinedActor, Module):
     This will take the input in the form required for the RGB2YCbCr module and 
     recieve the output from the module and convert it in the required format.
 
+    Parameters:
+    -----------
+    lanes : int
+            Number of pixels converted on each beat. One RGB2YCbCrDatapath is
+            instantiated per lane, all of them sharing the ``pipe_ce`` of the
+            module. Each field of the sink and source is ``lanes`` times wider
+            than for a single pixel, lane ``i`` being stored in bits
+            ``[i*w:(i+1)*w]`` of the field (lane 0 in the LSBs).
+
+    csd : bool
+          Use shift/add trees instead of multipliers in the datapaths
+          (see RGB2YCbCrDatapath).
+
+    jfif : bool
+          Give the full range YCbCr of JFIF (see RGB2YCbCrDatapath).
+
     """
-    def __init__(self, rgb_w=8, ycbcr_w=8, coef_w=8):
+    def __init__(self, rgb_w=8, ycbcr_w=8, coef_w=8, lanes=1, csd=False,
+                 jfif=False):
 
         # Providing the link between the module and input and output.
-        self.sink = sink = stream.Endpoint(EndpointDescription(rgb_layout(rgb_w)))
-        self.source = source = stream.Endpoint(EndpointDescription(ycbcr444_layout(ycbcr_w)))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
+        self.sink = sink = stream.Endpoint(EndpointDescription(rgb_layout(rgb_w*lanes)))
+        self.source = source = stream.Endpoint(EndpointDescription(ycbcr444_layout(ycbcr_w*lanes)))
 
         # # #
 
-    
-        # Connecting the datapath with the input and output.
-        self.submodules.datapath = RGB2YCbCrDatapath(rgb_w, ycbcr_w, coef_w)
-        
-        # Providing input and output to the datapath.
-        self.comb += self.datapath.ce.eq(self.pipe_ce)
-        for name in ["r", "g", "b"]:
-            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
-        for name in ["y", "cb", "cr"]:
-            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        # Connecting the datapath of each lane with the input and output.
+        self.datapaths = [RGB2YCbCrDatapath(rgb_w, ycbcr_w, coef_w, csd, jfif)
+                          for i in range(lanes)]
+        self.submodules += self.datapaths
+        PipelinedActor.__init__(self, self.datapaths[0].latency)
+        self.latency = self.datapaths[0].latency
 
+        for i, datapath in enumerate(self.datapaths):
+            # Providing input and output to the datapath.
+            self.comb += datapath.ce.eq(self.pipe_ce)
+            for name in ["r", "g", "b"]:
+                self.comb += getattr(datapath.sink, name).eq(
+                    getattr(sink, name)[i*rgb_w:(i+1)*rgb_w])
+            for name in ["y", "cb", "cr"]:
+                self.comb += getattr(source, name)[i*ycbcr_w:(i+1)*ycbcr_w].eq(
+                    getattr(datapath.source, name))
 
 
 def ycbcr2rgb_coefs(dw, cw=None):
@@ -235,20 +291,30 @@ class YCbCr2RGBDatapath(Module):
     -------
     r, g and b : each an 8 bit number formed from the r,g and b component obtained as input.
 
+    Parameters:
+    -----------
+    csd : bool
+          Realize the constant multiplications with CSDMultiplier shift/add trees
+          instead of multipliers. The multiplication stage then takes
+          CSDMultiplier.latency clock cycles, which is reflected in ``latency``.
+
     """
-    def __init__(self, ycbcr_w, rgb_w, coef_w):
+    def __init__(self, ycbcr_w, rgb_w, coef_w, csd=False):
         self.sink = sink = Record(ycbcr444_layout(ycbcr_w))
         self.source = source = Record(rgb_layout(rgb_w))
 
+        mult_latency = CSDMultiplier.latency if csd else 1
+        self.latency = datapath_latency + mult_latency - 1
+
         # # #
 
         coefs = ycbcr2rgb_coefs(rgb_w, coef_w)
 
         # Since the output doesn't come in a single clock cycle. Hence there is a need of
-        # providing delay in the output which is determined by datapath_latency of the
+        # providing delay in the output which is determined by the latency of the
         # module and provided as below:
         ycbcr_delayed = [sink]
-        for i in range(datapath_latency):
+        for i in range(self.latency):
             ycbcr_n = Record(ycbcr444_layout(ycbcr_w))
             for name in ["y", "cb", "cr"]:
                 self.sync += getattr(ycbcr_n, name).eq(getattr(ycbcr_delayed[-1], name))
@@ -280,13 +346,21 @@ class YCbCr2RGBDatapath(Module):
         cb_minus_coffset_mult_bcoef = Signal((ycbcr_w + coef_w + 4, True))
         cr_minus_coffset_mult_ccoef = Signal((ycbcr_w + coef_w + 4, True))
         cb_minus_coffset_mult_dcoef = Signal((ycbcr_w + coef_w + 4, True))
-        self.sync += [
-            y_minus_yoffset.eq(ycbcr_delayed[1].y - coefs["yoffset"]),
-            cr_minus_coffset_mult_acoef.eq(cr_minus_coffset * coefs["acoef"]),
-            cb_minus_coffset_mult_bcoef.eq(cb_minus_coffset * coefs["bcoef"]),
-            cr_minus_coffset_mult_ccoef.eq(cr_minus_coffset * coefs["ccoef"]),
-            cb_minus_coffset_mult_dcoef.eq(cb_minus_coffset * coefs["dcoef"])
-        ]
+        self.sync += y_minus_yoffset.eq(ycbcr_delayed[mult_latency].y - coefs["yoffset"])
+        if csd:
+            self.submodules += [
+                CSDMultiplier(cr_minus_coffset, cr_minus_coffset_mult_acoef, coefs["acoef"]),
+                CSDMultiplier(cb_minus_coffset, cb_minus_coffset_mult_bcoef, coefs["bcoef"]),
+                CSDMultiplier(cr_minus_coffset, cr_minus_coffset_mult_ccoef, coefs["ccoef"]),
+                CSDMultiplier(cb_minus_coffset, cb_minus_coffset_mult_dcoef, coefs["dcoef"])
+            ]
+        else:
+            self.sync += [
+                cr_minus_coffset_mult_acoef.eq(cr_minus_coffset * coefs["acoef"]),
+                cb_minus_coffset_mult_bcoef.eq(cb_minus_coffset * coefs["bcoef"]),
+                cr_minus_coffset_mult_ccoef.eq(cr_minus_coffset * coefs["ccoef"]),
+                cb_minus_coffset_mult_dcoef.eq(cb_minus_coffset * coefs["dcoef"])
+            ]
 
         # stage 3
         # line addition for all component
@@ -315,19 +389,25 @@ class YCbCr2RGB(PipelinedActor, Module):
     This will take the input in the form required for the YCbCr2RGB module and 
     recieve the output from the module and convert it in the required format.
 
+    Parameters:
+    -----------
+    csd : bool
+          Use shift/add trees instead of multipliers in the datapath
+          (see YCbCr2RGBDatapath).
+
     """
-    def __init__(self, ycbcr_w=8, rgb_w=8, coef_w=8):
+    def __init__(self, ycbcr_w=8, rgb_w=8, coef_w=8, csd=False):
         
         # Providing the link between the module and input and output.
         self.sink = sink = stream.Endpoint(EndpointDescription(ycbcr444_layout(ycbcr_w)))
         self.source = source = stream.Endpoint(EndpointDescription(rgb_layout(rgb_w)))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
 
         # # #
 
         # Connecting the datapath with the input and output.
-        self.submodules.datapath = YCbCr2RGBDatapath(ycbcr_w, rgb_w, coef_w)
+        self.submodules.datapath = YCbCr2RGBDatapath(ycbcr_w, rgb_w, coef_w, csd)
+        PipelinedActor.__init__(self, self.datapath.latency)
+        self.latency = self.datapath.latency
 
         # Providing input and output to the datapath.
         self.comb += self.datapath.ce.eq(self.pipe_ce)
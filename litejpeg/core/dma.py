@@ -0,0 +1,411 @@
+"""
+DMA
+===
+Moves the output of the encoder to the system memory through a Wishbone
+master, so that the softcore (or a DMA reading the memory) gets the frames
+without polling a stream.
+"""
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import wishbone
+
+from litejpeg.core.common import *
+
+
+class JPEGDMAWriter(Module, AutoCSR):
+    """
+    JPEGDMAWriter :
+    ---------------
+    The bytes of the frames are packed in words of the width of the bus
+    (the partial words of the stream, as the markers, are merged with the
+    next ones) and written one after another in a ring buffer, each frame
+    starting on a new word (the last word of a frame is padded with 0).
+
+    The words go through a FIFO and are written by incrementing bursts of
+    ``burst`` words, or less at the end of a frame or of the ring buffer,
+    so the writer takes a word per clock cycle as long as the memory acks a
+    word per clock cycle (the worst case output of the encoder, the
+    BitPacker giving at most a word per clock cycle).
+
+    The ring buffer is not protected against overwriting: the frames are
+    to be taken by the softcore before the writer comes back over them.
+
+    Attributes :
+    ------------
+    sink : bytes of the frames, ``word_layout(dw)``, with ``last`` on the
+           last word of each frame.
+    bus  : Wishbone master, ``dw`` bits.
+
+    CSRs:
+    -----
+    base         : byte address of the ring buffer (aligned on a word).
+    length       : length of the ring buffer in bytes (a multiple of the
+                   word).
+    enable       : the writer takes the frames, the ring buffer is written
+                   from its start when set (``base`` and ``length`` are
+                   to be changed when not set).
+    offset       : offset in bytes of the next word written in the ring
+                   buffer (the previous words are in the memory).
+    frame_length : length in bytes of the last frame written in the memory.
+    frame_count  : number of frames written in the memory since ``enable``.
+
+    Parameters :
+    ------------
+    dw : int
+         Width of the words of the stream and of the bus.
+    burst : int
+            Maximum number of words of a burst.
+    fifo_depth : int
+                 Depth of the FIFO of words to write.
+    """
+    def __init__(self, dw=32, burst=8, fifo_depth=64):
+        assert fifo_depth >= burst
+        self.sink = sink = stream.Endpoint(
+                               EndpointDescription(word_layout(dw)))
+        self.bus = bus = wishbone.Interface(dw)
+
+        self._base = CSRStorage(32, name="base")
+        self._length = CSRStorage(32, name="length")
+        self._enable = CSRStorage(name="enable")
+        self._offset = CSRStatus(32, name="offset")
+        self._frame_length = CSRStatus(32, name="frame_length")
+        self._frame_count = CSRStatus(32, name="frame_count")
+
+        # # #
+
+        word_bytes = dw//8
+        shift = log2_int(word_bytes)
+        enable = self._enable.storage
+
+        # Words to write, and the length of the frames until their last
+        # word is written.
+        fifo = stream.SyncFIFO([("data", dw)], fifo_depth)
+        lengths = stream.SyncFIFO([("length", 32)], 4)
+        self.submodules += fifo, lengths
+
+        # Packing the bytes, ``held`` has the ``level`` first bytes of the
+        # next word. With ``flush``, the held bytes end the frame in a
+        # word of their own.
+        held = Signal(dw)
+        level = Signal(max=word_bytes)
+        flush = Signal()
+
+        data = Signal(dw)
+        merged = Signal(2*dw)
+        total = Signal(max=2*word_bytes)
+        self.comb += [
+            Case(sink.bytes, {n: data.eq(sink.data[0:8*n])
+                              for n in range(1, word_bytes + 1)}),
+            Case(level, {n: merged.eq(held | (data << 8*n))
+                         for n in range(word_bytes)}),
+            total.eq(level + sink.bytes)
+        ]
+
+        frame_bytes = Signal(32)
+        accept = Signal()
+        self.comb += [
+            accept.eq(sink.valid & sink.ready),
+            sink.ready.eq(enable & ~flush & fifo.sink.ready &
+                          lengths.sink.ready),
+            If(flush,
+               fifo.sink.valid.eq(1),
+               fifo.sink.data.eq(held),
+               fifo.sink.last.eq(1)
+            ).Else(
+               fifo.sink.valid.eq(accept &
+                                  ((total >= word_bytes) | sink.last)),
+               fifo.sink.data.eq(merged[0:dw]),
+               fifo.sink.last.eq(sink.last & (total <= word_bytes))),
+            lengths.sink.valid.eq(accept & sink.last),
+            lengths.sink.length.eq(frame_bytes + sink.bytes)
+        ]
+        self.sync += [
+            If(flush,
+               If(fifo.sink.ready,
+                  held.eq(0),
+                  level.eq(0),
+                  flush.eq(0))
+            ).Elif(accept,
+               If(sink.last,
+                  If(total > word_bytes,
+                     held.eq(merged[dw:2*dw]),
+                     flush.eq(1)
+                  ).Else(
+                     held.eq(0),
+                     level.eq(0))
+               ).Elif(total >= word_bytes,
+                  held.eq(merged[dw:2*dw]),
+                  level.eq(total - word_bytes)
+               ).Else(
+                  held.eq(merged[0:dw]),
+                  level.eq(total))),
+            If(accept,
+               If(sink.last,
+                  frame_bytes.eq(0)
+               ).Else(
+                  frame_bytes.eq(frame_bytes + sink.bytes)))
+        ]
+
+        # Words and ends of frames in the FIFO.
+        words = Signal(max=fifo_depth + 1)
+        frames = Signal(max=fifo_depth + 1)
+        push = Signal()
+        pop = Signal()
+        self.comb += [
+            push.eq(fifo.sink.valid & fifo.sink.ready),
+            pop.eq(fifo.source.valid & fifo.source.ready)
+        ]
+        self.sync += [
+            words.eq(words + push - pop),
+            frames.eq(frames + (push & fifo.sink.last) -
+                      (pop & fifo.source.last))
+        ]
+
+        # Writing the words by bursts, the next burst starts right after
+        # the last word of a burst when its words are in the FIFO.
+        offset = Signal(32 - shift)
+        next_offset = Signal(32 - shift)
+        ring_words = Signal(32 - shift)
+        to_end = Signal(32 - shift)
+        available = Signal(max=fifo_depth + 1)
+        start = Signal()
+        burst_last = Signal(max=burst)
+        count = Signal(max=burst)
+        last_word = Signal(max=burst)
+        frame_count = Signal(32)
+        self.comb += [
+            ring_words.eq(self._length.storage[shift:]),
+            If(pop,
+               If(offset == ring_words - 1,
+                  next_offset.eq(0)
+               ).Else(
+                  next_offset.eq(offset + 1))
+            ).Else(
+               next_offset.eq(offset)),
+            to_end.eq(ring_words - next_offset),
+            available.eq(words - pop),
+            start.eq(enable &
+                     ((available >= burst) |
+                      ((available != 0) &
+                       (frames != (pop & fifo.source.last))))),
+            If((available < burst) & (available < to_end),
+               burst_last.eq(available - 1)
+            ).Elif(to_end < burst,
+               burst_last.eq(to_end - 1)
+            ).Else(
+               burst_last.eq(burst - 1)),
+            self._offset.status.eq(offset << shift),
+            self._frame_count.status.eq(frame_count)
+        ]
+        self.sync += \
+            If(~enable,
+               offset.eq(0)
+            ).Else(
+               offset.eq(next_offset))
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(start,
+               NextValue(count, 0),
+               NextValue(last_word, burst_last),
+               NextState("WRITE"))
+        )
+        fsm.act("WRITE",
+            bus.cyc.eq(1),
+            bus.stb.eq(1),
+            bus.we.eq(1),
+            bus.sel.eq(2**word_bytes - 1),
+            bus.adr.eq(self._base.storage[shift:] + offset),
+            bus.dat_w.eq(fifo.source.data),
+            If(count == last_word,
+               bus.cti.eq(wishbone.CTI_BURST_END)
+            ).Else(
+               bus.cti.eq(wishbone.CTI_BURST_INCREMENTING)),
+            bus.bte.eq(0),
+            fifo.source.ready.eq(bus.ack),
+            If(bus.ack,
+               NextValue(count, count + 1),
+               If(count == last_word,
+                  If(start,
+                     NextValue(count, 0),
+                     NextValue(last_word, burst_last)
+                  ).Else(
+                     NextState("IDLE"))))
+        )
+
+        # The length of a frame is given when its last word is written.
+        self.comb += lengths.source.ready.eq(pop & fifo.source.last)
+        self.sync += [
+            If(lengths.source.valid & lengths.source.ready,
+               self._frame_length.status.eq(lengths.source.length),
+               frame_count.eq(frame_count + 1)),
+            If(~enable,
+               frame_count.eq(0))
+        ]
+
+
+class JPEGDMAReader(Module, AutoCSR):
+    """
+    JPEGDMAReader :
+    ---------------
+    Reads a frame of pixels of 32 bits (the components in the 3 first
+    bytes, first component in the LSBs) from the system memory through a
+    Wishbone master and gives them in MCU order, as taken by the
+    LiteJPEGEncoder: the 64 pixels of a 8x8 block in raster order, then the
+    next block. A line of a block is read by an incrementing burst of 8
+    words at the address of the line, ``stride`` bytes after the previous
+    one, so a frame can be read from a larger buffer.
+
+    The words go through a FIFO, a burst being only started when the FIFO
+    has room for its words, so the reader gives a pixel per clock cycle as
+    long as the memory acks a word per clock cycle.
+
+    Attributes :
+    ------------
+    source : pixels, ``rgb_layout(8)`` (or ``ycbcr444_layout(8)`` with
+             ``ycbcr``), with ``last`` on the last pixel of the frame.
+    bus    : Wishbone master, 32 bits.
+
+    CSRs:
+    -----
+    base   : byte address of the first pixel of the frame (aligned on a
+             word).
+    stride : bytes from a line of the frame to the next one.
+    width  : width of the frame in pixels, a multiple of 8.
+    height : height of the frame in pixels, a multiple of 8.
+    start  : write to read a frame.
+    busy   : a frame is being read.
+
+    Parameters :
+    ------------
+    ycbcr : bool
+            The pixels are in YCbCr (``y`` in the LSBs) instead of RGB
+            (``r`` in the LSBs).
+    fifo_depth : int
+                 Depth of the FIFO of pixels read.
+    """
+    def __init__(self, ycbcr=False, fifo_depth=32):
+        assert fifo_depth >= 8
+        if ycbcr:
+            components = ["y", "cb", "cr"]
+            source_layout = ycbcr444_layout(8)
+        else:
+            components = ["r", "g", "b"]
+            source_layout = rgb_layout(8)
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(source_layout))
+        self.bus = bus = wishbone.Interface(32)
+
+        self._base = CSRStorage(32, name="base")
+        self._stride = CSRStorage(32, name="stride")
+        self._width = CSRStorage(16, name="width")
+        self._height = CSRStorage(16, name="height")
+        self._start = CSR(name="start")
+        self._busy = CSRStatus(name="busy")
+
+        # # #
+
+        fifo = stream.SyncFIFO([("data", 24)], fifo_depth)
+        self.submodules += fifo
+        self.comb += [
+            source.valid.eq(fifo.source.valid),
+            source.last.eq(fifo.source.last),
+            [getattr(source, name).eq(fifo.source.data[8*i:8*(i+1)])
+             for i, name in enumerate(components)],
+            fifo.source.ready.eq(source.ready)
+        ]
+
+        # Words of the FIFO and of the burst being read.
+        reserved = Signal(max=fifo_depth + 1)
+        reserve = Signal()
+        room = Signal()
+        pop = Signal()
+        self.comb += [
+            pop.eq(fifo.source.valid & fifo.source.ready),
+            room.eq(reserved - pop <= fifo_depth - 8)
+        ]
+        self.sync += reserved.eq(reserved + Mux(reserve, 8, 0) - pop)
+
+        # Position in the frame: block (bx, by), line y of the block and
+        # word x of the line. ``address`` is the address of the line,
+        # ``block_address`` of the first line of the block and
+        # ``row_address`` of the first line of the row of blocks.
+        bx = Signal(13)
+        by = Signal(13)
+        y = Signal(3)
+        x = Signal(3)
+        address = Signal(32)
+        block_address = Signal(32)
+        row_address = Signal(32)
+        stride = self._stride.storage
+        last_bx = Signal()
+        last_by = Signal()
+        done = Signal()
+        self.comb += [
+            last_bx.eq(bx == self._width.storage[3:] - 1),
+            last_by.eq(by == self._height.storage[3:] - 1),
+            done.eq((y == 7) & last_bx & last_by)
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(self._start.re,
+               NextValue(bx, 0),
+               NextValue(by, 0),
+               NextValue(y, 0),
+               NextValue(address, self._base.storage),
+               NextValue(block_address, self._base.storage),
+               NextValue(row_address, self._base.storage),
+               NextState("WAIT"))
+        )
+        fsm.act("WAIT",
+            If(room,
+               reserve.eq(1),
+               NextValue(x, 0),
+               NextState("READ"))
+        )
+        fsm.act("READ",
+            bus.cyc.eq(1),
+            bus.stb.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(0xf),
+            bus.adr.eq(address[2:] + x),
+            If(x == 7,
+               bus.cti.eq(wishbone.CTI_BURST_END)
+            ).Else(
+               bus.cti.eq(wishbone.CTI_BURST_INCREMENTING)),
+            bus.bte.eq(0),
+            fifo.sink.valid.eq(bus.ack),
+            fifo.sink.data.eq(bus.dat_r[0:24]),
+            fifo.sink.last.eq(done & (x == 7)),
+            If(bus.ack,
+               NextValue(x, x + 1),
+               If(x == 7,
+                  # Next line of the block, or first line of the next
+                  # block.
+                  If(y != 7,
+                     NextValue(y, y + 1),
+                     NextValue(address, address + stride)
+                  ).Elif(~last_bx,
+                     NextValue(y, 0),
+                     NextValue(bx, bx + 1),
+                     NextValue(block_address, block_address + 32),
+                     NextValue(address, block_address + 32)
+                  ).Else(
+                     NextValue(y, 0),
+                     NextValue(bx, 0),
+                     NextValue(by, by + 1),
+                     NextValue(row_address, row_address + (stride << 3)),
+                     NextValue(block_address, row_address + (stride << 3)),
+                     NextValue(address, row_address + (stride << 3))),
+                  If(done,
+                     NextState("IDLE")
+                  ).Elif(room,
+                     reserve.eq(1),
+                     NextValue(x, 0)
+                  ).Else(
+                     NextState("WAIT"))))
+        )
+        self.comb += self._busy.status.eq(~fsm.ongoing("IDLE"))
@@ -0,0 +1,569 @@
+"""
+LiteJPEG Encoder
+================
+Chains the stages of the encoder, from the pixels to the bytes of the
+entropy coded segment:
+
+    RGB2YCbCr -> SerialDCT -> QuantZigZag -> RLEMain -> HuffmanEncoder
+                 (one pipeline per component)                |
+                                                             v
+                                 code FIFOs -> BitPacker -> RestartStitcher
+                                                                     |
+                                                                     v
+                                                                 JFIFHeader
+
+The pixels are given in MCU order (the 64 pixels of a 8x8 block in raster
+order, then the next block) with ``last`` on the last pixel of the frame.
+The blocks are encoded in 4:4:4, each MCU is a Y, a Cb and a Cr block and
+the output is the entropy coded segment of an interleaved scan. The DC
+coefficients of the first MCU of each frame are predicted from 0. The
+pixels are converted to the full range YCbCr of JFIF, with ``ycbcr`` they
+are given in this YCbCr and RGB2YCbCr is left out.
+
+Restart intervals:
+------------------
+With a ``restart_interval`` of N MCUs, the DC coefficients of the first MCU
+of each interval are predicted from 0, the bits of the last MCU of each
+interval are padded to a byte boundary and the RST0 to RST7 markers are
+inserted between the intervals (the headers need a DRI marker with the same
+interval). The intervals can then be decoded independently.
+
+With ``headers``, the output is a complete JFIF file for each frame: the
+headers (with the size of the frame given by ``width`` and ``height``) are
+given before the entropy coded segment, while the first MCU is encoded, and
+the EOI marker after it.
+
+Throughput:
+-----------
+Each component pipeline takes one sample per clock cycle, the SerialDCT
+writing a block while computing the previous one, so the pixels are taken
+at one per clock cycle. The Huffman codes are gathered in a FIFO per
+component (the entries without a code are dropped) before being merged,
+one code per clock cycle is packed: the pixels are taken at one per clock
+cycle as long as the MCUs have less than 64 codes on average, at 64/c pixel
+per clock cycle on MCUs of c codes once the FIFOs are full otherwise. The
+worst case (no zero coefficient) is 1/3 pixel per clock cycle.
+
+Over a frame, the time to encode the last pixels after they are taken (the
+latency of the pipelines and of the codes left in the FIFOs, about 200
+clock cycles) is added: the 32x32 frame of encoder_tb is taken at one pixel
+per clock cycle and encoded at 0.82 pixel per clock cycle. The pixels of the
+next frame are taken while the end of the current one is encoded, the
+latency is only added once over frames given one after another.
+"""
+
+from functools import reduce
+from operator import and_
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import RGB2YCbCr
+from litejpeg.core.new_dct6 import SerialDCT
+from litejpeg.core.quantization import QuantZigZag, quant_values, \
+                                       chroma_quant_values
+from litejpeg.core.rle.rlemain import RLEMain
+from litejpeg.core.rle.huffman import HuffmanEncoder
+from litejpeg.core.rle.bitpacker import BitPacker
+from litejpeg.core.header import JFIFHeader
+
+
+class LiteJPEGEncoder(Module):
+    """
+    Attributes :
+    ------------
+    sink   : pixels, ``rgb_layout(8)`` (``ycbcr444_layout(8)`` with
+             ``ycbcr``).
+    source : bytes of the entropy coded segment, ``word_layout(dw)``, with
+             ``last`` on the last word of the frame.
+    restart_interval : Number of MCUs of the restart intervals, 0 for no
+                       restart marker.
+    width, height : With ``headers``, size of the frames in pixels.
+    table_select : Set of quantization tables of the frames.
+
+    The parameters are taken with the first pixel of each frame and carried
+    with the frame through the pipeline: the next frame can be given right
+    after the last pixel of the current one, with other parameters.
+
+    Parameters :
+    ------------
+    dw : int
+         Width of the words of the output (8, 32 or 64).
+    fifo_depth : int
+         Depth of the FIFOs of Huffman codes of each component.
+    restart_interval : int
+         Reset value of ``restart_interval``.
+    headers : bool
+         Give the JFIF file of each frame instead of its entropy coded
+         segment.
+    ycbcr : bool
+         The pixels are given in YCbCr instead of RGB.
+    tables : list
+         Sets of luminance and chrominance quantization tables, the set of
+         each frame is selected by ``table_select``.
+    """
+    def __init__(self, dw=32, fifo_depth=128, restart_interval=0,
+                 headers=False, ycbcr=False,
+                 tables=[(quant_values, chroma_quant_values)]):
+        if ycbcr:
+            sink_layout = ycbcr444_layout(8)
+        else:
+            sink_layout = rgb_layout(8)
+        self.sink = sink = stream.Endpoint(EndpointDescription(sink_layout))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+        self.restart_interval = Signal(16, reset=restart_interval)
+        self.table_select = Signal(max=max(len(tables), 2))
+        if headers:
+            self.width = Signal(16)
+            self.height = Signal(16)
+
+        # # #
+
+        # The parameters of each frame, taken with its first pixel.
+        names = ["restart_interval", "table_select"]
+        if headers:
+            names += ["width", "height"]
+        parameters_layout = [(name, len(getattr(self, name)))
+                             for name in names]
+        if ycbcr:
+            pixels = sink
+            parameters = Record(parameters_layout)
+            parameters_valid = 1
+            self.comb += [getattr(parameters, name).eq(getattr(self, name))
+                          for name in names]
+        else:
+            self.submodules.rgb2ycbcr = rgb2ycbcr = RGB2YCbCr(jfif=True)
+            pixels = rgb2ycbcr.source
+
+            # Kept until the first pixel leaves the RGB2YCbCr.
+            self.submodules.csc_parameters = csc_parameters = \
+                stream.SyncFIFO(parameters_layout, 2)
+            sink_first = Signal(reset=1)
+            csc_ready = Signal()
+            self.sync += \
+                If(sink.valid & sink.ready,
+                   sink_first.eq(sink.last))
+            self.comb += [
+                csc_ready.eq(csc_parameters.sink.ready | ~sink_first),
+                sink.connect(rgb2ycbcr.sink, omit={"valid", "ready"}),
+                rgb2ycbcr.sink.valid.eq(sink.valid & csc_ready),
+                sink.ready.eq(rgb2ycbcr.sink.ready & csc_ready),
+                csc_parameters.sink.valid.eq(sink.valid & sink.ready &
+                                             sink_first),
+                [getattr(csc_parameters.sink, name).eq(getattr(self, name))
+                 for name in names]
+            ]
+            parameters = csc_parameters.source
+            parameters_valid = csc_parameters.source.valid
+
+        # Component pipelines.
+        components = ["y", "cb", "cr"]
+        fifos = []
+        dcts = []
+        restarts = []
+        selects = []
+        for i, name in enumerate(components):
+            dct = SerialDCT()
+            quantzigzag = QuantZigZag(table=[table[i != 0] for table in tables],
+                                      eob=True)
+            rlemain = RLEMain(eob=True)
+            huffman = HuffmanEncoder()
+            fifo = stream.SyncFIFO(code_layout(26), fifo_depth)
+            # The MCUs starting a frame or a restart interval, until their
+            # block reaches the RLEMain (a few blocks later).
+            restart = stream.SyncFIFO([("restart", 1)], 16)
+            setattr(self.submodules, name + "_dct", dct)
+            setattr(self.submodules, name + "_quantzigzag", quantzigzag)
+            setattr(self.submodules, name + "_rlemain", rlemain)
+            setattr(self.submodules, name + "_huffman", huffman)
+            setattr(self.submodules, name + "_fifo", fifo)
+            setattr(self.submodules, name + "_restart", restart)
+
+            rle_first = Signal(reset=1)
+            self.sync += \
+                If(rlemain.sink.valid & rlemain.sink.ready,
+                   rle_first.eq(rlemain.sink.last))
+
+            self.comb += [
+                dct.sink.data.eq(getattr(pixels, name)),
+                dct.source.connect(quantzigzag.sink),
+                quantzigzag.source.connect(rlemain.sink),
+                rlemain.source.connect(huffman.sink),
+                huffman.table.eq(i != 0),
+
+                rlemain.restart.eq(restart.source.restart),
+                restart.source.ready.eq(rlemain.sink.valid &
+                                        rlemain.sink.ready & rle_first),
+
+                # Only the entries with a code (and the end of the
+                # blocks) are kept.
+                fifo.sink.valid.eq(huffman.source.valid &
+                                   ((huffman.source.length != 0) |
+                                    huffman.source.last)),
+                fifo.sink.last.eq(huffman.source.last),
+                fifo.sink.data.eq(huffman.source.data),
+                fifo.sink.length.eq(huffman.source.length),
+                huffman.source.ready.eq(fifo.sink.ready)
+            ]
+            if len(tables) > 1:
+                # The set of tables of each block, until its first
+                # coefficient is written in the QuantZigZag.
+                select = stream.SyncFIFO(
+                             [("table", len(self.table_select))], 16)
+                setattr(self.submodules, name + "_select", select)
+                quant_first = Signal(reset=1)
+                self.sync += \
+                    If(quantzigzag.sink.valid & quantzigzag.sink.ready,
+                       quant_first.eq(quantzigzag.sink.last))
+                self.comb += [
+                    quantzigzag.table_select.eq(select.source.table),
+                    select.source.ready.eq(quantzigzag.sink.valid &
+                                           quantzigzag.sink.ready &
+                                           quant_first)
+                ]
+                selects.append(select)
+
+            dcts.append(dct)
+            fifos.append(fifo)
+            restarts.append(restart)
+
+        # The pixels go to the three pipelines at the same time, the end of
+        # the frame (or of the restart interval, followed by a marker) is
+        # kept for each MCU until it is merged.
+        self.submodules.frame_end = frame_end = stream.SyncFIFO(
+                                        [("end", 1), ("marker", 1)], 16)
+        ready = Signal()
+        count = Signal(6)
+        first = Signal(reset=1)
+
+        # MCU of the restart interval, the interval (and the set of tables)
+        # is taken at the start of the frame.
+        start = Signal()
+        interval = Signal(16)
+        table = Signal(max=max(len(tables), 2))
+        mcu = Signal(16)
+        interval_end = Signal()
+        self.comb += [
+            start.eq(first & (count == 0)),
+            interval_end.eq((interval != 0) & (mcu == interval - 1))
+        ]
+        self.sync += \
+            If(pixels.valid & ready,
+               If(start,
+                  interval.eq(parameters.restart_interval),
+                  table.eq(parameters.table_select)),
+               If(count == 63,
+                  If(pixels.last | interval_end,
+                     mcu.eq(0)
+                  ).Else(
+                     mcu.eq(mcu + 1))))
+        if headers:
+            # The parameters of the headers of each frame, until its JFIF
+            # file has been given.
+            self.submodules.frame_parameters = frame_parameters = \
+                stream.SyncFIFO(parameters_layout, 4)
+            self.comb += [
+                frame_parameters.sink.valid.eq(pixels.valid & ready & start),
+                [getattr(frame_parameters.sink, name).eq(
+                     getattr(parameters, name)) for name in names]
+            ]
+            parameters_ready = (parameters_valid &
+                                frame_parameters.sink.ready) | ~start
+        else:
+            parameters_ready = parameters_valid | ~start
+        if not ycbcr:
+            self.comb += csc_parameters.source.ready.eq(pixels.valid &
+                                                        ready & start)
+        self.comb += [
+            ready.eq(dcts[0].sink.ready & dcts[1].sink.ready &
+                     dcts[2].sink.ready & frame_end.sink.ready &
+                     restarts[0].sink.ready & restarts[1].sink.ready &
+                     restarts[2].sink.ready & parameters_ready &
+                     reduce(and_, [select.sink.ready for select in selects],
+                            1)),
+            [select.sink.valid.eq(pixels.valid & ready & (count == 63))
+             for select in selects],
+            [select.sink.table.eq(table) for select in selects],
+            pixels.ready.eq(ready),
+            [dct.sink.valid.eq(pixels.valid & ready)
+             for dct in dcts],
+            frame_end.sink.valid.eq(pixels.valid & ready &
+                                    (count == 63)),
+            frame_end.sink.end.eq(pixels.last),
+            frame_end.sink.marker.eq(interval_end),
+            [restart.sink.valid.eq(pixels.valid & ready &
+                                   (count == 63))
+             for restart in restarts],
+            [restart.sink.restart.eq(first | ((interval != 0) & (mcu == 0)))
+             for restart in restarts]
+        ]
+        self.sync += \
+            If(pixels.valid & ready,
+               count.eq(count + 1),
+               If(count == 63,
+                  first.eq(pixels.last)))
+
+        # Merging the codes of the Y, Cb and Cr blocks of each MCU.
+        self.submodules.bitpacker = bitpacker = BitPacker(dw)
+        # The padded intervals and whether they end the frame, until they
+        # are given by the BitPacker.
+        self.submodules.segments = segments = stream.SyncFIFO([("end", 1)],
+                                                              4)
+        segment_last = Signal()
+        sel = Signal(2)
+        fifo = Record(code_layout(26) + [("valid", 1), ("last", 1)])
+        cases = {}
+        for i in range(3):
+            cases[i] = [
+                fifo.valid.eq(fifos[i].source.valid),
+                fifo.last.eq(fifos[i].source.last),
+                fifo.data.eq(fifos[i].source.data),
+                fifo.length.eq(fifos[i].source.length),
+                fifos[i].source.ready.eq(bitpacker.sink.ready &
+                                         segments.sink.ready &
+                                         frame_end.source.valid)
+            ]
+        self.comb += Case(sel, cases)
+
+        self.comb += [
+            segment_last.eq(fifo.last & (sel == 2) &
+                            (frame_end.source.end | frame_end.source.marker)),
+            bitpacker.sink.valid.eq(fifo.valid & segments.sink.ready &
+                                    frame_end.source.valid),
+            bitpacker.sink.data.eq(fifo.data),
+            bitpacker.sink.length.eq(fifo.length),
+            bitpacker.sink.last.eq(segment_last),
+            frame_end.source.ready.eq(bitpacker.sink.valid &
+                                      bitpacker.sink.ready &
+                                      fifo.last & (sel == 2)),
+
+            segments.sink.valid.eq(bitpacker.sink.valid &
+                                   bitpacker.sink.ready & segment_last),
+            segments.sink.end.eq(frame_end.source.end)
+        ]
+        self.sync += \
+            If(bitpacker.sink.valid & bitpacker.sink.ready & fifo.last,
+               If(sel == 2,
+                  sel.eq(0)
+               ).Else(
+                  sel.eq(sel + 1)))
+
+        # The markers between the intervals, only the last word of an
+        # interval waits for its end.
+        self.submodules.stitcher = stitcher = RestartStitcher(1, dw)
+        segment_valid = Signal()
+        self.comb += [
+            segment_valid.eq(~bitpacker.source.last | segments.source.valid),
+            stitcher.sink0.valid.eq(bitpacker.source.valid & segment_valid),
+            stitcher.sink0.data.eq(bitpacker.source.data),
+            stitcher.sink0.bytes.eq(bitpacker.source.bytes),
+            stitcher.sink0.last.eq(bitpacker.source.last),
+            stitcher.sink0.end.eq(segments.source.end),
+            bitpacker.source.ready.eq(stitcher.sink0.ready & segment_valid),
+            segments.source.ready.eq(bitpacker.source.valid &
+                                     bitpacker.source.ready &
+                                     bitpacker.source.last)
+        ]
+
+        if headers:
+            self.submodules.header = header = JFIFHeader(dw, tables)
+            self.comb += [
+                header.width.eq(frame_parameters.source.width),
+                header.height.eq(frame_parameters.source.height),
+                header.restart_interval.eq(
+                    frame_parameters.source.restart_interval),
+                header.table_select.eq(frame_parameters.source.table_select),
+                header.start.eq(frame_parameters.source.valid),
+                frame_parameters.source.ready.eq(header.source.valid &
+                                                 header.source.ready &
+                                                 header.source.last),
+                stitcher.source.connect(header.sink),
+                header.source.connect(source)
+            ]
+        else:
+            self.comb += stitcher.source.connect(source)
+
+
+class RestartStitcher(Module):
+    """
+    Splices the entropy coded segments of ``n`` streams, taken one after
+    another, with the RSTn markers between them (RST0 to RST7, then RST0
+    again, from RST0 on each frame).
+
+    Attributes :
+    ------------
+    sinks  : ``word_layout(dw)`` with ``end``, the segments are ended by
+             ``last`` (they are padded to a byte boundary), ``end`` is set
+             with ``last`` on the last segment of the frame, after which the
+             next frame starts on the first sink.
+    source : bytes of the entropy coded segment, ``word_layout(dw)``, with
+             ``last`` on the last word of the frame.
+
+    Parameters :
+    ------------
+    n : int
+        Number of sinks.
+    dw : int
+         Width of the words (8, 32 or 64).
+    """
+    def __init__(self, n=1, dw=32):
+        self.sinks = sinks = []
+        for i in range(n):
+            sink = stream.Endpoint(
+                       EndpointDescription(word_layout(dw) + [("end", 1)]))
+            setattr(self, "sink" + str(i), sink)
+            sinks.append(sink)
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+
+        # # #
+
+        sel = Signal(max=max(n, 2))
+        marker = Signal(3)
+
+        # Bytes of the marker left to give, a word per byte with 8 bits
+        # words, both bytes in a word otherwise.
+        pending = Signal(2)
+        marker_words = 2 if dw == 8 else 1
+
+        cases = {}
+        for i, sink in enumerate(sinks):
+            cases[i] = [
+                source.valid.eq(sink.valid),
+                source.data.eq(sink.data),
+                source.bytes.eq(sink.bytes),
+                source.last.eq(sink.last & sink.end),
+                sink.ready.eq(source.ready)
+            ]
+        if dw == 8:
+            marker_data = Mux(pending == 2, 0xff, Cat(marker, C(0b11010, 5)))
+            marker_bytes = 1
+        else:
+            marker_data = Cat(C(0xff, 8), marker, C(0b11010, 5))
+            marker_bytes = 2
+        self.comb += \
+            If(pending != 0,
+               source.valid.eq(1),
+               source.data.eq(marker_data),
+               source.bytes.eq(marker_bytes)
+            ).Else(
+               Case(sel, cases))
+
+        current = Array(sinks)[sel]
+        self.sync += \
+            If(pending != 0,
+               If(source.ready,
+                  pending.eq(pending - 1),
+                  If(pending == 1,
+                     marker.eq(marker + 1)))
+            ).Elif(current.valid & current.ready & current.last,
+               If(current.end,
+                  sel.eq(0),
+                  marker.eq(0)
+               ).Else(
+                  pending.eq(marker_words),
+                  If(sel == n - 1,
+                     sel.eq(0)
+                  ).Else(
+                     sel.eq(sel + 1))))
+
+
+class LiteJPEGParallelEncoder(Module):
+    """
+    ``n`` LiteJPEGEncoder pipelines encoding the rows of MCUs of the frame
+    in turn (row ``i`` on the pipeline ``i % n``), each row being a restart
+    interval. The rows are padded to a byte boundary with their DC
+    coefficients predicted from 0, so they are spliced with RSTn markers
+    between them. The restart interval of the headers (DRI) is ``width//8``
+    MCUs.
+
+    Throughput:
+    -----------
+    Each pipeline has its own sink and takes up to one pixel per clock
+    cycle, 64/c pixel per clock cycle on MCUs of c > 64 codes (its BitPacker
+    packs one code per clock cycle, once its code FIFOs are full). The words
+    of each pipeline wait in a FIFO for the rows of the others to be
+    spliced, so the ``n`` pipelines work at the same time and the frame is
+    taken at ``n`` times the throughput of a pipeline, plus the time to pack
+    the codes of the last rows after their last pixel. On the 32x64 frame
+    of noise of parallel_encoder_tb, the LiteJPEGEncoder encodes 0.67 pixel
+    per clock cycle and 2 pipelines 1.2.
+
+    Attributes :
+    ------------
+    sinks  : the pixels of the rows of each pipeline, ``rgb_layout(8)``, in
+             MCU order, with ``last`` on the last pixel of the frame (on the
+             pipeline of the last row).
+    source : bytes of the entropy coded segment, ``word_layout(dw)``, with
+             ``last`` on the last word of the frame.
+
+    Parameters :
+    ------------
+    n : int
+        Number of pipelines.
+    width : int
+            Width of the frames in pixels, a multiple of 8.
+    dw : int
+         Width of the words of the output (8, 32 or 64).
+    fifo_depth : int
+         Depth of the FIFOs of Huffman codes of each component and of the
+         FIFOs of words of each pipeline.
+    """
+    def __init__(self, n=2, width=64, dw=32, fifo_depth=128):
+        self.sinks = []
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+
+        # # #
+
+        self.submodules.stitcher = stitcher = RestartStitcher(n, dw)
+        self.comb += stitcher.source.connect(source)
+
+        row_pixels = 8*width
+        for i in range(n):
+            sink = stream.Endpoint(EndpointDescription(rgb_layout(8)))
+            setattr(self, "sink" + str(i), sink)
+            self.sinks.append(sink)
+
+            lane = LiteJPEGEncoder(dw, fifo_depth)
+            # Rows in the pipeline and whether they end the frame.
+            ends = stream.SyncFIFO([("end", 1)], 4)
+            setattr(self.submodules, "lane" + str(i), lane)
+            setattr(self.submodules, "ends" + str(i), ends)
+
+            # Each row is a frame for the pipeline.
+            count = Signal(max=row_pixels)
+            self.comb += [
+                sink.connect(lane.sink, omit={"valid", "ready", "last"}),
+                lane.sink.valid.eq(sink.valid & ends.sink.ready),
+                lane.sink.last.eq((count == row_pixels - 1) | sink.last),
+                sink.ready.eq(lane.sink.ready & ends.sink.ready),
+
+                ends.sink.valid.eq(sink.valid & sink.ready & lane.sink.last),
+                ends.sink.end.eq(sink.last)
+            ]
+            self.sync += \
+                If(sink.valid & sink.ready,
+                   If(lane.sink.last,
+                      count.eq(0)
+                   ).Else(
+                      count.eq(count + 1)))
+
+            # The words of the rows wait for their turn in the stitcher
+            # there, the BitPacker of the pipeline going on meanwhile.
+            words = stream.SyncFIFO(word_layout(dw) + [("end", 1)],
+                                    fifo_depth)
+            setattr(self.submodules, "words" + str(i), words)
+            self.comb += [
+                words.sink.valid.eq(lane.source.valid & ends.source.valid),
+                words.sink.data.eq(lane.source.data),
+                words.sink.bytes.eq(lane.source.bytes),
+                words.sink.last.eq(lane.source.last),
+                words.sink.end.eq(ends.source.end),
+                lane.source.ready.eq(words.sink.ready & ends.source.valid),
+                ends.source.ready.eq(lane.source.valid & lane.source.ready &
+                                     lane.source.last),
+                words.source.connect(stitcher.sinks[i])
+            ]
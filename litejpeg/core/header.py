@@ -0,0 +1,215 @@
+"""
+JFIF Headers
+============
+The headers of a baseline JFIF file, from the SOI marker to the SOS marker,
+come before the entropy coded segment and the EOI marker ends the file:
+
+    SOI APP0 DQT DQT SOF0 DHT DHT DHT DHT DRI SOS <entropy coded segment> EOI
+
+The quantization tables (in zigzag order in the DQT markers) and the
+Huffman tables are the ones of the encoder, the frame is 4:4:4 with the
+luminance tables for the Y component and the chrominance tables for the Cb
+and Cr components. The size of the frame, the restart interval and the set
+of quantization tables are the only fields changing from a frame to another.
+"""
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.quantization import quant_values, chroma_quant_values
+from litejpeg.core.zigzag import zigzag_rom
+from litejpeg.core.rle.huffman import *
+
+
+eoi = [0xff, 0xd9]
+
+
+def jfif_header(width, height, restart_interval=0,
+                tables=(quant_values, chroma_quant_values), dri=None):
+    """
+    Bytes of the headers, up to the SOS marker.
+
+    width, height : Size of the frame in pixels.
+    restart_interval : Number of MCUs of the restart intervals, 0 for none.
+    tables : Luminance and chrominance quantization tables, in raster order.
+    dri : Give the DRI marker, by default only with a restart interval.
+    """
+    if dri is None:
+        dri = restart_interval != 0
+    header = [0xff, 0xd8]
+    # APP0
+    header += [0xff, 0xe0, 0x00, 0x10, 0x4a, 0x46, 0x49, 0x46, 0x00,
+               0x01, 0x01, 0x00, 0x00, 0x01, 0x00, 0x01, 0x00, 0x00]
+    # DQT, in zigzag order.
+    for i, table in enumerate(tables):
+        header += [0xff, 0xdb, 0x00, 0x43, i]
+        header += [table[zigzag_rom[k]] for k in range(64)]
+    # SOF0, 3 components without subsampling.
+    header += [0xff, 0xc0, 0x00, 0x11, 0x08,
+               height >> 8, height & 0xff, width >> 8, width & 0xff, 0x03,
+               0x01, 0x11, 0x00, 0x02, 0x11, 0x01, 0x03, 0x11, 0x01]
+    # DHT
+    for tc, th, bits, huffval in [(0, 0, dc_luma_bits, dc_luma_huffval),
+                                  (1, 0, ac_luma_bits, ac_luma_huffval),
+                                  (0, 1, dc_chroma_bits, dc_chroma_huffval),
+                                  (1, 1, ac_chroma_bits, ac_chroma_huffval)]:
+        length = 2 + 1 + 16 + len(huffval)
+        header += [0xff, 0xc4, length >> 8, length & 0xff, (tc << 4) | th]
+        header += bits + huffval
+    # DRI
+    if dri:
+        header += [0xff, 0xdd, 0x00, 0x04,
+                   restart_interval >> 8, restart_interval & 0xff]
+    # SOS
+    header += [0xff, 0xda, 0x00, 0x0c, 0x03, 0x01, 0x00, 0x02, 0x11,
+               0x03, 0x11, 0x00, 0x3f, 0x00]
+    return header
+
+
+def jfif_fields(tables=(quant_values, chroma_quant_values)):
+    """
+    Positions of the MSB of the 16 bits fields of the headers given with a
+    DRI marker: ``height``, ``width`` and ``restart_interval``.
+    """
+    header = jfif_header(0, 0, 0, tables, dri=True)
+    sof0 = 2 + 18 + 69*len(tables)
+    dri = len(header) - 14 - 6
+    assert header[sof0:sof0 + 2] == [0xff, 0xc0]
+    assert header[dri:dri + 2] == [0xff, 0xdd]
+    return {
+        "height": sof0 + 5,
+        "width": sof0 + 7,
+        "restart_interval": dri + 4
+    }
+
+
+class JFIFHeader(Module):
+    """
+    JFIFHeader :
+    ------------
+    Gives the headers before the entropy coded segment of each frame and
+    the EOI marker after it. The headers are a ROM of words of ``dw`` bits
+    (the last one partial), with the size of the frame and the restart
+    interval patched in as the words are given, so the headers of a frame
+    are given while the encoder takes its first pixels, without the
+    softcore. The headers always have a DRI marker, with an interval of 0
+    without restart interval.
+
+    The headers of a frame are given from ``start`` or from the first word
+    of its entropy coded segment.
+
+    Attributes :
+    ------------
+    sink   : bytes of the entropy coded segment, ``word_layout(dw)``, with
+             ``last`` on the last word of the frame.
+    source : bytes of the JFIF file, ``word_layout(dw)``, with ``last`` on
+             the last word of the file.
+    width, height : Size of the frame in pixels.
+    restart_interval : Number of MCUs of the restart intervals.
+    table_select : Set of quantization tables of the frame.
+    start : The frame starts (its first pixel is taken by the encoder).
+
+    The fields are taken as the headers are given (they are to be changed
+    between the frames).
+
+    Parameters :
+    ------------
+    dw : int
+         Width of the words (8, 32 or 64).
+    tables : Sets of luminance and chrominance quantization tables of the
+             encoder, in raster order, selected by ``table_select``.
+    """
+    def __init__(self, dw=32, tables=[(quant_values, chroma_quant_values)]):
+        self.sink = sink = stream.Endpoint(
+                               EndpointDescription(word_layout(dw)))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+        self.width = Signal(16)
+        self.height = Signal(16)
+        self.restart_interval = Signal(16)
+        self.table_select = Signal(max=max(len(tables), 2))
+        self.start = Signal()
+
+        # # #
+
+        # The headers of each set of tables, one after another.
+        word_bytes = dw//8
+        init = []
+        for luma, chroma in tables:
+            header = jfif_header(0, 0, 0, (luma, chroma), dri=True)
+            words = (len(header) + word_bytes - 1)//word_bytes
+            for i in range(words):
+                word = 0
+                for k, byte in enumerate(
+                        header[i*word_bytes:(i+1)*word_bytes]):
+                    word |= byte << 8*k
+                init.append(word)
+        mem = Memory(dw, len(init), init=init)
+        read_port = mem.get_port(async_read=True)
+        self.specials += mem, read_port
+
+        address = Signal(max=words)
+        data = Signal(dw)
+        self.comb += [
+            read_port.adr.eq(self.table_select*words + address),
+            data.eq(read_port.dat_r)
+        ]
+
+        # Patching the bytes of the fields, MSB first.
+        for name, position in sorted(jfif_fields(tables[0]).items()):
+            field = getattr(self, name)
+            for k, byte in enumerate([field[8:16], field[0:8]]):
+                n = position + k
+                i = n % word_bytes
+                self.comb += \
+                    If(address == n//word_bytes,
+                       data[8*i:8*(i+1)].eq(byte))
+
+        # The EOI marker, a word per byte with 8 bits words.
+        eoi_words = 2 if dw == 8 else 1
+        eoi_count = Signal(2)
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(self.start | sink.valid,
+               NextState("HEADER"))
+        )
+        fsm.act("HEADER",
+            source.valid.eq(1),
+            source.data.eq(data),
+            If(address == words - 1,
+               source.bytes.eq(len(header) - (words - 1)*word_bytes)
+            ).Else(
+               source.bytes.eq(word_bytes)),
+            If(source.ready,
+               NextValue(address, address + 1),
+               If(address == words - 1,
+                  NextValue(address, 0),
+                  NextState("SEGMENT")))
+        )
+        fsm.act("SEGMENT",
+            source.valid.eq(sink.valid),
+            source.data.eq(sink.data),
+            source.bytes.eq(sink.bytes),
+            sink.ready.eq(source.ready),
+            If(sink.valid & sink.ready & sink.last,
+               NextValue(eoi_count, 0),
+               NextState("EOI"))
+        )
+        if dw == 8:
+            eoi_data = Mux(eoi_count == 0, eoi[0], eoi[1])
+            eoi_bytes = 1
+        else:
+            eoi_data = eoi[0] | (eoi[1] << 8)
+            eoi_bytes = 2
+        fsm.act("EOI",
+            source.valid.eq(1),
+            source.data.eq(eoi_data),
+            source.bytes.eq(eoi_bytes),
+            source.last.eq(eoi_count == eoi_words - 1),
+            If(source.ready,
+               NextValue(eoi_count, eoi_count + 1),
+               If(eoi_count == eoi_words - 1,
+                  NextState("IDLE")))
+        )
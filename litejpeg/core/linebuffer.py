@@ -0,0 +1,131 @@
+# Line Buffer
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+
+"""
+Raster to MCU order
+-------------------
+The cameras and the video cores give the pixels line after line while the
+DCT takes the blocks one after another. This module stores a stripe of
+``lines`` lines of the image and reads it back MCU after MCU.
+
+The memory holds two stripes: one is written with the incoming lines while
+the other one is read, so the raster input is never stalled as long as the
+output takes one pixel per clock cycle.
+"""
+
+
+class LineBuffer(Module):
+    """
+    LineBuffer :
+    ------------
+    The pixels of a MCU are given block after block (8x8 blocks in raster
+    order inside the MCU), each block in raster order. The MCUs of a stripe
+    are given from left to right.
+
+    With ``lines`` = 8 the MCU is a 8x8 block, with ``lines`` = 16 it is a
+    16x16 MCU of 4 blocks, as needed for the 4:2:0 subsampling.
+
+    Attributes :
+    ------------
+    sink   : Pixels in raster order, ``last`` on the last pixel of the
+             frame. The height of the frame is a multiple of ``lines``.
+    source : Pixels in MCU order, ``last`` on the last pixel of the frame.
+
+    Parameters :
+    ------------
+    layout : list
+             Layout of the pixels, ``rgb_layout(8)`` or
+             ``ycbcr444_layout(8)``.
+    width : int
+            Number of pixels of a line, a multiple of ``lines``.
+    lines : int
+            Number of lines of a stripe (8 or 16).
+    """
+    def __init__(self, layout, width, lines=8):
+        assert lines in [8, 16]
+        assert width % lines == 0
+        self.sink = sink = stream.Endpoint(EndpointDescription(layout))
+        self.source = source = stream.Endpoint(EndpointDescription(layout))
+
+        # # #
+
+        stripe = lines*width
+        dw = len(sink.payload.raw_bits())
+
+        mem = Memory(dw, 2*stripe)
+        write_port = mem.get_port(write_capable=True)
+        read_port = mem.get_port(has_re=True)
+        self.specials += mem, write_port, read_port
+
+        # full : the stripe of the bank is written and waits to be read.
+        # end : the stripe of the bank is the last one of the frame.
+        full = Array(Signal() for i in range(2))
+        end = Array(Signal() for i in range(2))
+        write_sel = Signal()
+        read_sel = Signal()
+
+        # write path: raster order.
+        write_count = Signal(max=stripe)
+        write_done = Signal()
+        self.comb += [
+            sink.ready.eq(~full[write_sel]),
+            write_done.eq((write_count == stripe - 1) | sink.last),
+
+            write_port.adr.eq(Mux(write_sel, stripe, 0) + write_count),
+            write_port.dat_w.eq(sink.payload.raw_bits()),
+            write_port.we.eq(sink.valid & sink.ready)
+        ]
+        self.sync += \
+            If(sink.valid & sink.ready,
+               If(write_done,
+                  write_count.eq(0),
+                  full[write_sel].eq(1),
+                  end[write_sel].eq(sink.last),
+                  write_sel.eq(~write_sel)
+               ).Else(
+                  write_count.eq(write_count + 1)))
+
+        # read path: MCU order.
+        # count : position in the MCU, x and y of the pixel in the block
+        # (and x and y of the block in the MCU for 16x16 MCUs).
+        count = Signal(log2_int(lines*lines))
+        mcu = Signal(max=width//lines)
+        if lines == 16:
+            row = Cat(count[3:6], count[7])
+            column = Cat(count[0:3], count[6])
+        else:
+            row = count[3:6]
+            column = count[0:3]
+
+        ce = Signal()
+        read = Signal()
+        read_done = Signal()
+        self.comb += [
+            ce.eq(~source.valid | source.ready),
+            read.eq(ce & full[read_sel]),
+            read_done.eq((count == lines*lines - 1) &
+                         (mcu == width//lines - 1)),
+
+            read_port.re.eq(ce),
+            read_port.adr.eq(Mux(read_sel, stripe, 0) + row*width +
+                             mcu*lines + column),
+            source.payload.raw_bits().eq(read_port.dat_r)
+        ]
+        self.sync += [
+            If(read,
+               count.eq(count + 1),
+               If(count == lines*lines - 1,
+                  If(read_done,
+                     mcu.eq(0),
+                     full[read_sel].eq(0),
+                     read_sel.eq(~read_sel)
+                  ).Else(
+                     mcu.eq(mcu + 1)))),
+            If(ce,
+               source.valid.eq(read),
+               source.last.eq(read & read_done & end[read_sel]))
+        ]
@@ -19,6 +19,15 @@ of 64*12 bits.
 '''
 datapath_latency = 8
 
+# Scale factors of the outputs of the AAN DCT (see AANDCT1D).
+aan_scale = [1.0] + [math.cos((k*math.pi)/16)*math.sqrt(2) for k in range(1, 8)]
+
+# Fractional bits kept on coefficient 8*v + u of the AAN datapath, so that
+# once scaled it is still given with at least the precision of an unscaled
+# coefficient (its scale is then within 1 and 2).
+aan_shifts = [max(0, math.ceil(-math.log2(aan_scale[i//8]*aan_scale[i%8])))
+              for i in range(64)]
+
 
 @CEInserter()
 class DCTDatapath(Module):
@@ -397,6 +406,406 @@ class DCTDatapath(Module):
         self.sync += vector1d_out[0].eq(vector10[0])
 
 
+class DCT1D(Module):
+    """
+    Pipelined 1D DCT engine
+    -----------------------
+    This will do the DCT operation over a single row or column following the
+    flowgraph of ``dct_1d`` in the reference model (test/model/enc_frame.py).
+    Unlike ``DCTDatapath.dct1D`` every path goes through the same number of
+    registers, hence a new vector can be given at every clock cycle and its
+    result is obtained ``latency`` clock cycles later. This is what allows
+    the engine to be shared between several rows and columns.
+
+    Parameters:
+    -----------
+    dw : int
+         number of bits of the signed values processed by the engine.
+    cw : int
+         number of fractional bits used for the sine/cosine coefficients.
+
+    """
+    latency = 4
+
+    def __init__(self, dw, cw=12):
+        self.sink = sink = Array(Signal((dw, True)) for a in range(8))
+        self.source = source = Array(Signal((dw, True)) for a in range(8))
+
+        # # #
+
+        def butterfly(i0, i1, o0, o1):
+            return [
+                o0.eq(i0 + i1),
+                o1.eq(i0 - i1)
+            ]
+
+        def rotation(i0, i1, o0, o1, k, n):
+            kcos = coef(k*math.cos((n*math.pi)/16), cw)
+            ksin = coef(k*math.sin((n*math.pi)/16), cw)
+            return [
+                o0.eq((i0*kcos + i1*ksin) >> cw),
+                o1.eq((i1*kcos - i0*ksin) >> cw)
+            ]
+
+        # 1st stage
+        vector1 = Array(Signal((dw, True)) for a in range(8))
+        self.sync += [
+            butterfly(sink[3], sink[4], vector1[3], vector1[4]),
+            butterfly(sink[2], sink[5], vector1[2], vector1[5]),
+            butterfly(sink[1], sink[6], vector1[1], vector1[6]),
+            butterfly(sink[0], sink[7], vector1[0], vector1[7])
+        ]
+
+        # 2nd stage
+        vector2 = Array(Signal((dw, True)) for a in range(8))
+        self.sync += [
+            butterfly(vector1[0], vector1[3], vector2[0], vector2[3]),
+            butterfly(vector1[1], vector1[2], vector2[1], vector2[2]),
+            rotation(vector1[4], vector1[7], vector2[4], vector2[7], 1, 3),
+            rotation(vector1[5], vector1[6], vector2[5], vector2[6], 1, 1)
+        ]
+
+        # 3rd stage
+        vector3 = Array(Signal((dw, True)) for a in range(8))
+        self.sync += [
+            butterfly(vector2[7], vector2[5], vector3[7], vector3[5]),
+            butterfly(vector2[4], vector2[6], vector3[4], vector3[6]),
+            butterfly(vector2[0], vector2[1], vector3[0], vector3[1]),
+            rotation(vector2[2], vector2[3], vector3[2], vector3[3], math.sqrt(2), 6)
+        ]
+
+        # 4th stage
+        sqrt2 = coef(math.sqrt(2), cw)
+        self.sync += [
+            butterfly(vector3[7], vector3[4], source[1], source[7]),
+            source[5].eq((vector3[6]*sqrt2) >> cw),
+            source[3].eq((vector3[5]*sqrt2) >> cw),
+            source[6].eq(vector3[3]),
+            source[2].eq(vector3[2]),
+            source[4].eq(vector3[1]),
+            source[0].eq(vector3[0])
+        ]
+
+
+class AANDCT1D(Module):
+    """
+    Pipelined 1D AAN DCT engine
+    ---------------------------
+    Same interface as DCT1D but using the Arai-Agui-Nakajima factorization,
+    which only needs 5 multiplications (instead of 14 for DCT1D). The
+    results are scaled: output ``k`` is the DCT coefficient multiplied by
+    ``aan_scale[k]``. These factors are not removed here but merged into the
+    reciprocal table of the Quantization module (see ``aan=True``).
+
+    Parameters:
+    -----------
+    dw : int
+         number of bits of the signed values processed by the engine.
+    cw : int
+         number of fractional bits used for the coefficients.
+
+    """
+    latency = 5
+
+    def __init__(self, dw, cw=12):
+        self.sink = sink = Array(Signal((dw, True)) for a in range(8))
+        self.source = source = Array(Signal((dw, True)) for a in range(8))
+
+        # # #
+
+        def mult(i, value):
+            return (i*coef(value, cw)) >> cw
+
+        # 1st stage
+        tmp = Array(Signal((dw, True)) for a in range(8))
+        for i in range(4):
+            self.sync += [
+                tmp[i].eq(sink[i] + sink[7-i]),
+                tmp[7-i].eq(sink[i] - sink[7-i])
+            ]
+
+        # 2nd stage
+        even = Array(Signal((dw, True)) for a in range(4))
+        odd = Array(Signal((dw, True)) for a in range(4))
+        self.sync += [
+            even[0].eq(tmp[0] + tmp[3]),
+            even[1].eq(tmp[1] + tmp[2]),
+            even[2].eq(tmp[1] - tmp[2]),
+            even[3].eq(tmp[0] - tmp[3]),
+            odd[0].eq(tmp[4] + tmp[5]),
+            odd[1].eq(tmp[5] + tmp[6]),
+            odd[2].eq(tmp[6] + tmp[7]),
+            odd[3].eq(tmp[7])
+        ]
+
+        # 3rd stage: the 5 multiplications.
+        out0 = Signal((dw, True))
+        out4 = Signal((dw, True))
+        z1 = Signal((dw, True))
+        even3 = Signal((dw, True))
+        z2_mult = Signal((dw, True))
+        z4_mult = Signal((dw, True))
+        z5 = Signal((dw, True))
+        z3 = Signal((dw, True))
+        odd3 = Signal((dw, True))
+        self.sync += [
+            out0.eq(even[0] + even[1]),
+            out4.eq(even[0] - even[1]),
+            z1.eq(mult(even[2] + even[3], math.cos(4*math.pi/16))),
+            even3.eq(even[3]),
+            z2_mult.eq(mult(odd[0], math.cos(2*math.pi/16) - math.cos(6*math.pi/16))),
+            z4_mult.eq(mult(odd[2], math.cos(2*math.pi/16) + math.cos(6*math.pi/16))),
+            z5.eq(mult(odd[0] - odd[2], math.cos(6*math.pi/16))),
+            z3.eq(mult(odd[1], math.cos(4*math.pi/16))),
+            odd3.eq(odd[3])
+        ]
+
+        # 4th stage
+        out0_r = Signal((dw, True))
+        out4_r = Signal((dw, True))
+        out2 = Signal((dw, True))
+        out6 = Signal((dw, True))
+        z2 = Signal((dw, True))
+        z4 = Signal((dw, True))
+        z11 = Signal((dw, True))
+        z13 = Signal((dw, True))
+        self.sync += [
+            out0_r.eq(out0),
+            out4_r.eq(out4),
+            out2.eq(even3 + z1),
+            out6.eq(even3 - z1),
+            z2.eq(z2_mult + z5),
+            z4.eq(z4_mult + z5),
+            z11.eq(odd3 + z3),
+            z13.eq(odd3 - z3)
+        ]
+
+        # 5th stage
+        self.sync += [
+            source[0].eq(out0_r),
+            source[4].eq(out4_r),
+            source[2].eq(out2),
+            source[6].eq(out6),
+            source[5].eq(z13 + z2),
+            source[3].eq(z13 - z2),
+            source[1].eq(z11 + z4),
+            source[7].eq(z11 - z4)
+        ]
+
+
+class DCTFoldedDatapath(Module):
+    """
+    Folded Datapath for the DCT module
+    ----------------------------------
+    Same function as DCTDatapath but instead of unrolling 16 1D DCTs, the
+    rows and then the columns of the block are time-multiplexed over
+    ``parallelism`` DCT1D engines. The result of the rows is stored in
+    a transpose matrix from which the columns are read.
+
+    The block present on ``sink`` is taken when ``start`` is asserted and the
+    datapath is not ``busy``. Once all the columns are done the result is
+    given on ``source`` as soon as ``ack`` is asserted, ``done`` being
+    asserted for one clock cycle at this moment.
+
+    Parameters:
+    -----------
+    dw : int
+         number of bits in each block.
+    dct_block : int
+         number of blocks in the matrix.
+    parallelism : int
+         number of DCT1D engines (1, 2, 4 or 8). Each of the row and column
+         passes takes 8/parallelism clock cycles.
+    aan : bool
+         use AANDCT1D engines. Coefficient ``8*v + u`` of the result is then
+         scaled by ``aan_scale[v]*aan_scale[u]*2**aan_shifts[8*v + u]``
+         (and saturated), the small scale factors of the high frequencies
+         would otherwise round off most of their precision.
+    row_ports : bool
+         read the rows of the block from a memory instead of taking it on
+         ``sink``: engine ``k`` reads the row ``row_adr[k]`` on ``row_dat[k]``
+         (sample ``x`` in bits ``[x*dw:(x+1)*dw]``) with an asynchronous read.
+         The block must stay in the memory from ``start`` until
+         ``rows_done``, which is asserted on the last read of the block.
+
+    Attributes:
+    -----------
+    cycles_per_block : int
+         number of clock cycles needed to process a block (when ``ack`` is
+         always asserted).
+
+    """
+    def __init__(self, dw, dct_block, parallelism=1, aan=False,
+                 row_ports=False):
+        assert 8 % parallelism == 0
+        if row_ports:
+            self.row_adr = [Signal(3) for k in range(parallelism)]
+            self.row_dat = [Signal(8*dw) for k in range(parallelism)]
+            self.rows_done = Signal()
+        else:
+            self.sink = sink = Record(dct_block_layout(dw, dct_block))
+        self.source = source = Record(dct_block_layout(dw, dct_block))
+        self.start = Signal()
+        self.ack = Signal()
+        self.busy = Signal()
+        self.done = Signal()
+
+        engine = AANDCT1D if aan else DCT1D
+        steps = 8//parallelism
+        latency = engine.latency
+        self.cycles_per_block = 2*(steps + latency) + 2
+
+        # # #
+
+        # Internal width, large enough for the growth of the two passes
+        # and for the guard bits kept to limit the rounding errors (and
+        # to give the fractional bits of the AAN coefficients).
+        guard = 3
+        if aan:
+            guard += max(aan_shifts)
+        iw = dw + 6 + guard
+
+        self.submodules.engines = engines = [engine(iw)
+                                             for k in range(parallelism)]
+
+        # matrix_in  : input block (with the level shift), the rows are
+        #              read from the memory instead with ``row_ports``.
+        # matrix_t   : result of the rows, read by columns.
+        # matrix_out : result of the columns divided by 8.
+        matrix_in = Array(Array(Signal((iw, True)) for a in range(8))
+                          for b in range(8))
+        matrix_t = Array(Array(Signal((iw, True)) for a in range(8))
+                         for b in range(8))
+        matrix_out = Array(Array(Signal((dw, True)) for a in range(8))
+                           for b in range(8))
+
+        load = Signal()
+        update = Signal()
+        for y in range(8):
+            for x in range(8):
+                name = "dct_" + str(8*y + x)
+                if not row_ports:
+                    self.sync += \
+                        If(load,
+                           matrix_in[y][x].eq(
+                               (getattr(sink, name) - 128) << guard))
+                self.sync += \
+                    If(update,
+                       getattr(source, name).eq(matrix_out[y][x]))
+
+        # Issue a row (or a column) to each of the engines.
+        issue = Signal()
+        issue_columns = Signal()
+        count = Signal(max=max(steps, latency))
+        count_clr = Signal()
+        count_inc = Signal()
+        self.sync += \
+            If(count_clr,
+               count.eq(0)
+               ).Elif(count_inc,
+                      count.eq(count + 1))
+
+        for k, engine in enumerate(engines):
+            line = count*parallelism + k
+            if row_ports:
+                self.comb += self.row_adr[k].eq(line)
+            for x in range(8):
+                if row_ports:
+                    row = (self.row_dat[k][x*dw:(x+1)*dw] - 128) << guard
+                else:
+                    row = matrix_in[line][x]
+                self.comb += \
+                    If(issue_columns,
+                       engine.sink[x].eq(matrix_t[x][line])
+                       ).Else(
+                           engine.sink[x].eq(row))
+
+        # Follow the issued lines through the engines.
+        valid_delayed = [issue]
+        columns_delayed = [issue_columns]
+        count_delayed = [count]
+        for i in range(latency):
+            valid_n = Signal()
+            columns_n = Signal()
+            count_n = Signal(max=max(steps, latency))
+            self.sync += [
+                valid_n.eq(valid_delayed[-1]),
+                columns_n.eq(columns_delayed[-1]),
+                count_n.eq(count_delayed[-1])
+            ]
+            valid_delayed.append(valid_n)
+            columns_delayed.append(columns_n)
+            count_delayed.append(count_n)
+
+        # Write back the results, rounding the final division by 8
+        # (and removing the guard bits).
+        def rounded(value, shift):
+            return (value + 2**(shift - 1)) >> shift
+
+        for k, engine in enumerate(engines):
+            line = count_delayed[-1]*parallelism + k
+            for x in range(8):
+                result = Signal((iw, True))
+                if aan:
+                    # The column ``line`` of the frequency ``x``.
+                    self.comb += Case(line, {
+                        u: result.eq(rounded(engine.source[x],
+                                             guard + 3 - aan_shifts[8*x + u]))
+                        for u in range(8)})
+                else:
+                    self.comb += result.eq(rounded(engine.source[x],
+                                                   guard + 3))
+                self.sync += \
+                    If(valid_delayed[-1],
+                       If(columns_delayed[-1],
+                          saturate(result, matrix_out[x][line],
+                                   -2**(dw-1), 2**(dw-1)-1)
+                          ).Else(
+                              matrix_t[line][x].eq(engine.source[x])))
+
+        rows_done = self.rows_done if row_ports else Signal()
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+                count_clr.eq(1),
+                If(self.start,
+                   load.eq(1),
+                   NextState("ROWS")))
+        fsm.act("ROWS",
+                issue.eq(1),
+                If(count == steps-1,
+                   count_clr.eq(1),
+                   rows_done.eq(1),
+                   NextState("ROWS_FLUSH")
+                   ).Else(
+                          count_inc.eq(1)))
+        fsm.act("ROWS_FLUSH",
+                If(count == latency-1,
+                   count_clr.eq(1),
+                   NextState("COLUMNS")
+                   ).Else(
+                          count_inc.eq(1)))
+        fsm.act("COLUMNS",
+                issue.eq(1),
+                issue_columns.eq(1),
+                If(count == steps-1,
+                   count_clr.eq(1),
+                   NextState("COLUMNS_FLUSH")
+                   ).Else(
+                          count_inc.eq(1)))
+        fsm.act("COLUMNS_FLUSH",
+                If(count == latency-1,
+                   count_clr.eq(1),
+                   NextState("OUTPUT")
+                   ).Else(
+                          count_inc.eq(1)))
+        fsm.act("OUTPUT",
+                If(self.ack,
+                   update.eq(1),
+                   self.done.eq(1),
+                   NextState("IDLE")))
+        self.comb += self.busy.eq(~fsm.ongoing("IDLE"))
+
+
 class DCT(PipelinedActor, Module):
     """
     This will get the input into the DCT module in the
@@ -407,8 +816,22 @@ class DCT(PipelinedActor, Module):
     Also after obtaining the 64 blocks from the DCT module,
     these are transferred to the output in the form of serial data.
 
+    Parameters:
+    -----------
+    folded : bool
+             Use DCTFoldedDatapath (rows and columns time-multiplexed over
+             a few 1D DCT engines) instead of the unrolled DCTDatapath.
+    parallelism : int
+             Number of 1D DCT engines of the folded datapath. Trades area
+             for throughput, the resulting number of clock cycles needed by
+             the datapath for each block is given by ``cycles_per_block``.
+    aan : bool
+             Use the AAN engines in the folded datapath. The coefficients
+             are then scaled and must be quantized with Quantization(aan=True).
+
     """
-    def __init__(self, dw=12, dct_block=64):
+    def __init__(self, dw=12, dct_block=64, folded=False, parallelism=1,
+                 aan=False):
         # dw = Determine the size of the blocks
         # dct_block = Determine the number of blocks coming from one frame.
 
@@ -417,16 +840,22 @@ class DCT(PipelinedActor, Module):
             EndpointDescription(block_layout(12)))
         self.source = source = stream.Endpoint(
             EndpointDescription(block_layout(12)))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
 
         # # #
 
         # Setting the datapath which takes the YCbCr input
         # and give DCT output both
         # in the form of 64 blocks.
-        self.submodules.datapath = DCTDatapath(dw, dct_block)
-        self.comb += self.datapath.ce.eq(self.pipe_ce)
+        if folded:
+            # The flow is entirely controlled by the FSMs below.
+            self.submodules.datapath = DCTFoldedDatapath(dw, dct_block,
+                                                         parallelism, aan)
+            self.cycles_per_block = self.datapath.cycles_per_block
+        else:
+            PipelinedActor.__init__(self, datapath_latency)
+            self.latency = datapath_latency
+            self.submodules.datapath = DCTDatapath(dw, dct_block)
+            self.comb += self.datapath.ce.eq(self.pipe_ce)
 
         """
         Stores the data obtained from the serial input into the
@@ -466,10 +895,26 @@ class DCT(PipelinedActor, Module):
             data_write_port.we.eq(sink.valid & sink.ready)
         ]
 
+        # With the folded datapath, a written block stays pending until the
+        # datapath takes it, the next block can't be written before that.
+        pending = Signal()
+        pending_sel = Signal()
+        if folded:
+            write_allowed = ~pending
+            self.comb += self.datapath.start.eq(pending)
+            self.sync += \
+                If(write_swap,
+                   pending.eq(1),
+                   pending_sel.eq(write_sel)
+                   ).Elif(~self.datapath.busy,
+                          pending.eq(0))
+        else:
+            write_allowed = write_sel != read_sel
+
         self.submodules.write_fsm = write_fsm = FSM(reset_state="IDLE")
         write_fsm.act("IDLE",
                       write_clr.eq(1),
-                      If(write_sel != read_sel,
+                      If(write_allowed,
                          NextState("WRITE")))
         write_fsm.act("WRITE",
                       sink.ready.eq(1),
@@ -480,6 +925,16 @@ class DCT(PipelinedActor, Module):
                             ).Else(
                                    write_inc.eq(1))))
 
+        if folded:
+            self.add_folded_read_path(dct_block, pending_sel, data_mem)
+        else:
+            self.add_read_path(dct_block, write_sel, read_sel, read_swap,
+                               data_mem)
+
+    def add_read_path(self, dct_block, write_sel, read_sel, read_swap,
+                      data_mem):
+        source = self.source
+
         data_mem2 = Memory(12, 64*2)
         data_read_port2 = data_mem2.get_port(async_read=True)
         self.specials += data_mem2, data_read_port2
@@ -523,3 +978,215 @@ class DCT(PipelinedActor, Module):
         for i in range(dct_block):
             name = "dct_" + str(i)
             self.comb += data_mem2[i].eq(getattr(self.datapath.source, name))
+
+    def add_folded_read_path(self, dct_block, pending_sel, data_mem):
+        source = self.source
+
+        # Give the pending block to the datapath
+        for i in range(dct_block):
+            name = "dct_" + str(i)
+            self.comb += getattr(self.datapath.sink, name).eq(
+                data_mem[pending_sel*dct_block + i])
+
+        # The result stays on the datapath source until it has been read,
+        # the datapath can compute the next block meanwhile.
+        output_valid = Signal()
+        self.comb += self.datapath.ack.eq(~output_valid)
+
+        # read path
+        read_clr2 = Signal()
+        read_inc2 = Signal()
+        read_count2 = Signal(6)
+        self.sync += \
+            If(read_clr2,
+               read_count2.eq(0)
+               ).Elif(read_inc2,
+                      read_count2.eq(read_count2 + 1))
+
+        coefs = Array(getattr(self.datapath.source, "dct_" + str(i))
+                      for i in range(dct_block))
+        self.comb += source.data.eq(coefs[read_count2])
+
+        self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
+        read_fsm.act("IDLE",
+                     read_clr2.eq(1),
+                     If(output_valid,
+                        NextState("READ")))
+        read_fsm.act("READ",
+                     source.valid.eq(1),
+                     source.last.eq(read_count2 == 63),
+                     If(source.ready,
+                        read_inc2.eq(1),
+                        If(source.last,
+                           NextState("IDLE"))))
+        self.sync += \
+            If(self.datapath.done,
+               output_valid.eq(1)
+               ).Elif(source.valid & source.ready & source.last,
+                      output_valid.eq(0))
+
+
+class SerialDCT(Module):
+    """
+    Streaming DCT module
+    --------------------
+    Same function as the DCT module, but designed to keep up with a serial
+    stream of ``lanes`` samples per clock cycle without any wide bus:
+
+    - the samples of the blocks are written in two memory banks in turn
+      (ping-pong), each holding the 8 rows of 8 samples of a block: a block
+      is written in one bank while the DCTFoldedDatapath reads the rows of
+      the previous one from the other bank (a read port per engine),
+    - the result of a block stays on the datapath source while it is
+      streamed out, the datapath can meanwhile compute the next block.
+
+    Both sink and source use ``block_layout(dw*lanes)``, sample ``i`` of a
+    beat being stored in bits ``[i*dw:(i+1)*dw]`` of ``data`` (sample 0 in
+    the LSBs). The samples of a block are given in raster order.
+
+    Parameters:
+    -----------
+    lanes : int
+            Number of samples given/taken on each beat (1, 2, 4 or 8).
+    parallelism : int
+            Number of 1D DCT engines of the folded datapath. By default the
+            smallest one able to sustain ``lanes`` samples per clock cycle
+            (8 engines are not enough to sustain 8 samples per clock cycle).
+    aan : bool
+            Use the AAN engines (see DCT).
+    tagged : bool
+            The blocks carry their ``component`` (``tagged_block_layout``),
+            which is given with the coefficients of the block.
+
+    """
+    def __init__(self, dw=12, lanes=1, parallelism=None, aan=False,
+                 tagged=False):
+        assert lanes in [1, 2, 4, 8]
+        if tagged:
+            layout = tagged_block_layout(dw*lanes)
+        else:
+            layout = block_layout(dw*lanes)
+        self.sink = sink = stream.Endpoint(EndpointDescription(layout))
+        self.source = source = stream.Endpoint(EndpointDescription(layout))
+
+        beats = 64//lanes
+        latency = AANDCT1D.latency if aan else DCT1D.latency
+        if parallelism is None:
+            parallelism = 1
+            while (parallelism < 8 and
+                   2*(8//parallelism + latency) + 2 > beats):
+                parallelism *= 2
+
+        # # #
+
+        self.submodules.datapath = datapath = DCTFoldedDatapath(
+                                                  dw, 64, parallelism, aan,
+                                                  row_ports=True)
+        self.cycles_per_block = max(beats, datapath.cycles_per_block)
+
+        # Ping-pong memory: rows of 8 samples, the bank in the MSB of the
+        # address. A beat writes its samples in the row of a bank.
+        mem = Memory(8*dw, 2*8)
+        write_port = mem.get_port(write_capable=True, we_granularity=dw)
+        read_ports = [mem.get_port(async_read=True)
+                      for k in range(parallelism)]
+        self.specials += mem, write_port, read_ports
+
+        # write path
+        write_clr = Signal()
+        write_inc = Signal()
+        write_count = Signal(max=beats)
+        self.sync += \
+            If(write_clr,
+               write_count.eq(0)
+               ).Elif(write_inc,
+                      write_count.eq(write_count + 1))
+
+        # A bank is full from its last beat until the datapath has read its
+        # rows.
+        write_bank = Signal()
+        read_bank = Signal()
+        full = Array(Signal() for i in range(2))
+
+        position = Signal(6)
+        self.comb += [
+            position.eq(write_count*lanes),
+            write_port.adr.eq(Cat(position[3:6], write_bank)),
+            write_port.dat_w.eq(Replicate(sink.data[:dw*lanes], 8//lanes)),
+            If(sink.valid & sink.ready,
+               write_port.we.eq((2**lanes - 1) << position[0:3])),
+            sink.ready.eq(~full[write_bank])
+        ]
+        self.comb += \
+            If(sink.valid & sink.ready,
+               If(write_count == beats-1,
+                  write_clr.eq(1)
+                  ).Else(
+                         write_inc.eq(1)))
+        self.sync += [
+            If(sink.valid & sink.ready & (write_count == beats-1),
+               full[write_bank].eq(1),
+               write_bank.eq(~write_bank)),
+            If(datapath.rows_done,
+               full[read_bank].eq(0),
+               read_bank.eq(~read_bank))
+        ]
+
+        self.comb += datapath.start.eq(full[read_bank])
+        for k in range(parallelism):
+            self.comb += [
+                read_ports[k].adr.eq(Cat(datapath.row_adr[k], read_bank)),
+                datapath.row_dat[k].eq(read_ports[k].dat_r)
+            ]
+
+        # read path
+        read_clr = Signal()
+        read_inc = Signal()
+        read_count = Signal(max=beats)
+        self.sync += \
+            If(read_clr,
+               read_count.eq(0)
+               ).Elif(read_inc,
+                      read_count.eq(read_count + 1))
+
+        coefs = Array(getattr(datapath.source, "dct_" + str(i))
+                      for i in range(64))
+        for i in range(lanes):
+            self.comb += source.data[i*dw:(i+1)*dw].eq(
+                coefs[read_count*lanes + i])
+
+        # The next result can replace the current one as soon as its last
+        # beat is taken.
+        output_valid = Signal()
+        self.comb += [
+            source.valid.eq(output_valid),
+            source.last.eq(read_count == beats-1),
+            datapath.ack.eq(~output_valid |
+                            (source.ready & source.last)),
+            If(source.valid & source.ready,
+                If(source.last,
+                    read_clr.eq(1)
+                ).Else(
+                    read_inc.eq(1)
+                )
+            )
+        ]
+        self.sync += \
+            If(datapath.done,
+               output_valid.eq(1)
+               ).Elif(source.valid & source.ready & source.last,
+                      output_valid.eq(0))
+
+        if tagged:
+            # The component follows the block from its bank to the datapath
+            # and to the output.
+            bank_component = Array(Signal(2) for i in range(2))
+            datapath_component = Signal(2)
+            self.sync += [
+                If(sink.valid & sink.ready,
+                   bank_component[write_bank].eq(sink.component)),
+                If(datapath.start & ~datapath.busy,
+                   datapath_component.eq(bank_component[read_bank])),
+                If(datapath.done,
+                   source.component.eq(datapath_component))
+            ]
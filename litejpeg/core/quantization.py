@@ -14,6 +14,8 @@ from litex.soc.interconnect.stream import *
 from litex.soc.interconnect.csr import *
 
 from litejpeg.core.common import *
+from litejpeg.core.new_dct6 import aan_scale, aan_shifts
+from litejpeg.core.zigzag import zigzag_rom
 
 # Building up the quantization table required for the quantization module.
 # Must be specified previously.
@@ -26,18 +28,222 @@ quant_values = [16, 11, 10, 16, 24, 40, 51, 61,
                 49, 64, 78, 87, 103, 121, 120, 101,
                 72, 92, 95, 98, 112, 100, 103, 99]
 
+# Chrominance quantization table, used for the cb and cr blocks
+# when the tables are loaded at runtime.
+chroma_quant_values = [17, 18, 24, 47, 99, 99, 99, 99,
+                       18, 21, 26, 66, 99, 99, 99, 99,
+                       24, 26, 56, 99, 99, 99, 99, 99,
+                       47, 66, 99, 99, 99, 99, 99, 99,
+                       99, 99, 99, 99, 99, 99, 99, 99,
+                       99, 99, 99, 99, 99, 99, 99, 99,
+                       99, 99, 99, 99, 99, 99, 99, 99,
+                       99, 99, 99, 99, 99, 99, 99, 99]
 
-class Quantization(PipelinedActor, Module):
-    def __init__(self):
+
+def quant_table(quality, table=quant_values):
+    # return : The table scaled for a quality from 1 to 100 (50 gives the
+    # table itself) as the IJG library does, the values within 1 and 255.
+    if quality < 50:
+        scale = 5000//quality
+    else:
+        scale = 200 - 2*quality
+    return [min(max((value*scale + 50)//100, 1), 255) for value in table]
+
+
+def quant_inverse(table, aan=False):
+    # return : The reciprocals (2**16)/quantization value of the table.
+    # With aan, the scale factors of the AAN DCT (and its fractional bits)
+    # are also removed.
+    inverse = []
+    for i in range(64):
+        divider = table[i]
+        if aan:
+            divider *= aan_scale[i//8]*aan_scale[i%8]*2**aan_shifts[i]
+        inverse.append(int((2**16)/divider))
+    return inverse
+
+
+def quant_threshold(inverse):
+    # return : The smallest magnitudes quantized to a non-zero value with
+    # the reciprocals, (magnitude*inverse + 2**15) >> 16 >= 1.
+    return [(2**15 + value - 1)//value for value in inverse]
+
+
+class QuantTables(Module, AutoCSR):
+    """
+    Runtime quantization tables
+    ===========================
+    Holds the reciprocals (see ``quant_inverse``) of the luminance (table 0)
+    and chrominance (table 1) quantization tables so that the quality can be
+    changed by the softcore without rebuilding the gateware.
+
+    The tables are stored twice: the quantizer reads the active bank while
+    the softcore writes the shadow one. Writing ``swap`` makes the shadow
+    bank active at the start of the next block, so the quantizer never
+    stalls and a block is never quantized with a half written table.
+    The previously active bank becomes the shadow one and has to be fully
+    written again before the next swap. A swap written while one is
+    pending is ignored.
+
+    CSRs:
+    -----
+    adr          : bits 0-5 are the index of the value, bit 6 the table.
+    dat          : reciprocal written at ``adr`` of the shadow bank, 17 bits
+                   wide so that the reciprocal of 1, 2**16, can be written.
+    swap         : write to request a swap of the banks.
+    swap_pending : the swap has been requested and not done yet.
+
+    With ``sync_read``, ``inverse`` is registered and only updated when
+    ``re`` is set (for the pipelined quantizer).
+    """
+    # Width of the reciprocals, up to 2**16 for a quantization value of 1.
+    inverse_w = 17
+
+    def __init__(self, aan=False, sync_read=False):
+        self._adr = CSRStorage(7, name="adr")
+        self._dat = CSRStorage(self.inverse_w, name="dat")
+        self._swap = CSR(name="swap")
+        self._swap_pending = CSRStatus(name="swap_pending")
+
+        # Interface with the quantizer.
+        self.index = Signal(6)
+        self.table = Signal()
+        self.block_start = Signal()
+        self.re = Signal()
+        self.inverse = Signal(self.inverse_w)
+
+        # # #
+
+        tables = (quant_inverse(quant_values, aan) +
+                  quant_inverse(chroma_quant_values, aan))
+        mem = Memory(self.inverse_w, 2*2*64, init=2*tables)
+        write_port = mem.get_port(write_capable=True)
+        read_port = mem.get_port(async_read=not sync_read, has_re=sync_read)
+        self.specials += mem, write_port, read_port
+        if sync_read:
+            self.comb += read_port.re.eq(self.re)
+
+        bank = Signal()
+        swap_pending = Signal()
+        self.sync += \
+            If(swap_pending,
+               If(self.block_start,
+                  bank.eq(~bank),
+                  swap_pending.eq(0))
+            ).Elif(self._swap.re,
+               swap_pending.eq(1))
+
+        self.comb += [
+            write_port.adr.eq(Cat(self._adr.storage, ~bank)),
+            write_port.dat_w.eq(self._dat.storage),
+            write_port.we.eq(self._dat.re),
+
+            read_port.adr.eq(Cat(self.index, self.table, bank)),
+            self.inverse.eq(read_port.dat_r),
+
+            self._swap_pending.status.eq(swap_pending)
+        ]
+
+
+class QuantizationDatapath(Module):
+    """
+    Pipelined multiply of the quantizer: the sign is taken out of the
+    coefficient, its magnitude multiplied with the reciprocal, then rounded
+    and the sign put back, each step in its own register stage so that the
+    multiplier is mapped on a DSP with its input, internal and output
+    registers. The stages only advance when ``ce`` is set.
+    """
+    latency = 4
+
+    def __init__(self, inverse_w=16):
+        self.ce = Signal()
+        self.data = Signal((12, True))
+        self.inverse = Signal(inverse_w)
+        self.result = Signal(12)
+
+        # # #
+
+        # stage 1: sign and magnitude.
+        sign1 = Signal()
+        magnitude1 = Signal(12)
+        inverse1 = Signal(inverse_w)
+
+        # stage 2: multiplier (internal register).
+        sign2 = Signal()
+        product2 = Signal(12 + max(16, inverse_w))
+
+        # stage 3: multiplier (output register).
+        sign3 = Signal()
+        product3 = Signal(12 + max(16, inverse_w))
+
+        # stage 4: dividing by (2**16) with rounding and sign.
+        rounded = Signal(12)
+        self.comb += rounded.eq(product3[16:28] + product3[15])
+
+        self.sync += \
+            If(self.ce,
+               sign1.eq(self.data < 0),
+               magnitude1.eq(Mux(self.data < 0, -self.data, self.data)),
+               inverse1.eq(self.inverse),
+
+               sign2.eq(sign1),
+               product2.eq(magnitude1*inverse1),
+
+               sign3.eq(sign2),
+               product3.eq(product2),
+
+               self.result.eq(Mux(sign3, -rounded, rounded)))
+
+
+class Quantization(PipelinedActor, Module, AutoCSR):
+    """
+    Parameters:
+    -----------
+    aan : bool
+          The input comes from a DCT using the AAN engines, the scale factors
+          of the coefficients are merged into the reciprocals.
+    runtime_tables : bool
+          Read the reciprocals from ``QuantTables`` written over CSRs instead
+          of the fixed ROM. The blocks then carry their ``component`` and the
+          chrominance table is used for the ``cb`` and ``cr`` blocks.
+    pipelined : bool
+          Use synchronous memory reads and the ``QuantizationDatapath``
+          instead of the combinational read path, one coefficient per
+          cycle is still sustained.
+    read_order : list
+          Order in which the coefficients of the block are read out, given
+          as the index of the coefficient for each output (see ``QuantZigZag``).
+    table : list
+          Quantization table of the ROM, ``quant_values`` by default. With
+          the ``pipelined`` read path, a list of tables can be given, the
+          table of each block is then selected by ``table_select`` when its
+          first coefficient is written.
+    eob : bool
+          Give the ``eob`` flag with the last non-zero coefficient of the
+          block (or the first one when all the others are zero), in the
+          output order, so that the end of block can be given right after it.
+          A coefficient is known to be quantized to a non-zero value when
+          it is written, from the ``quant_threshold`` of its table. Needs the
+          ``pipelined`` read path and the fixed ROM.
+    """
+    def __init__(self, aan=False, runtime_tables=False, pipelined=False,
+                 read_order=None, table=quant_values, eob=False):
+        assert not eob or (pipelined and not runtime_tables)
 
         # Connecting the data to the Test Bench
         # to take the input/give the output.
         # sink = Take the data for the module.
         # source = Show the output specified by the module.
-        self.sink = sink = stream.Endpoint(
-            EndpointDescription(block_layout(12)))
-        self.source = source = stream.Endpoint(
-            EndpointDescription(block_layout(12)))
+        if runtime_tables:
+            layout = tagged_block_layout(12)
+        else:
+            layout = block_layout(12)
+        self.sink = sink = stream.Endpoint(EndpointDescription(layout))
+        if eob:
+            self.source = source = stream.Endpoint(
+                                       EndpointDescription(layout + [("eob", 1)]))
+        else:
+            self.source = source = stream.Endpoint(EndpointDescription(layout))
 
         """
         Quantization ROM
@@ -49,19 +255,39 @@ class Quantization(PipelinedActor, Module):
         This provide us appropriate precision for the process.
 
         """
-        inverse = Memory(16, 2**6)
-        invese_write_port = inverse.get_port(write_capable=True)
-        inverse_read_port = inverse.get_port(async_read=True)
-        self.specials += inverse, inverse_read_port, invese_write_port
+        if isinstance(table[0], list):
+            tables = table
+        else:
+            tables = [table]
+        assert len(tables) == 1 or (pipelined and not runtime_tables)
+        self.table_select = Signal(max=max(len(tables), 2))
+
+        if runtime_tables:
+            self.submodules.tables = QuantTables(aan, sync_read=pipelined)
+            inverse_w = QuantTables.inverse_w
+        elif pipelined:
+            inverse_values = sum((quant_inverse(t, aan) for t in tables), [])
+            inverse_w = bits_for(max(inverse_values))
+            inverse = Memory(inverse_w, 64*len(tables), init=inverse_values)
+            inverse_read_port = inverse.get_port(has_re=True)
+            self.specials += inverse, inverse_read_port
+        else:
+            inverse_values = quant_inverse(table, aan)
+            inverse_w = bits_for(max(inverse_values))
+            inverse = Memory(inverse_w, 2**6)
+            invese_write_port = inverse.get_port(write_capable=True)
+            inverse_read_port = inverse.get_port(async_read=True)
+            self.specials += inverse, inverse_read_port, invese_write_port
 
-        for i in range(64):
-            self.comb += inverse[i].eq(int((2**16)/quant_values[i]))
+            for i in range(64):
+                self.comb += inverse[i].eq(inverse_values[i])
 
         # Collecting the input values from the previous module
         # and store them in a memory.
         data_mem = Memory(12, 64*2)
         data_write_port = data_mem.get_port(write_capable=True)
-        data_read_port = data_mem.get_port(async_read=True)
+        data_read_port = data_mem.get_port(async_read=not pipelined,
+                                           has_re=pipelined)
         self.specials += data_mem, data_write_port, data_read_port
 
         write_sel = Signal()
@@ -97,6 +323,19 @@ class Quantization(PipelinedActor, Module):
                       write_clr.eq(1),
                       If(write_sel != read_sel,
                          NextState("WRITE")))
+        # Table of the block stored in each half of the memory, selected
+        # with its first coefficient.
+        selects = Array(Signal(max=max(len(tables), 2)) for i in range(2))
+        write_select = Signal(max=max(len(tables), 2))
+        self.comb += \
+            If(write_count == 0,
+               write_select.eq(self.table_select)
+            ).Else(
+               write_select.eq(selects[write_sel]))
+        self.sync += \
+            If(sink.valid & sink.ready & (write_count == 0),
+               selects[write_sel].eq(self.table_select))
+
         write_fsm.act("WRITE",
                       sink.ready.eq(1),
                       If(sink.valid,
@@ -106,6 +345,42 @@ class Quantization(PipelinedActor, Module):
                             ).Else(
                                    write_inc.eq(1))))
 
+        if eob:
+            # Position of each coefficient in the output order and
+            # smallest magnitude quantized to a non-zero value.
+            if read_order is not None:
+                positions = [read_order.index(i) for i in range(64)]
+            else:
+                positions = list(range(64))
+            thresholds = quant_threshold(inverse_values)
+            position = Memory(6, 64, init=positions)
+            position_read_port = position.get_port(async_read=True)
+            threshold = Memory(bits_for(max(thresholds)), 64*len(tables),
+                               init=thresholds)
+            threshold_read_port = threshold.get_port(async_read=True)
+            self.specials += position, position_read_port, \
+                             threshold, threshold_read_port
+
+            # Position of the last non-zero coefficient of each half of
+            # the memory, updated as the coefficients are written.
+            last_nonzero = Array(Signal(6) for i in range(2))
+            magnitude = Signal(12)
+            current = Signal(6)
+            self.comb += [
+                position_read_port.adr.eq(write_count),
+                threshold_read_port.adr.eq(Cat(write_count, write_select)),
+                magnitude.eq(Mux(sink.data[11], -sink.data, sink.data)),
+                If(write_count != 0,
+                   current.eq(last_nonzero[write_sel]))
+            ]
+            self.sync += \
+                If(sink.valid & sink.ready,
+                   If((magnitude >= threshold_read_port.dat_r) &
+                      (position_read_port.dat_r > current),
+                      last_nonzero[write_sel].eq(position_read_port.dat_r)
+                   ).Else(
+                      last_nonzero[write_sel].eq(current)))
+
         # read path
         read_clr = Signal()
         read_inc = Signal()
@@ -116,67 +391,187 @@ class Quantization(PipelinedActor, Module):
                ).Elif(read_inc,
                       read_count.eq(read_count + 1))
 
-        # Divider
-        # Here is the code for the dividing the input values with
-        # the quantization values.
+        # Index in the block of the coefficient being read.
+        read_index = Signal(6)
+        if read_order is not None:
+            order = Memory(6, 64, init=read_order)
+            order_read_port = order.get_port(async_read=True)
+            self.specials += order, order_read_port
+            self.comb += [
+                order_read_port.adr.eq(read_count),
+                read_index.eq(order_read_port.dat_r)
+            ]
+        else:
+            self.comb += read_index.eq(read_count)
 
-        # Intialising variables.
-        data_temp_signed = Signal(12)
-        data_temp_unsigned = Signal(12)
-        mult_temp_unsigned = Signal(29)
-        mult_temp_unsigned_original = Signal(12)
-        mult_temp_signed_original = Signal(12)
-        mult_temp_unsigned_round = Signal(12)
-        sign = Signal(1)
+        self.comb += data_read_port.adr.eq(Cat(read_index, read_sel))
+
+        # Reciprocal of the quantization value for the current coefficient.
+        inverse_value = Signal(inverse_w)
+        if runtime_tables:
+            # Component of the block stored in each half of the memory,
+            # latched with its first coefficient.
+            component = Array(Signal(2) for i in range(2))
+            self.sync += \
+                If(sink.valid & sink.ready & (write_count == 0),
+                   component[write_sel].eq(sink.component))
+            self.comb += [
+                self.tables.index.eq(read_index),
+                self.tables.table.eq(component[read_sel] != 0),
+                self.tables.block_start.eq(read_swap),
+                inverse_value.eq(self.tables.inverse)
+            ]
+        elif pipelined:
+            self.comb += [
+                inverse_read_port.adr.eq(Cat(read_index, selects[read_sel])),
+                inverse_value.eq(inverse_read_port.dat_r)
+            ]
+        else:
+            self.comb += inverse_value.eq(inverse[read_index])
+
+        if pipelined:
+            # Pipelined read path: the memories are read synchronously
+            # (stage 0) then the coefficient goes through the datapath.
+            # The whole pipeline stalls when the output is not accepted.
+            self.submodules.datapath = datapath = \
+                QuantizationDatapath(inverse_w)
+            latency = 1 + datapath.latency
+
+            ce = Signal()
+            issue = Signal()
+            self.comb += [
+                ce.eq(~source.valid | source.ready),
+                data_read_port.re.eq(ce),
+                datapath.ce.eq(ce),
+                datapath.data.eq(data_read_port.dat_r),
+                datapath.inverse.eq(inverse_value),
+                source.data.eq(datapath.result)
+            ]
+            if runtime_tables:
+                self.comb += self.tables.re.eq(ce)
+            else:
+                self.comb += inverse_read_port.re.eq(ce)
+
+            valid = Signal(latency)
+            last = Signal(latency)
+            self.sync += \
+                If(ce,
+                   valid.eq(Cat(issue, valid[:-1])),
+                   last.eq(Cat(issue & (read_count == 63), last[:-1])))
+            self.comb += [
+                source.valid.eq(valid[-1]),
+                source.last.eq(last[-1])
+            ]
+
+            if eob:
+                eobs = Signal(latency)
+                self.sync += \
+                    If(ce,
+                       eobs.eq(Cat(issue &
+                                   (read_count == last_nonzero[read_sel]),
+                                   eobs[:-1])))
+                self.comb += source.eob.eq(eobs[-1])
+
+            if runtime_tables:
+                components = [Signal(2) for i in range(latency)]
+                self.sync += \
+                    If(ce,
+                       components[0].eq(component[read_sel]),
+                       [components[i].eq(components[i-1])
+                        for i in range(1, latency)])
+                self.comb += source.component.eq(components[-1])
+
+            self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
+            read_fsm.act("IDLE",
+                         read_clr.eq(1),
+                         If(read_sel == write_sel,
+                            read_swap.eq(1),
+                            NextState("READ")))
+            read_fsm.act("READ",
+                         issue.eq(1),
+                         If(ce,
+                            read_inc.eq(1),
+                            If(read_count == 63,
+                               NextState("IDLE"))))
+        else:
+            if runtime_tables:
+                self.comb += source.component.eq(component[read_sel])
+
+            # Divider
+            # Here is the code for the dividing the input values with
+            # the quantization values.
+
+            # Intialising variables.
+            data_temp_signed = Signal(12)
+            data_temp_unsigned = Signal(12)
+            mult_temp_unsigned = Signal(12 + max(16, inverse_w) + 1)
+            mult_temp_unsigned_original = Signal(12)
+            mult_temp_signed_original = Signal(12)
+            mult_temp_unsigned_round = Signal(12)
+            sign = Signal(1)
+
+            self.comb += [
+                # Take an input and store it in data_temp_signed with the sign.
+                # Sign because we obtain floating point value after the division
+                # process, hence the sign will help in rounding off to the nearest
+                # neighbour.
+                data_temp_signed.eq(data_read_port.dat_r),
+
+                # Getting wheather it is a positive or negative integer.
+                # sign = 1 (for negative).
+                # sign = 0 (for positive).
+                sign.eq(data_temp_signed[11]),
+
+                # Making the Input unsigned from signed.
+                # If positive :
+                # than sign == 0 , data_temp_unsigned = data_temp_signed
+                # Else if negative :
+                # than sign == 1 , data_temp_unsigned = data_temp_singed*(-1)
+                data_temp_unsigned.eq(
+                    data_temp_signed + (-2*sign*data_temp_signed)),
+
+                # Doing division with the quantization values.
+                mult_temp_unsigned.eq(data_temp_unsigned*inverse_value),
+
+                # Dividing by (2**16) intially multiplied.
+                mult_temp_unsigned_original.eq(mult_temp_unsigned[16:28]),
+
+                # Rounding the value of the output get.
+                mult_temp_unsigned_round.eq(
+                    mult_temp_unsigned_original+(mult_temp_unsigned[15])),
+
+                # Putting the sign back.
+                mult_temp_signed_original.eq(
+                    mult_temp_unsigned_round + (-2*sign*mult_temp_unsigned_round)),
+
+                # Making it at the output.
+                source.data.eq(mult_temp_signed_original)
+            ]
+
+            self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
+            read_fsm.act("IDLE",
+                         read_clr.eq(1),
+                         If(read_sel == write_sel,
+                            read_swap.eq(1),
+                            NextState("READ")))
+            read_fsm.act("READ",
+                         source.valid.eq(1),
+                         source.last.eq(read_count == 63),
+                         If(source.ready,
+                            read_inc.eq(1),
+                            If(source.last,
+                               NextState("IDLE"))))
 
-        self.comb += [
-            # Take an input and store it in data_temp_signed with the sign.
-            # Sign because we obtain floating point value after the division
-            # process, hence the sign will help in rounding off to the nearest
-            # neighbour.
-            data_temp_signed.eq(data_mem[read_count]),
-
-            # Getting wheather it is a positive or negative integer.
-            # sign = 1 (for negative).
-            # sign = 0 (for positive).
-            sign.eq(data_temp_signed[11]),
-
-            # Making the Input unsigned from signed.
-            # If positive :
-            # than sign == 0 , data_temp_unsigned = data_temp_signed
-            # Else if negative :
-            # than sign == 1 , data_temp_unsigned = data_temp_singed*(-1)
-            data_temp_unsigned.eq(
-                data_temp_signed + (-2*sign*data_temp_signed)),
-
-            # Doing division with the quantization values.
-            mult_temp_unsigned.eq(data_temp_unsigned*inverse[read_count]),
-
-            # Dividing by (2**16) intially multiplied.
-            mult_temp_unsigned_original.eq(mult_temp_unsigned[16:28]),
-
-            # Rounding the value of the output get.
-            mult_temp_unsigned_round.eq(
-                mult_temp_unsigned_original+(mult_temp_unsigned[15])),
-
-            # Putting the sign back.
-            mult_temp_signed_original.eq(
-                mult_temp_unsigned_round + (-2*sign*mult_temp_unsigned_round)),
-
-            # Making it at the output.
-            source.data.eq(mult_temp_signed_original)
-        ]
 
-        self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
-        read_fsm.act("IDLE",
-                     read_clr.eq(1),
-                     If(read_sel == write_sel,
-                        read_swap.eq(1),
-                        NextState("READ")))
-        read_fsm.act("READ",
-                     source.valid.eq(1),
-                     source.last.eq(read_count == 63),
-                     If(source.ready,
-                        read_inc.eq(1),
-                        If(source.last,
-                           NextState("IDLE"))))
+class QuantZigZag(Quantization):
+    """
+    Quantization and ZigZag in a single block buffer: the coefficients are
+    written in raster order and read out in the ``zigzag_rom`` order through
+    the pipelined multiply, saving the memory and the block of latency of a
+    separate ``ZigZag`` module.
+    """
+    def __init__(self, aan=False, runtime_tables=False, table=quant_values,
+                 eob=False):
+        Quantization.__init__(self, aan, runtime_tables,
+                              pipelined=True, read_order=zigzag_rom,
+                              table=table, eob=eob)
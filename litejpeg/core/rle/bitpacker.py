@@ -0,0 +1,185 @@
+"""
+Bit Packer Module:
+------------------
+This module packs the variable length codes of the HuffmanEncoder into the
+bytes of the entropy coded segment and gives them as words of the output
+stream.
+
+Inside the entropy coded segment, a 0x00 byte is inserted after each 0xFF
+byte so that it can not be taken as a marker. At the end of the scan, the
+last byte is completed with 1 bits.
+"""
+
+from functools import reduce
+from operator import or_, add
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+
+
+class BitPacker(Module):
+    """
+    BitPacker :
+    -----------
+    The codes go through 3 register stages followed by the word buffer,
+    all the stages advance together, so one code is taken per clock cycle
+    as long as the word buffer has room for the bytes of the code.
+
+    stage 1 : The code is appended to the bits left from the previous codes,
+              the complete bytes are given to the next stage.
+    stage 2 : The bytes are aligned, first byte first.
+    stage 3 : A 0x00 byte is inserted after each 0xFF byte.
+    buffer  : The bytes are gathered in words of ``dw`` bits. A word is only
+              given once a byte of the next one is there (or at the end of
+              the scan), so ``last`` is always on a word with bytes.
+
+    Attributes :
+    ------------
+    sink   : Code in the ``length`` LSBs of ``data``, the other bits are
+             ignored. ``last`` ends the scan: the bits are padded to a
+             byte boundary and the last word is given with ``last``.
+    source : ``bytes`` bytes in ``data``, first byte in the LSBs.
+
+    Parameters :
+    ------------
+    dw : int
+         Width of the words of the output stream (8, 32 or 64).
+    """
+    def __init__(self, dw=32, cw=26):
+        self.sink = sink = stream.Endpoint(
+                               EndpointDescription(code_layout(cw)))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(word_layout(dw)))
+
+        # # #
+
+        # Maximum number of bytes of a code (with the bits left and
+        # the padding) and after the stuffing.
+        max_bytes = (7 + cw + 7)//8
+        max_stuffed = 2*max_bytes
+        word_bytes = dw//8
+
+        ce = Signal()
+        self.comb += sink.ready.eq(ce)
+
+        # stage 1: appending the code to the bits left.
+        bits = Signal(7)
+        bits_count = Signal(3)
+
+        merged = Signal(7 + cw)
+        total = Signal(bits_for(7 + cw))
+        pad = Signal(3)
+        self.comb += [
+            merged.eq((bits << sink.length) |
+                      (sink.data & ((1 << sink.length) - 1))),
+            total.eq(bits_count + sink.length),
+            pad.eq(-total[0:3])
+        ]
+
+        data1 = Signal(8*max_bytes)
+        count1 = Signal(bits_for(max_bytes))
+        valid1 = Signal()
+        last1 = Signal()
+        self.sync += \
+            If(ce,
+               If(sink.last,
+                  # Padding with 1 bits to the byte boundary.
+                  data1.eq((merged << pad) | ((1 << pad) - 1)),
+                  count1.eq((total + pad)[3:])
+               ).Else(
+                  # The bits after the last complete byte are left.
+                  data1.eq(merged >> total[0:3]),
+                  count1.eq(total[3:])),
+               valid1.eq(sink.valid),
+               last1.eq(sink.valid & sink.last),
+               If(sink.valid,
+                  If(sink.last,
+                     bits.eq(0),
+                     bits_count.eq(0)
+                  ).Else(
+                     bits.eq(merged & ((1 << total[0:3]) - 1)),
+                     bits_count.eq(total[0:3]))))
+
+        # stage 2: aligning the bytes.
+        aligned = Signal(8*max_bytes)
+        self.comb += aligned.eq(
+            data1 << Cat(C(0, 3), max_bytes - count1))
+
+        data2 = [Signal(8) for i in range(max_bytes)]
+        count2 = Signal(bits_for(max_bytes))
+        valid2 = Signal()
+        last2 = Signal()
+        self.sync += \
+            If(ce,
+               [data2[i].eq(aligned[8*(max_bytes-i-1):8*(max_bytes-i)])
+                for i in range(max_bytes)],
+               count2.eq(count1),
+               valid2.eq(valid1),
+               last2.eq(last1))
+
+        # stage 3: byte stuffing.
+        ff = [Signal() for i in range(max_bytes)]
+        for i in range(max_bytes):
+            self.comb += ff[i].eq((data2[i] == 0xff) & (i < count2))
+        stuffed = []
+        for i in range(max_bytes):
+            position = Signal(bits_for(max_stuffed))
+            self.comb += position.eq(reduce(add, ff[:i], i))
+            stuffed.append(
+                Mux(i < count2, data2[i] << Cat(C(0, 3), position), 0))
+
+        data3 = Signal(8*max_stuffed)
+        count3 = Signal(bits_for(max_stuffed))
+        valid3 = Signal()
+        last3 = Signal()
+        self.sync += \
+            If(ce,
+               data3.eq(reduce(or_, stuffed)),
+               count3.eq(count2 + reduce(add, ff)),
+               valid3.eq(valid2),
+               last3.eq(last2))
+
+        # word buffer: always has room for the stuffed bytes of a code
+        # when at most a word is left after the output.
+        buf = Signal(8*(word_bytes + max_stuffed))
+        level = Signal(bits_for(word_bytes + max_stuffed))
+        flush = Signal()
+
+        out_bytes = Signal(bits_for(word_bytes))
+        out_level = Signal(len(level))
+        out_buf = Signal(len(buf))
+        accept = Signal()
+        self.comb += [
+            source.valid.eq((level > word_bytes) | flush),
+            source.data.eq(buf[0:dw]),
+            source.last.eq(flush & (level <= word_bytes)),
+            If(level >= word_bytes,
+               source.bytes.eq(word_bytes)
+            ).Else(
+               source.bytes.eq(level)),
+
+            If(source.valid & source.ready,
+               out_bytes.eq(source.bytes)
+            ).Else(
+               out_bytes.eq(0)),
+            out_level.eq(level - out_bytes),
+            out_buf.eq(buf >> Cat(C(0, 3), out_bytes)),
+
+            accept.eq(~flush & (out_level <= word_bytes)),
+            ce.eq(~valid3 | accept)
+        ]
+
+        self.sync += [
+            If(valid3 & accept,
+               buf.eq(out_buf | (data3 << Cat(C(0, 3), out_level))),
+               level.eq(out_level + count3)
+            ).Else(
+               buf.eq(out_buf),
+               level.eq(out_level)),
+            If(valid3 & accept & last3,
+               flush.eq(1)
+            ).Elif(source.valid & source.ready & source.last,
+               flush.eq(0))
+        ]
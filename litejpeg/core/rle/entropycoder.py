@@ -30,8 +30,17 @@ class EntropyDatapath(Module):
              required to store the amplitude.
     source : Give the output to the EntropyCoder depicting the number of bits
              required to store the amplitude.
+    latency : Number of clock cycles from the sink to the source.
+
+    Parameters:
+    -----------
+    priority_encoder : bool
+                       Compute the size with a priority encoder over the bits
+                       of the amplitude (see ``size_category``), in a single
+                       register stage, instead of the 3 stages of shifted
+                       copies of the amplitude.
     """
-    def __init__(self):
+    def __init__(self, priority_encoder=False):
 
         # Record the input and output of the Datapath.
         # sink = input
@@ -39,30 +48,38 @@ class EntropyDatapath(Module):
         self.sink = sink = Record(block_layout(12))
         self.source = source = Record(block_layout(4))
 
-        # Getting the input.
-        input_data = Signal(12)
-
-        # The values for storing the temporary values for
-        # calculating the size.
-        get_data = Array(Signal(12) for i in range(12))
-
         # Store the output.
         size = Signal(4)
 
-        # For calculating the size.
-
-        # Storing the size in the input_data.
-        self.sync += input_data.eq(sink.data)
-        # Keep on interating over the input_data and see after shifting
-        # how many bits the input_data value becomes zeros and that is the
-        # number of bits required to store the input_data.
-        for i in range(12):
-            self.sync += get_data[i].eq(input_data >> i)
-        for i in range(11,-1,-1):
-            self.sync += [
-             If(get_data[i] == 0,
-                size.eq(i))
-            ]
+        if priority_encoder:
+            self.latency = 1
+
+            # Leading one of the amplitude.
+            self.sync += size_category(sink.data, size)
+        else:
+            self.latency = datapath_latency
+
+            # Getting the input.
+            input_data = Signal(12)
+
+            # The values for storing the temporary values for
+            # calculating the size.
+            get_data = Array(Signal(12) for i in range(12))
+
+            # For calculating the size.
+
+            # Storing the size in the input_data.
+            self.sync += input_data.eq(sink.data)
+            # Keep on interating over the input_data and see after shifting
+            # how many bits the input_data value becomes zeros and that is the
+            # number of bits required to store the input_data.
+            for i in range(12):
+                self.sync += get_data[i].eq(input_data >> i)
+            for i in range(11,-1,-1):
+                self.sync += [
+                 If(get_data[i] == 0,
+                    size.eq(i))
+                ]
 
         # Connecting the source.data with the output.
         self.comb += source.data.eq(size)
@@ -83,21 +100,26 @@ class EntropyCoder(PipelinedActor, Module):
               receives input from the RLEmain containing the amplitude.
     source :  4 bits
               transmit the number of bits required to store the amplitude.
+
+    Parameters :
+    ------------
+    priority_encoder : bool
+                       Use the priority encoder of ``EntropyDatapath``.
     """
 
-    def __init__(self):
+    def __init__(self, priority_encoder=False):
         # Connecting the module to the input and the output.
         self.sink = sink = stream.Endpoint(EndpointDescription(block_layout(12)))
         self.source = source = stream.Endpoint(EndpointDescription(block_layout(4)))
 
+        # Connecting EntropyCoder submodule.
+        self.submodules.datapath = EntropyDatapath(priority_encoder)
+
         # Adding PipelineActor to provide additional clock for the module.
         # This clock is useful to compensate the latency caused by the
         # datapath to process the first input.
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
-
-        # Connecting EntropyCoder submodule.
-        self.submodules.datapath = EntropyDatapath()
+        PipelinedActor.__init__(self, self.datapath.latency)
+        self.latency = self.datapath.latency
         self.comb += self.datapath.ce.eq(self.pipe_ce)
 
         # Intialising the variables.
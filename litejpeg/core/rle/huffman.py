@@ -0,0 +1,246 @@
+"""
+Huffman Encoder Module:
+-----------------------
+This module replaces the (runlength, size, amplitude) symbols produced by the
+RLEMain module with their variable length codes: the Huffman code of the
+symbol followed by the ``size`` bits of the amplitude.
+
+The codes are stored in a memory, initialized with the standard tables of
+the JPEG specification (Annex K.3) for the luminance and the chrominance.
+"""
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+
+
+# Standard Huffman tables, given as in the DHT segment: the number of codes
+# for each length from 1 to 16 bits followed by the symbols.
+dc_luma_bits = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+dc_luma_huffval = list(range(12))
+
+dc_chroma_bits = [0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+dc_chroma_huffval = list(range(12))
+
+ac_luma_bits = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d]
+ac_luma_huffval = [
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12,
+    0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08,
+    0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16,
+    0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39,
+    0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59,
+    0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79,
+    0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98,
+    0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6,
+    0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4,
+    0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea,
+    0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa]
+
+ac_chroma_bits = [0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77]
+ac_chroma_huffval = [
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21,
+    0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91,
+    0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34,
+    0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38,
+    0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58,
+    0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78,
+    0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96,
+    0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4,
+    0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2,
+    0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9,
+    0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa]
+
+
+def huffman_codes(bits, huffval):
+    # return : dict giving the (code, length) of each symbol (Annex C).
+    codes = {}
+    code = 0
+    k = 0
+    for length in range(1, 17):
+        for i in range(bits[length-1]):
+            codes[huffval[k]] = (code, length)
+            code += 1
+            k += 1
+        code <<= 1
+    return codes
+
+
+def huffman_rom(dc_codes, ac_codes):
+    # return : content of a table of the memory, the AC codes are at the
+    # address (runlength << 4 | size) and the DC codes at 256 + size.
+    # Each entry is the code with its length in the bits 16 to 20.
+    rom = []
+    for codes in [ac_codes, dc_codes]:
+        for i in range(256):
+            code, length = codes.get(i, (0, 0))
+            rom.append((length << 16) | code)
+    return rom
+
+
+luma_rom = huffman_rom(huffman_codes(dc_luma_bits, dc_luma_huffval),
+                       huffman_codes(ac_luma_bits, ac_luma_huffval))
+chroma_rom = huffman_rom(huffman_codes(dc_chroma_bits, dc_chroma_huffval),
+                         huffman_codes(ac_chroma_bits, ac_chroma_huffval))
+
+# The first stage is the read of the memory holding the codes.
+datapath_latency = 2
+
+
+@CEInserter()
+class HuffmanDatapath(Module):
+    """
+    HuffmanDatapath :
+    -----------------
+    Appends the amplitude bits to the Huffman code read from the memory.
+    Negative amplitudes are coded as (amplitude - 1) on ``size`` bits.
+
+    Attributes:
+    -----------
+    sink   : The symbol from RLEMain, ``size`` holds the size of the
+             amplitude (recomputed for the DC coefficient).
+    code   : The entry of the memory for the symbol, one cycle later.
+    source : The variable length code, ``length`` is 0 for the entries
+             of RLEMain which are not symbols.
+    """
+    def __init__(self):
+        self.sink = sink = Record([("amplitude", 12), ("size", 4),
+                                   ("valid", 1)])
+        self.code = Signal(21)
+        self.source = source = Record(code_layout(26))
+
+        # # #
+
+        # stage 1: amplitude bits.
+        amplitude = Signal(11)
+        size = Signal(4)
+        valid = Signal()
+        self.sync += [
+            amplitude.eq(Mux(sink.amplitude[11],
+                             sink.amplitude - 1,
+                             sink.amplitude) & ((1 << sink.size) - 1)),
+            size.eq(sink.size),
+            valid.eq(sink.valid)
+        ]
+
+        # stage 2: code followed by the amplitude bits.
+        self.sync += [
+            source.data.eq((self.code[0:16] << size) | amplitude),
+            If(valid,
+               source.length.eq(self.code[16:21] + size)
+            ).Else(
+               source.length.eq(0))
+        ]
+
+
+class HuffmanEncoder(PipelinedActor, Module):
+    """
+    This module encodes the output of RLEMain, one entry per clock cycle.
+    Every entry of RLEMain gives an entry at the output, with a ``length``
+    of 0 for the ones which are not symbols, so the blocks keep their 64
+    entries and ``last``.
+
+    Attributes :
+    ------------
+    sink   : 21 bits
+             12 bits : amplitude
+             4 bits : size
+             4 bits : runlength
+             1 bit : data_valid
+    source : 26 bits of code with its length.
+    table  : Select the chrominance tables, sampled with the entries.
+
+    Parameters :
+    ------------
+    writable : bool
+               Expose ``table_port`` to load other tables in the memory
+               (address: table << 9 | dc << 8 | symbol).
+    tagged : bool
+             The entries carry the ``component`` of their block
+             (``tagged_block_layout``), which selects the tables instead of
+             ``table``.
+    """
+    def __init__(self, writable=False, tagged=False):
+        if tagged:
+            sink_layout = tagged_block_layout(21)
+        else:
+            sink_layout = block_layout(21)
+        self.sink = sink = stream.Endpoint(EndpointDescription(sink_layout))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(code_layout(26)))
+        self.table = Signal()
+        PipelinedActor.__init__(self, datapath_latency)
+        self.latency = datapath_latency
+
+        self.submodules.datapath = HuffmanDatapath()
+        self.comb += self.datapath.ce.eq(self.pipe_ce)
+
+        if tagged:
+            self.comb += self.table.eq(sink.component != 0)
+
+        amplitude = sink.data[0:12]
+        size = sink.data[12:16]
+        runlength = sink.data[16:20]
+        data_valid = sink.data[20]
+
+        # The first entry of the block is the DC coefficient.
+        count = Signal(6)
+        dc = Signal()
+        self.sync += \
+            If(sink.valid & sink.ready,
+               If(sink.last,
+                  count.eq(0)
+               ).Else(
+                  count.eq(count + 1)))
+        self.comb += dc.eq(count == 0)
+
+        # The size given with the DC coefficient is the one of the
+        # coefficient, not of its difference with the previous one.
+        magnitude = Signal(12)
+        dc_size = Signal(4)
+        self.comb += [
+            magnitude.eq(Mux(amplitude[11], -amplitude, amplitude)),
+            size_category(magnitude, dc_size)
+        ]
+
+        # Memory holding the codes.
+        mem = Memory(21, 2*512, init=luma_rom + chroma_rom)
+        read_port = mem.get_port(has_re=True)
+        self.specials += mem, read_port
+        if writable:
+            self.table_port = mem.get_port(write_capable=True)
+            self.specials += self.table_port
+
+        self.comb += [
+            read_port.re.eq(self.pipe_ce),
+            read_port.adr.eq(Cat(Mux(dc, dc_size, Cat(size, runlength)),
+                                 dc, self.table)),
+
+            self.datapath.sink.amplitude.eq(amplitude),
+            self.datapath.sink.size.eq(Mux(dc, dc_size, size)),
+            self.datapath.sink.valid.eq(data_valid),
+            self.datapath.code.eq(read_port.dat_r),
+
+            source.data.eq(self.datapath.source.data),
+            source.length.eq(self.datapath.source.length)
+        ]
@@ -55,6 +55,17 @@ class RLEDatapath(Module):
     -----------
     dovalid : indicate wheather the output data is valid or not.
 
+    component : The component of the block (0 for ``y``, 1 for ``cb`` and 2
+                for ``cr``), each component has its own previous DC
+                cofficient so the blocks of the components can be interleaved.
+
+    dc_reset : Set with the DC cofficient of the first block of a scan (or
+               of a restart interval), which is then predicted from 0.
+
+    eob : Set with the last non-zero cofficient of the block, the end of
+          block is then given with the next cofficient and the remaining
+          zeros are skipped, without (15, 0) symbols.
+
     sink : To take the input data to the Datapath module.
 
     source : To transfer the output data to the Datapath module.
@@ -69,6 +80,11 @@ class RLEDatapath(Module):
         self.source = source = Record(block_layout(18))
         self.source_inter = source_inter = Record(block_layout(18))
         self.write_cnt = Signal(6)
+        # The state is only updated for valid input data.
+        self.valid = Signal()
+        self.component = Signal(2)
+        self.eob = Signal()
+        self.dc_reset = Signal()
 
         accumulator = Signal(12)
         accumulator_temp = Signal(12)
@@ -78,10 +94,23 @@ class RLEDatapath(Module):
         self.dovalid_next_next = Signal(1)
 
         zero_count = Signal(4)
-        prev_dc_0 = Signal(12)
+        prev_dc = Array(Signal(12) for i in range(3))
+        prev_dc_0 = prev_dc[self.component]
+
+        # ended : the last non-zero cofficient of the block is passed.
+        # eob_done : the end of block is given.
+        ended = Signal()
+        eob_done = Signal()
+        self.sync += If(self.valid,
+            If(self.write_cnt == 0,
+               ended.eq(self.eob),
+               eob_done.eq(0)
+            ).Else(
+               ended.eq(ended | self.eob),
+               eob_done.eq(ended)))
 
         # For calculating the runlength values.
-        self.sync += [
+        self.sync += If(self.valid,
 
            If(self.write_cnt == 0,
               # If the write_cnt is zero then it is the starting of a new data
@@ -90,12 +119,22 @@ class RLEDatapath(Module):
               # the present value with the previous value, hence the
               # DC cofficient is been stored in the prev_dc_0.
               # After doing all making the dovalid equal to 1.
-              accumulator.eq(sink.data - prev_dc_0),
+              If(self.dc_reset,
+                 accumulator.eq(sink.data)
+              ).Else(
+                 accumulator.eq(sink.data - prev_dc_0)),
               accumulator_temp.eq(accumulator),
               prev_dc_0.eq(sink.data),
               runlength.eq(0),
+              zero_count.eq(0),
               accumulator_temp.eq(accumulator_temp + (-2)*accumulator_temp[11]*accumulator),
               self.dovalid.eq(1)
+              ).Elif(ended,
+                 # Only zeros are left, the end of block is given with
+                 # the first one.
+                 accumulator.eq(0),
+                 runlength.eq(0),
+                 self.dovalid.eq(~eob_done)
               ).Else(
                  If(sink.data == 0,
                     If(zero_count == 15,
@@ -129,7 +168,7 @@ class RLEDatapath(Module):
                        zero_count.eq(0),
                        accumulator_temp.eq(accumulator + (-2*accumulator[11]*accumulator)),
                        self.dovalid.eq(1)))
-        ]
+        )
 
         self.sync += [
             self.dovalid_next.eq(self.dovalid),
@@ -224,9 +263,18 @@ class RunLength(PipelinedActor, Module):
                 write_count.eq(write_count + 1)
             )
 
+        # Position of the coefficient in the block, counted on the
+        # coefficients entering the datapath.
+        position = Signal(6)
+        self.sync += \
+            If(sink.valid & self.pipe_ce,
+                position.eq(position + 1)
+            )
+
         # To combine the datapath into the module
         self.comb += [
-            self.datapath.write_cnt.eq(write_count),
+            self.datapath.write_cnt.eq(position),
+            self.datapath.valid.eq(sink.valid),
             self.datapath.sink.data.eq(sink.data)
         ]
 
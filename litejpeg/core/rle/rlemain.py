@@ -12,8 +12,8 @@ from litex.soc.interconnect.stream_sim import *
 
 from litejpeg.core.common import *
 
-from litejpeg.core.rle.entropycoder import EntropyCoder
-from litejpeg.core.rle.rlecore import RunLength
+from litejpeg.core.rle.entropycoder import EntropyDatapath
+from litejpeg.core.rle.rlecore import RLEDatapath
 
 
 # To keep the output in sync with the input.
@@ -21,7 +21,7 @@ from litejpeg.core.rle.rlecore import RunLength
 datapath_latency = 3
 
 
-class RLEMain(PipelinedActor, Module):
+class RLEMain(Module):
     """
     RLEMain :
     ---------
@@ -32,6 +32,11 @@ class RLEMain(PipelinedActor, Module):
     All these information is been synchronized once by the RLEmain and then
     given as an output to the next module.
 
+    The datapaths of both modules share the clock enable of a single
+    pipeline, followed by a skid buffer: ``sink.ready`` does not depend on
+    ``source.ready`` and one coefficient is taken per clock cycle under any
+    pattern of ``source.ready``.
+
     Attributes :
     ------------
     sink : 12 bits
@@ -42,39 +47,108 @@ class RLEMain(PipelinedActor, Module):
              4 bits : size
              4 bits : runlength
              1 bit : data_valid
+    restart : Sampled with the first coefficient of a block, the DC
+              coefficient of the block is predicted from 0 (first block of a
+              scan or of a restart interval).
+
+    Parameters :
+    ------------
+    tagged : bool
+             The blocks carry their ``component`` (``tagged_block_layout``),
+             given with the output, and the DC cofficients are predicted from
+             the previous block of the same component: the blocks of the
+             components can be interleaved through a single RLEMain.
+    eob : bool
+          The ``eob`` flag of the sink is set with the last non-zero
+          coefficient of the block (see ``Quantization``): the end of block
+          is given right after it and the (15, 0) symbols of the trailing
+          zeros are not given.
     """
-    def __init__(self):
-        self.sink = sink = stream.Endpoint(
-                               EndpointDescription(block_layout(12)))
+    def __init__(self, tagged=False, eob=False):
+        if tagged:
+            sink_layout = tagged_block_layout(12)
+            source_layout = tagged_block_layout(21)
+        else:
+            sink_layout = block_layout(12)
+            source_layout = block_layout(21)
+        if eob:
+            sink_layout = sink_layout + [("eob", 1)]
+        self.sink = sink = stream.Endpoint(EndpointDescription(sink_layout))
         self.source = source = stream.Endpoint(
-                                   EndpointDescription(block_layout(21)))
-        PipelinedActor.__init__(self, datapath_latency)
+                                   EndpointDescription(source_layout))
         self.latency = datapath_latency
+        self.restart = Signal()
 
-        self.submodules.rlecore = RunLength()
-        self.submodules.entropycoder = EntropyCoder()
+        self.submodules.rlecore = RLEDatapath()
+        self.submodules.entropycoder = EntropyDatapath(priority_encoder=True)
+        self.submodules.buffer = buffer = SkidBuffer(source_layout)
 
+        # The pipeline advances when its output is taken by the buffer.
+        ce = Signal()
         self.comb += [
-            # Connecting RLEcore with the test bench.
+            ce.eq(~buffer.sink.valid | buffer.sink.ready),
+            sink.ready.eq(ce),
+            self.rlecore.ce.eq(ce),
+            self.entropycoder.ce.eq(ce)
+        ]
+
+        # Position of the coefficient in the block.
+        position = Signal(6)
+        self.sync += \
+            If(sink.valid & ce,
+                position.eq(position + 1)
+            )
+
+        # valid and last go along the datapaths.
+        valid = [Signal() for i in range(datapath_latency)]
+        last = [Signal() for i in range(datapath_latency)]
+        self.sync += \
+            If(ce,
+                valid[0].eq(sink.valid),
+                last[0].eq(sink.last),
+                [valid[i].eq(valid[i-1]) for i in range(1, datapath_latency)],
+                [last[i].eq(last[i-1]) for i in range(1, datapath_latency)]
+            )
+
+        # The size is delayed to the latency of the RLEcore.
+        size = [self.entropycoder.source.data[0:4]]
+        for i in range(datapath_latency - self.entropycoder.latency):
+            size.append(Signal(4))
+            self.sync += If(ce, size[-1].eq(size[-2]))
 
+        self.comb += [
             # Transmitting data with the RLEcore.
-            self.rlecore.sink.data.eq(self.sink.data),
-            # Recieving data from the RLE core.
-            self.source.data[0:12].eq(self.rlecore.source.data[0:12]),
-            self.source.data[16:21].eq(self.rlecore.source.data[12:17]),
-            # Synchronizing the Ready and Valid signals.
-            self.rlecore.sink.valid.eq(self.sink.valid),
-            self.rlecore.source.valid.eq(self.source.valid),
-            self.rlecore.sink.ready.eq(self.sink.ready),
-            self.rlecore.source.ready.eq(self.source.ready),
-
-            # Transmitting data with the Entrohycoder.
-            self.entropycoder.sink.data.eq(self.sink.data),
-            # Recieve data from the Entrophycoder.
-            self.source.data[12:16].eq(self.entropycoder.source.data[0:4]),
-            # Synchronizing the Ready and Valid signals.
-            self.entropycoder.sink.valid.eq(self.sink.valid),
-            self.entropycoder.source.valid.eq(self.source.valid),
-            self.entropycoder.sink.ready.eq(self.sink.ready),
-            self.entropycoder.source.ready.eq(self.source.ready)
+            self.rlecore.sink.data.eq(sink.data),
+            self.rlecore.write_cnt.eq(position),
+            self.rlecore.valid.eq(sink.valid),
+            self.rlecore.dc_reset.eq(self.restart),
+
+            # Transmitting the magnitude with the Entrohycoder.
+            self.entropycoder.sink.data.eq(
+                Mux(sink.data[11], -sink.data, sink.data)),
+
+            # Combining the results.
+            buffer.sink.valid.eq(valid[-1]),
+            buffer.sink.last.eq(last[-1]),
+            buffer.sink.data[0:12].eq(self.rlecore.source.data[0:12]),
+            buffer.sink.data[12:16].eq(size[-1]),
+            buffer.sink.data[16:21].eq(self.rlecore.source.data[12:17]),
+
+            buffer.source.connect(source)
         ]
+
+        if eob:
+            self.comb += self.rlecore.eob.eq(sink.eob)
+
+        if tagged:
+            components = [Signal(2) for i in range(datapath_latency)]
+            self.sync += \
+                If(ce,
+                    components[0].eq(sink.component),
+                    [components[i].eq(components[i-1])
+                     for i in range(1, datapath_latency)]
+                )
+            self.comb += [
+                self.rlecore.component.eq(sink.component),
+                buffer.sink.component.eq(components[-1])
+            ]
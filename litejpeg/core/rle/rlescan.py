@@ -0,0 +1,192 @@
+"""
+RLE Scan Module:
+----------------
+This module gives the same (amplitude, size, runlength) symbols as RLEMain
+but takes ``lanes`` zigzagged coefficients per clock cycle and only gives
+the symbols: the zeros cost one clock cycle per ``lanes`` coefficients and
+each symbol one clock cycle, so a block of a few non-zero coefficients is
+encoded in a few clock cycles instead of 64.
+
+The first non-zero coefficient of the word is found with a priority encoder
+over the word, its runlength is the count of zeros since the previous one.
+The (15, 0) symbols are only given before a non-zero coefficient, the end of
+block when the last coefficient is zero.
+"""
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+
+
+class RLEScan(Module):
+    """
+    RLEScan :
+    ---------
+    The words of ``lanes`` coefficients are given in zigzag order, the
+    first coefficient in the LSBs, ``last`` on the last word of the block
+    (a stream of 12 bits coefficients can be converted with a
+    ``stream.Converter``).
+
+    Attributes :
+    ------------
+    sink : 12*lanes bits
+           The coefficients of the block.
+    source : 21 bits, as the output of RLEMain, ``last`` on the last
+             symbol of the block.
+             12 bits : amplitude
+             4 bits : size
+             4 bits : runlength
+             1 bit : data_valid, always set.
+    restart : Sampled with the first word of a block, the DC coefficient of
+              the block is predicted from 0 (first block of a scan or of a
+              restart interval, for each component).
+
+    Parameters :
+    ------------
+    lanes : int
+            Number of coefficients per word (4 or 8).
+    tagged : bool
+             The blocks carry their ``component`` (``tagged_block_layout``),
+             given with the symbols, and the DC coefficients are predicted
+             from the previous block of the same component.
+    """
+    def __init__(self, lanes=4, tagged=False):
+        assert lanes in [4, 8]
+        if tagged:
+            sink_layout = tagged_block_layout(12*lanes)
+            source_layout = tagged_block_layout(21)
+        else:
+            sink_layout = block_layout(12*lanes)
+            source_layout = block_layout(21)
+        self.sink = sink = stream.Endpoint(EndpointDescription(sink_layout))
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(source_layout))
+        self.restart = Signal()
+
+        # # #
+
+        self.submodules.buffer = buffer = SkidBuffer(source_layout)
+        self.comb += buffer.source.connect(source)
+
+        ce = Signal()
+        self.comb += ce.eq(~buffer.sink.valid | buffer.sink.ready)
+
+        coefficients = Array(sink.data[12*i:12*(i+1)] for i in range(lanes))
+
+        # State of the scan.
+        # first : the word holds the DC coefficient.
+        # start : first coefficient of the word not given yet.
+        # zero_count : zeros before ``start`` not given yet.
+        # eob : the end of block remains to be given.
+        first = Signal(reset=1)
+        start = Signal(max=lanes)
+        zero_count = Signal(6)
+        eob = Signal()
+        prev_dcs = Array(Signal(12) for i in range(3))
+        if tagged:
+            prev_dc = prev_dcs[sink.component]
+            self.sync += \
+                If(ce & sink.valid & ~eob,
+                    buffer.sink.component.eq(sink.component)
+                )
+        else:
+            prev_dc = prev_dcs[0]
+
+        # Non-zero coefficients from ``start``, the DC coefficient is always
+        # given.
+        nonzero = Signal(lanes)
+        for i in range(lanes):
+            self.comb += nonzero[i].eq(
+                ((coefficients[i] != 0) | (first & (i == 0))) & (i >= start))
+
+        found = Signal()
+        index = Signal(max=lanes)
+        more = Signal()
+        self.comb += found.eq(nonzero != 0)
+        for i in reversed(range(lanes)):
+            self.comb += If(nonzero[i], index.eq(i))
+        self.comb += more.eq((nonzero >> index) > 1)
+
+        runlength = Signal(7)
+        self.comb += runlength.eq(zero_count + index - start)
+
+        # Amplitude and size of the coefficient.
+        coefficient = Signal(12)
+        amplitude = Signal(12)
+        magnitude = Signal(12)
+        size = Signal(4)
+        self.comb += [
+            coefficient.eq(coefficients[index]),
+            If(first & (index == 0),
+                amplitude.eq(coefficient - Mux(self.restart, 0, prev_dc))
+            ).Else(
+                amplitude.eq(coefficient)
+            ),
+            magnitude.eq(Mux(coefficient[11], -coefficient, coefficient)),
+            size_category(magnitude, size)
+        ]
+
+        # The word is taken when all its symbols are given.
+        zrl = Signal()
+        consume = Signal()
+        self.comb += [
+            zrl.eq(found & (runlength > 15)),
+            consume.eq(sink.valid & ~eob & ~zrl & ~more),
+            sink.ready.eq(ce & consume)
+        ]
+
+        self.sync += \
+            If(ce,
+                buffer.sink.valid.eq(0),
+                buffer.sink.last.eq(0),
+                If(eob,
+                    # end of block after the last non-zero coefficient.
+                    buffer.sink.valid.eq(1),
+                    buffer.sink.last.eq(1),
+                    buffer.sink.data.eq(1 << 20),
+                    eob.eq(0)
+                ).Elif(sink.valid & zrl,
+                    # 16 zeros, the coefficient is given on the next cycle.
+                    buffer.sink.valid.eq(1),
+                    buffer.sink.data.eq((1 << 20) | (15 << 16)),
+                    zero_count.eq(runlength - 16),
+                    start.eq(index)
+                ).Elif(sink.valid & found,
+                    buffer.sink.valid.eq(1),
+                    buffer.sink.data.eq(Cat(amplitude, size, runlength[0:4],
+                                            C(1, 1))),
+                    If(first & (index == 0),
+                        prev_dc.eq(coefficient)
+                    ),
+                    If(more,
+                        zero_count.eq(0),
+                        start.eq(index + 1)
+                    ).Else(
+                        start.eq(0),
+                        first.eq(sink.last),
+                        If(sink.last,
+                            zero_count.eq(0),
+                            If(index == lanes - 1,
+                                buffer.sink.last.eq(1)
+                            ).Else(
+                                eob.eq(1)
+                            )
+                        ).Else(
+                            zero_count.eq(lanes - 1 - index)
+                        )
+                    )
+                ).Elif(sink.valid,
+                    # no symbol in the rest of the word.
+                    start.eq(0),
+                    first.eq(sink.last),
+                    If(sink.last,
+                        zero_count.eq(0),
+                        buffer.sink.valid.eq(1),
+                        buffer.sink.last.eq(1),
+                        buffer.sink.data.eq(1 << 20)
+                    ).Else(
+                        zero_count.eq(zero_count + lanes - start)
+                    )
+                )
+            )
@@ -0,0 +1,91 @@
+# MCU Scheduler
+
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+
+"""
+Interleaving the components
+---------------------------
+The blocks of the Y, Cb and Cr components come on separate streams. This
+module takes them in the order of the blocks of a MCU and gives them on a
+single stream tagged with their component, so that a single DCT ->
+quantization -> RLE -> Huffman pipeline (``tagged`` or ``runtime_tables``
+modules) encodes all the components: the quantization and Huffman tables
+and the DC prediction follow the ``component`` of the blocks.
+"""
+
+# Components of the blocks of a MCU (0 for y, 1 for cb and 2 for cr).
+mcu_blocks = {
+    "4:4:4": [0, 1, 2],
+    "4:2:2": [0, 0, 1, 2],
+    "4:2:0": [0, 0, 0, 0, 1, 2]
+}
+
+
+class MCUScheduler(Module):
+    """
+    MCUScheduler :
+    --------------
+    The blocks are given sample after sample, 64 samples per block. The Y
+    blocks of a MCU come one after another on ``sink_y`` (as given by a
+    ``LineBuffer`` with 16 lines for 4:2:0), the Cb and Cr blocks on
+    ``sink_cb`` and ``sink_cr``.
+
+    Attributes :
+    ------------
+    sink_y, sink_cb, sink_cr : ``block_layout(dw)``, ``last`` is ignored.
+    source : ``tagged_block_layout(dw)``, ``last`` on the last sample of
+             each block.
+
+    Parameters :
+    ------------
+    subsampling : str
+                  "4:4:4", "4:2:2" or "4:2:0".
+    dw : int
+         Width of the samples.
+    """
+    def __init__(self, subsampling="4:2:0", dw=8):
+        sinks = []
+        for name in ["y", "cb", "cr"]:
+            sink = stream.Endpoint(EndpointDescription(block_layout(dw)))
+            setattr(self, "sink_" + name, sink)
+            sinks.append(sink)
+        self.source = source = stream.Endpoint(
+                                   EndpointDescription(tagged_block_layout(dw)))
+
+        # # #
+
+        blocks = mcu_blocks[subsampling]
+
+        # Block of the MCU and sample of the block.
+        block = Signal(max=len(blocks))
+        count = Signal(6)
+        self.sync += \
+            If(source.valid & source.ready,
+                count.eq(count + 1),
+                If(count == 63,
+                    If(block == len(blocks) - 1,
+                        block.eq(0)
+                    ).Else(
+                        block.eq(block + 1)
+                    )
+                )
+            )
+
+        component = Signal(2)
+        self.comb += [
+            Case(block, {i: component.eq(c) for i, c in enumerate(blocks)}),
+            source.component.eq(component),
+            source.last.eq(count == 63)
+        ]
+
+        cases = {}
+        for i, sink in enumerate(sinks):
+            cases[i] = [
+                source.valid.eq(sink.valid),
+                source.data.eq(sink.data),
+                sink.ready.eq(source.ready)
+            ]
+        self.comb += Case(component, cases)
@@ -0,0 +1,117 @@
+# !/usr/bin/env python3
+# This is the module for testing the BitPacker.
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.rle.rlemain import RLEMain
+from litejpeg.core.rle.huffman import *
+from litejpeg.core.rle.bitpacker import BitPacker
+
+from common import *
+
+
+class TB(Module):
+    def __init__(self):
+        # The block is a scan on its own, so the last code of the
+        # HuffmanEncoder ends the scan in the BitPacker.
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", 12)]))
+        self.submodules.rlemain = RLEMain()
+        self.submodules.huffman = HuffmanEncoder()
+        self.submodules.bitpacker = BitPacker(32)
+
+        self.comb += [
+            self.streamer.source.connect(self.rlemain.sink),
+            self.rlemain.source.connect(self.huffman.sink),
+            self.huffman.source.connect(self.bitpacker.sink),
+            self.bitpacker.source.ready.eq(1)
+        ]
+
+
+def codes_generator(dut, codes):
+    # The codes are given directly, the last one (of 0 bits) ending the scan
+    # on a word boundary: the last word must still have bytes.
+    for i, (data, length) in enumerate(codes):
+        yield dut.sink.valid.eq(1)
+        yield dut.sink.data.eq(data)
+        yield dut.sink.length.eq(length)
+        yield dut.sink.last.eq(i == len(codes) - 1)
+        yield
+        while not (yield dut.sink.ready):
+            yield
+    yield dut.sink.valid.eq(0)
+
+
+def beats_generator(dut, output):
+    yield dut.source.ready.eq(1)
+    while True:
+        yield
+        if (yield dut.source.valid):
+            output.append(((yield dut.source.data),
+                           (yield dut.source.bytes),
+                           (yield dut.source.last)))
+            if (yield dut.source.last):
+                break
+
+
+def main_generator(dut):
+    model = RLE()
+    reference = Huffman(huffman_codes(dc_luma_bits, dc_luma_huffval),
+                        huffman_codes(ac_luma_bits, ac_luma_huffval))
+
+    # Padding with 1 bits and stuffing a 0x00 after the 0xFF bytes.
+    bits = reference.encode(model.blue_pixels_2)
+    bits += "1"*(-len(bits) % 8)
+    expected = []
+    for i in range(0, len(bits), 8):
+        expected.append(int(bits[i:i+8], 2))
+        if expected[-1] == 0xff:
+            expected.append(0x00)
+    print("Expected output:")
+    print(" ".join("%02x" % byte for byte in expected))
+
+    dut.streamer.send(Packet(model.blue_pixels_2))
+    output = []
+    while True:
+        yield
+        if (yield dut.bitpacker.source.valid):
+            data = (yield dut.bitpacker.source.data)
+            for i in range((yield dut.bitpacker.source.bytes)):
+                output.append((data >> 8*i) & 0xff)
+            if (yield dut.bitpacker.source.last):
+                break
+    print("\n")
+    print("Output of the BitPacker module:")
+    print(" ".join("%02x" % byte for byte in output))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+# Going through the main module
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys" :   [main_generator(tb),
+                   tb.streamer.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+
+    codes = [(0xab, 8), (0xcd, 8), (0xef, 8), (0x12, 8), (0, 0)]
+    dut = BitPacker(32)
+    beats = []
+    run_simulation(dut, [codes_generator(dut, codes),
+                         beats_generator(dut, beats)])
+    print("\n")
+    print("Beats of a scan ending on a word boundary (data, bytes, last):")
+    print(["%08x, %d, %d" % beat for beat in beats])
+    if beats == [(0x12efcdab, 4, 1)]:
+        print("Match")
+    else:
+        print("Mismatch")
@@ -1,5 +1,6 @@
 from PIL import Image
 
+import math
 import random
 from copy import deepcopy
 
@@ -11,6 +12,8 @@ from model.enc_frame import zigzag
 from model.enc_frame import quantize
 from model.enc_frame import rle_code
 
+from litejpeg.core.header import jfif_header, eoi
+
 class RAWImage:
     """
     This class particular used for the RGB2YCbCr module as for dividing the image into
@@ -209,7 +212,7 @@ class DCTData:
                           148, 155, 136, 155, 152, 147, 147, 136]
 
         # Expected output
-        self.output_dct = [186, -18,  15,  -9,   23,  -9, -14, 19,
+        self.output_dct = [186, -18,  15,  -9,   23,  -9, -14, -19,
                             21, -34,  26,  -9,  -11,  11,  14,  7,
                            -10, -24,  -2,   6,  -18,   3, -20, -1,
                             -8,  -5,  14, -15,   -8,  -3,  -3,  8,
@@ -269,6 +272,23 @@ class DCTData:
                 self.data[i] = -1*temp;
         print(self.data)
 
+def float_dct(block):
+    # Floating point DCT of the JPEG standard (level shifted samples).
+    result = []
+    for v in range(8):
+        for u in range(8):
+            value = 0
+            for y in range(8):
+                for x in range(8):
+                    value += ((block[8*y + x] - 128) *
+                              math.cos((2*x + 1)*u*math.pi/16) *
+                              math.cos((2*y + 1)*v*math.pi/16))
+            cu = 1/math.sqrt(2) if u == 0 else 1
+            cv = 1/math.sqrt(2) if v == 0 else 1
+            result.append(cu*cv*value/4)
+    return result
+
+
 class ZZData:
     """
     In order for the testing purpose ``zigzag_input`` input is been taken
@@ -469,3 +489,46 @@ class RLE:
             temp = temp >> 4
             if(temp):
                 print("%s,%s,%s"%(amplitude,runlength,size))
+
+
+class Huffman:
+    """
+    Reference for the HuffmanEncoder module: encodes a zigzagged block as
+    RLEMain gives it, a (15, 0) symbol for every 16 zeros and the end of block
+    only when the last coefficient is zero. The codes are returned as a
+    string of bits.
+    """
+    def __init__(self, dc_codes, ac_codes):
+        self.dc_codes = dc_codes
+        self.ac_codes = ac_codes
+
+    def amplitude(self, value):
+        size = len(bin(abs(value))) - 2 if value else 0
+        if value < 0:
+            value = value - 1
+        bits = value & (2**size - 1)
+        return size, format(bits, "0%db" % size) if size else ""
+
+    def code(self, codes, symbol):
+        code, length = codes[symbol]
+        return format(code, "0%db" % length)
+
+    def encode(self, block, prev_dc=0):
+        size, bits = self.amplitude(block[0] - prev_dc)
+        output = self.code(self.dc_codes, size) + bits
+        zero_count = 0
+        for i in range(1, 64):
+            if block[i] == 0:
+                if zero_count == 15:
+                    output += self.code(self.ac_codes, 0xf0)
+                    zero_count = 0
+                elif i == 63:
+                    output += self.code(self.ac_codes, 0x00)
+                else:
+                    zero_count += 1
+            else:
+                size, bits = self.amplitude(block[i])
+                output += self.code(self.ac_codes, (zero_count << 4) | size)
+                output += bits
+                zero_count = 0
+        return output
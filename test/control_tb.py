@@ -0,0 +1,159 @@
+# !/usr/bin/env python3
+# This is the module for testing the LiteJPEGCore.
+
+import math
+
+from PIL import Image
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs
+from litejpeg.core.control import LiteJPEGCore
+from litejpeg.core.header import jfif_header
+from litejpeg.core.quantization import quant_table, quant_values, \
+                                       chroma_quant_values
+
+from common import *
+
+"""
+Two frames of the same image are given one after another to a LiteJPEGCore
+with the qualities 50 and 90, the table of the second frame being written
+while the first one is encoded. The pixels of the second frame must be taken
+before the JFIF file of the first one ends. The JFIF files must have the
+headers of their quality, decode with PIL (the second one closer to the
+image), and their length, the number of frames and the ``frame_done`` events
+must be given by the CSRs and the interrupt (acknowledged once raised).
+"""
+
+size = 16
+qualities = [50, 90]
+
+
+def psnr(image, pixels):
+    error = 0
+    for decoded, pixel in zip(image, pixels):
+        error += sum((a - b)**2 for a, b in zip(decoded, pixel))
+    error /= 3*len(pixels)
+    return 10*math.log10(255**2/error)
+
+
+def main_generator(dut):
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+    pixels = [(raw_image.r[i], raw_image.g[i], raw_image.b[i])
+              for i in range(size*size)]
+    mcu_pixels = []
+    for by in range(size//8):
+        for bx in range(size//8):
+            for y in range(8):
+                for x in range(8):
+                    mcu_pixels.append(pixels[(by*8 + y)*size + bx*8 + x])
+
+    outputs = []
+    byte_counts = []
+    events = 0
+    acknowledged = 0
+    second_frame = False
+    overlap = False
+
+    def control_generator():
+        yield dut._width.storage.eq(size)
+        yield dut._height.storage.eq(size)
+        yield dut._table.storage.eq(0)
+        yield dut.ev.enable.storage.eq(1)
+        yield dut._enable.storage.eq(1)
+        yield
+        # The first frame is taken, the table of the second one is written.
+        while not (yield dut._busy.status):
+            yield
+        yield dut._table.storage.eq(1)
+
+    def source_generator():
+        nonlocal second_frame
+        for frame in range(len(qualities)):
+            for i, (r, g, b) in enumerate(mcu_pixels):
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.r.eq(r)
+                yield dut.sink.g.eq(g)
+                yield dut.sink.b.eq(b)
+                yield dut.sink.last.eq(i == len(mcu_pixels) - 1)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+                second_frame |= frame == 1
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        nonlocal events, acknowledged, overlap
+        output = []
+        clear = False
+        yield dut.source.ready.eq(1)
+        while len(byte_counts) < len(qualities):
+            yield
+            # The softcore acknowledges the event (a write of the pending
+            # CSR, taken on the next cycle).
+            clear = (yield dut.ev.irq) and not clear
+            if clear:
+                acknowledged += 1
+            yield dut.ev.pending.r.eq(1)
+            yield dut.ev.pending.re.eq(clear)
+            if (yield dut.ev.frame_done.trigger):
+                events += 1
+            if (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    output.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    if not outputs:
+                        overlap = second_frame
+                    outputs.append(output)
+                    output = []
+                    yield
+                    byte_counts.append((yield dut._byte_count.status))
+        yield
+        if (yield dut.ev.irq) and not clear:
+            acknowledged += 1
+        frame_count = (yield dut._frame_count.status)
+        byte_counts.append(frame_count)
+
+    run_simulation(dut, [control_generator(), source_generator(),
+                         sink_generator()])
+
+    match = True
+    frame_count = byte_counts.pop()
+    for quality, output, byte_count in zip(qualities, outputs, byte_counts):
+        tables = (quant_table(quality, quant_values),
+                  quant_table(quality, chroma_quant_values))
+        header = jfif_header(size, size, 0, tables, dri=True)
+        name = "lena_quality_{}.jpg".format(quality)
+        with open(name, "wb") as f:
+            f.write(bytes(output))
+        img = Image.open(name)
+        img.load()
+        value = psnr(list(img.getdata()), pixels)
+        print("Quality {}: {} bytes, PSNR {:.2f} dB".format(
+              quality, len(output), value))
+        match &= output[:len(header)] == header
+        match &= byte_count == len(output)
+        if quality == qualities[0]:
+            first = value
+        else:
+            match &= value > first
+    print("{} frames, {} frame_done events, {} acknowledged".format(
+          frame_count, events, acknowledged))
+    print("Second frame taken before the end of the first one: {}".format(
+          overlap))
+    match &= overlap
+    match &= frame_count == len(qualities) and events == len(qualities)
+    match &= acknowledged == len(qualities)
+    if match:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    tb = LiteJPEGCore(32, qualities)
+    main_generator(tb)
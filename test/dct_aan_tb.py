@@ -0,0 +1,96 @@
+# !/usr/bin/env python3
+# This is the module for testing the AAN DCT with its quantizer.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.new_dct6 import SerialDCT
+from litejpeg.core.quantization import Quantization, quant_values
+
+from common import DCTData, float_dct
+
+"""
+Blocks go through SerialDCT(aan=True) -> Quantization(aan=True), the scale
+factors of the AAN engines being removed by the reciprocals of the
+quantizer. With a table of 1s the output is the DCT itself, which must be
+within 1 of the floating point DCT for every coefficient (within its
+rounding and a fraction of 1 of error), as with the DCT1D engines. With the
+luminance table the output must be within 1 of the quantized floating
+point DCT.
+"""
+
+blocks = 16
+ones = [1]*64
+
+
+class TB(Module):
+    def __init__(self, aan, table):
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", 12)]))
+        self.submodules.dct = SerialDCT(aan=aan)
+        self.submodules.quantizer = Quantization(aan=aan, pipelined=True,
+                                                 table=table)
+        self.submodules.logger = PacketLogger(
+                                     EndpointDescription([("data", 12)]))
+
+        self.comb += [
+            self.streamer.source.connect(self.dct.sink),
+            self.dct.source.connect(self.quantizer.sink),
+            self.quantizer.source.connect(self.logger.sink)
+        ]
+
+
+def test_blocks():
+    random.seed(0)
+    inputs = [DCTData(64, 12).input_dct]
+    # Checkerboard, all the energy in the highest frequency.
+    inputs.append([255*((x + y) % 2) for y in range(8) for x in range(8)])
+    while len(inputs) < blocks:
+        inputs.append([random.randint(0, 255) for i in range(64)])
+    return inputs
+
+
+def main_generator(dut, inputs):
+    dut.output = []
+    for block in inputs:
+        dut.streamer.send(Packet(block))
+        yield from dut.logger.receive()
+        dut.output.append([v - 2**12 if v >= 2**11 else v
+                           for v in dut.logger.packet])
+
+
+def run(aan, table, inputs):
+    tb = TB(aan, table)
+    generators = {
+        "sys": [main_generator(tb, inputs),
+                tb.streamer.generator(),
+                tb.logger.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    return tb.output
+
+
+if __name__ == "__main__":
+    inputs = test_blocks()
+    references = [float_dct(block) for block in inputs]
+    for name, table in [("table of 1s", ones), ("luminance table", quant_values)]:
+        errors = {}
+        for aan in [False, True]:
+            outputs = run(aan, table, inputs)
+            error = 0
+            for output, reference in zip(outputs, references):
+                for i in range(64):
+                    error = max(error, abs(output[i] - reference[i]/table[i]))
+            errors[aan] = error
+        print("{}: largest error of {:.2f} with DCT1D, {:.2f} with AANDCT1D".format(
+              name, errors[False], errors[True]))
+        if errors[True] < 1:
+            print("Match")
+        else:
+            print("Mismatch")
@@ -0,0 +1,97 @@
+import random
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.new_dct6 import *
+
+from common import DCTData, float_dct
+
+"""
+Test Bench for the DCT module using the folded datapath. Blocks (the
+reference block, a checkerboard and random blocks) are sent through the
+folded datapath with 1, 2 and 4 engines and each coefficient is compared
+with the floating point DCT, the error must be within 1.
+
+Parameters:
+-----------
+
+dw : int
+     size of the block of the matrix.
+
+ds : int
+     number of blocks in the matrix.
+
+blocks : int
+     number of blocks sent for each parallelism.
+"""
+
+dw = 12
+ds = 64
+blocks = 8
+
+
+class TB(Module):
+    def __init__(self, parallelism):
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", dw)]))
+        self.submodules.DCT = DCT(folded=True, parallelism=parallelism)
+        self.submodules.logger = PacketLogger(
+                                     EndpointDescription([("data", dw)]))
+
+        self.comb += [
+            self.streamer.source.connect(self.DCT.sink),
+            self.DCT.source.connect(self.logger.sink)
+        ]
+
+
+def test_blocks():
+    random.seed(0)
+    inputs = [DCTData(ds, dw).input_dct]
+    # Checkerboard, all the energy in the highest frequency.
+    inputs.append([255*((x + y) % 2) for y in range(8) for x in range(8)])
+    while len(inputs) < blocks:
+        inputs.append([random.randint(0, 255) for i in range(64)])
+    return inputs
+
+
+def main_generator(dut, inputs):
+    dut.output = []
+    for block in inputs:
+        dut.streamer.send(Packet(block))
+        yield from dut.logger.receive()
+        dut.output.append([v - 2**dw if v >= 2**(dw-1) else v
+                           for v in dut.logger.packet])
+
+
+# Getting the main function.
+if __name__ == "__main__":
+    inputs = test_blocks()
+    references = [float_dct(block) for block in inputs]
+    for parallelism in [1, 2, 4]:
+        tb = TB(parallelism)
+        generators = {
+            "sys": [main_generator(tb, inputs),
+                    tb.streamer.generator(),
+                    tb.logger.generator()]
+        }
+        clocks = {"sys": 10}
+        run_simulation(tb, generators, clocks, vcd_name="dct.vcd")
+
+        print("\n")
+        print("{} engines, {} cycles per block".format(
+              parallelism, tb.DCT.cycles_per_block))
+        print("Reference output data")
+        print(DCTData(ds, dw).output_dct)
+        print("Output data by the DCT Module")
+        print(tb.output[0])
+        error = 0
+        for output, reference in zip(tb.output, references):
+            for i in range(64):
+                error = max(error, abs(output[i] - reference[i]))
+        print("Largest error: {:.2f}".format(error))
+        if error <= 1:
+            print("Match")
+        else:
+            print("Mismatch")
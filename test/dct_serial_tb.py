@@ -0,0 +1,137 @@
+import random
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.new_dct6 import *
+
+from common import DCTData, float_dct
+
+"""
+Test Bench for the SerialDCT module. Blocks (the reference block, a
+checkerboard and random blocks) are sent with ``lanes`` samples on each
+beat, back to back and then with random gaps at the input and a random
+``ready`` at the output. Each coefficient must be within 1 of the floating
+point DCT and ``last`` must be on the last beat of each block. The number of
+clock cycles per block is given for the back to back blocks.
+
+Parameters:
+-----------
+
+dw : int
+     size of the block of the matrix.
+
+ds : int
+     number of blocks in the matrix.
+
+blocks : int
+     number of blocks sent for each test.
+"""
+
+dw = 12
+ds = 64
+blocks = 8
+
+
+def pack(block, lanes):
+    data = []
+    for i in range(0, ds, lanes):
+        beat = 0
+        for j in range(lanes):
+            beat |= (block[i+j] & (2**dw-1)) << dw*j
+        data.append(beat)
+    return data
+
+
+def unpack(beat, lanes):
+    block = []
+    for j in range(lanes):
+        value = (beat >> dw*j) & (2**dw-1)
+        block.append(value - 2**dw if value >= 2**(dw-1) else value)
+    return block
+
+
+def test_blocks():
+    inputs = [DCTData(ds, dw).input_dct]
+    # Checkerboard, all the energy in the highest frequency.
+    inputs.append([255*((x + y) % 2) for y in range(8) for x in range(8)])
+    while len(inputs) < blocks:
+        inputs.append([random.randint(0, 255) for i in range(64)])
+    return inputs
+
+
+def run(dut, lanes, inputs, input_rate, output_rate):
+    output = []
+    cycles = []
+
+    def source_generator():
+        for block in inputs:
+            for i, beat in enumerate(pack(block, lanes)):
+                while random.random() > input_rate:
+                    yield dut.sink.valid.eq(0)
+                    yield
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(beat)
+                yield dut.sink.last.eq(i == 64//lanes - 1)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        coefs = []
+        cycle = 0
+        # The blocks lost by the module end the test after a while.
+        while len(output) < len(inputs) and cycle < 1000*len(inputs):
+            ready = random.random() < output_rate
+            yield dut.source.ready.eq(ready)
+            yield
+            cycle += 1
+            if ready and (yield dut.source.valid):
+                coefs += unpack((yield dut.source.data), lanes)
+                # last must be on the last beat of the block only.
+                if (yield dut.source.last) != (len(coefs) == 64):
+                    coefs.append(None)
+                if (yield dut.source.last) or len(coefs) > 64:
+                    output.append(coefs)
+                    cycles.append(cycle)
+                    coefs = []
+
+    run_simulation(dut, [source_generator(), sink_generator()],
+                   vcd_name="dct.vcd")
+    return output, cycles
+
+
+def check(output, references):
+    if len(output) != len(references):
+        return None
+    error = 0
+    for coefs, reference in zip(output, references):
+        if len(coefs) != 64:
+            return None
+        for i in range(64):
+            error = max(error, abs(coefs[i] - reference[i]))
+    return error
+
+
+# Getting the main function.
+if __name__ == "__main__":
+    random.seed(0)
+    inputs = test_blocks()
+    references = [float_dct(block) for block in inputs]
+    for lanes in [1, 2, 4, 8]:
+        for input_rate, output_rate in [(1, 1), (0.7, 0.6)]:
+            dut = SerialDCT(dw, lanes)
+            output, cycles = run(dut, lanes, inputs, input_rate, output_rate)
+            error = check(output, references)
+            print("{} lanes, input rate {}, output rate {}:".format(
+                  lanes, input_rate, output_rate))
+            if input_rate == 1 and output_rate == 1 and len(cycles) > 1:
+                print("Clock cycles per block: {} ({} expected)".format(
+                      (cycles[-1] - cycles[0])/(len(cycles) - 1),
+                      dut.cycles_per_block))
+            if error is None:
+                print("Mismatch")
+            else:
+                print("Largest error: {:.2f}".format(error))
+                print("Match" if error <= 1 else "Mismatch")
@@ -0,0 +1,232 @@
+# !/usr/bin/env python3
+# This is the module for testing the JPEGDMAReader.
+
+import random
+
+from PIL import Image
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs
+from litejpeg.core.dma import JPEGDMAReader, JPEGDMAWriter
+from litejpeg.core.encoder import LiteJPEGEncoder
+
+from common import *
+
+"""
+A frame of 24x16 pixels is read by the JPEGDMAReader from a larger buffer
+of 48x24 pixels in a simulated memory, with random wait states and a random
+``ready`` at the output, twice. The pixels must be given in MCU order with
+``last`` on the last one. The throughput is then measured with a memory
+acking every word.
+
+Then a 16x16 image is encoded from memory to memory (JPEGDMAReader ->
+LiteJPEGEncoder -> JPEGDMAWriter), the JFIF file written in the memory must
+be the one given by the LiteJPEGEncoder fed with the pixels directly.
+"""
+
+mem_base = 0x10000
+buffer_width = 48
+buffer_height = 24
+
+
+class SimMemory(Module):
+    """Memory acking the words of the bus when ``accept`` is set."""
+    def __init__(self, bus, base, init):
+        self.accept = Signal()
+        mem = Memory(32, len(init), init=init)
+        port = mem.get_port(async_read=True)
+        self.specials += mem, port
+        self.comb += [
+            port.adr.eq(bus.adr - base//4),
+            bus.dat_r.eq(port.dat_r),
+            bus.ack.eq(bus.cyc & bus.stb & self.accept)
+        ]
+
+
+class ReaderTB(Module):
+    def __init__(self, buffer):
+        self.submodules.reader = JPEGDMAReader()
+        self.submodules.memory = SimMemory(self.reader.bus, mem_base, buffer)
+
+
+def mcu_order(pixels, width, height):
+    output = []
+    for by in range(height//8):
+        for bx in range(width//8):
+            for y in range(8):
+                for x in range(8):
+                    output.append(pixels[(by*8 + y)*width + bx*8 + x])
+    return output
+
+
+def reader_test(frames, ack_rate, ready_rate):
+    width, height, x0, y0 = 24, 16, 8, 4
+    buffer = [random.randint(0, 2**24 - 1)
+              for i in range(buffer_width*buffer_height)]
+    frame = [buffer[(y0 + y)*buffer_width + x0 + x]
+             for y in range(height) for x in range(width)]
+    expected = [(pixel, i == width*height - 1) for i, pixel in
+                enumerate(mcu_order(frame, width, height))]
+
+    dut = ReaderTB(buffer)
+    reader = dut.reader
+    outputs = []
+    cycles = 0
+
+    def control_generator():
+        yield reader._base.storage.eq(mem_base + 4*(y0*buffer_width + x0))
+        yield reader._stride.storage.eq(4*buffer_width)
+        yield reader._width.storage.eq(width)
+        yield reader._height.storage.eq(height)
+        for n in range(frames):
+            yield reader._start.re.eq(1)
+            yield
+            yield reader._start.re.eq(0)
+            while len(outputs) < n + 1:
+                yield
+
+    def memory_generator():
+        while len(outputs) < frames:
+            yield dut.memory.accept.eq(random.random() < ack_rate)
+            yield
+
+    def sink_generator():
+        nonlocal cycles
+        output = []
+        while len(outputs) < frames:
+            ready = random.random() < ready_rate
+            yield reader.source.ready.eq(ready)
+            yield
+            cycles += 1
+            if ready and (yield reader.source.valid):
+                pixel = ((yield reader.source.r) |
+                         ((yield reader.source.g) << 8) |
+                         ((yield reader.source.b) << 16))
+                last = (yield reader.source.last)
+                output.append((pixel, last))
+                if last:
+                    outputs.append(output)
+                    output = []
+
+    run_simulation(dut, [control_generator(), memory_generator(),
+                         sink_generator()])
+
+    print("{}x{} frames, ack rate {}, ready rate {}: "
+          "{:.3f} pixel per clock cycle".format(
+          width, height, ack_rate, ready_rate,
+          frames*width*height/cycles))
+    if all(output == expected for output in outputs):
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+class EncoderTB(Module):
+    def __init__(self, buffer):
+        self.submodules.reader = JPEGDMAReader()
+        self.submodules.encoder = LiteJPEGEncoder(32, headers=True)
+        self.submodules.writer = JPEGDMAWriter(32)
+        self.submodules.memory = SimMemory(self.reader.bus, mem_base, buffer)
+        self.comb += [
+            self.reader.source.connect(self.encoder.sink),
+            self.encoder.source.connect(self.writer.sink)
+        ]
+        # The writer memory acks every word, they are collected by the
+        # generator.
+        self.comb += self.writer.bus.ack.eq(self.writer.bus.cyc &
+                                            self.writer.bus.stb)
+
+
+def run_direct(pixels, size):
+    dut = LiteJPEGEncoder(32, headers=True)
+    output = []
+
+    def generator():
+        yield dut.width.eq(size)
+        yield dut.height.eq(size)
+        yield dut.source.ready.eq(1)
+        for i, (r, g, b) in enumerate(pixels):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.r.eq(r)
+            yield dut.sink.g.eq(g)
+            yield dut.sink.b.eq(b)
+            yield dut.sink.last.eq(i == len(pixels) - 1)
+            yield
+            while not (yield dut.sink.ready):
+                yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        while True:
+            yield
+            if (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    output.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    break
+
+    run_simulation(dut, [generator(), sink_generator()])
+    return output
+
+
+def encoder_test(size):
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+    pixels = [(raw_image.r[i], raw_image.g[i], raw_image.b[i])
+              for i in range(size*size)]
+    buffer = [r | (g << 8) | (b << 16) for r, g, b in pixels]
+
+    dut = EncoderTB(buffer)
+    reader, writer = dut.reader, dut.writer
+    ring = 0x20000
+    memory = {}
+    frame_length = 0
+
+    def generator():
+        nonlocal frame_length
+        yield dut.encoder.width.eq(size)
+        yield dut.encoder.height.eq(size)
+        yield writer._base.storage.eq(ring)
+        yield writer._length.storage.eq(4096)
+        yield writer._enable.storage.eq(1)
+        yield reader._base.storage.eq(mem_base)
+        yield reader._stride.storage.eq(4*size)
+        yield reader._width.storage.eq(size)
+        yield reader._height.storage.eq(size)
+        yield dut.memory.accept.eq(1)
+        yield reader._start.re.eq(1)
+        yield
+        yield reader._start.re.eq(0)
+        while not (yield writer._frame_count.status):
+            yield
+            if (yield writer.bus.ack):
+                memory[(yield writer.bus.adr)] = (yield writer.bus.dat_w)
+        frame_length = (yield writer._frame_length.status)
+
+    run_simulation(dut, [generator()])
+
+    output = []
+    for i in range(frame_length):
+        output.append((memory[ring//4 + i//4] >> 8*(i % 4)) & 0xff)
+    expected = run_direct(mcu_order(pixels, size, size), size)
+
+    with open("lena_dma.jpg", "wb") as f:
+        f.write(bytes(output))
+    img = Image.open("lena_dma.jpg")
+    img.load()
+    print("Memory to memory: {} bytes, decoded image: {} {}x{}".format(
+          len(output), img.mode, *img.size))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    reader_test(2, 0.7, 0.7)
+    reader_test(1, 1, 1)
+    encoder_test(16)
@@ -0,0 +1,141 @@
+# !/usr/bin/env python3
+# This is the module for testing the JPEGDMAWriter.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect import wishbone
+
+from litejpeg.core.common import *
+from litejpeg.core.dma import JPEGDMAWriter
+
+"""
+Frames of random bytes, in words of 1 to 4 bytes, are written by the
+JPEGDMAWriter in a ring buffer smaller than the frames, in a simulated
+memory acking the words with random wait states. The memory must hold the
+last words written in the ring buffer (each frame padded to a word), and
+the CSRs the length of the last frame, the number of frames and the offset
+of the next word. The bursts must be made of consecutive addresses, ended
+by CTI_BURST_END.
+
+The throughput is then measured with full words and a memory acking every
+word.
+"""
+
+base = 0x1000
+length = 256
+
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.dma = JPEGDMAWriter(32, burst=8, fifo_depth=32)
+        # The memory acks the words when ``accept`` is set.
+        self.accept = Signal()
+        bus = self.dma.bus
+        self.comb += bus.ack.eq(bus.cyc & bus.stb & self.accept)
+
+
+def words_of(frame, partial):
+    words = []
+    i = 0
+    while i < len(frame):
+        n = random.randint(1, 4) if partial else 4
+        words.append(frame[i:i + n])
+        i += n
+    return words
+
+
+def main_generator(dut, frames, partial, ack_rate, source_rate):
+    dma = dut.dma
+    memory = {}
+    bursts = []
+    errors = []
+    status = {}
+    cycles = 0
+
+    # Expected ring buffer.
+    expected = {}
+    offset = 0
+    for frame in frames:
+        padded = frame + [0]*(-len(frame) % 4)
+        for i in range(0, len(padded), 4):
+            expected[base//4 + offset] = sum(byte << 8*k for k, byte in
+                                             enumerate(padded[i:i + 4]))
+            offset = (offset + 1) % (length//4)
+
+    def source_generator():
+        yield dma._base.storage.eq(base)
+        yield dma._length.storage.eq(length)
+        yield dma._enable.storage.eq(1)
+        yield
+        for frame in frames:
+            words = words_of(frame, partial)
+            for n, word in enumerate(words):
+                while random.random() > source_rate:
+                    yield dma.sink.valid.eq(0)
+                    yield
+                yield dma.sink.valid.eq(1)
+                yield dma.sink.data.eq(sum(byte << 8*k for k, byte in
+                                           enumerate(word)))
+                yield dma.sink.bytes.eq(len(word))
+                yield dma.sink.last.eq(n == len(words) - 1)
+                yield
+                while not (yield dma.sink.ready):
+                    yield
+        yield dma.sink.valid.eq(0)
+
+    def memory_generator():
+        nonlocal cycles
+        burst = []
+        while (yield dma._frame_count.status) < len(frames):
+            yield dut.accept.eq(random.random() < ack_rate)
+            yield
+            cycles += 1
+            if (yield dma.bus.ack):
+                adr = (yield dma.bus.adr)
+                memory[adr] = (yield dma.bus.dat_w)
+                if burst and adr != burst[-1] + 1:
+                    errors.append("address {:x} after {:x}".format(
+                                  adr, burst[-1]))
+                burst.append(adr)
+                cti = (yield dma.bus.cti)
+                if cti == wishbone.CTI_BURST_END:
+                    bursts.append(burst)
+                    burst = []
+                elif cti != wishbone.CTI_BURST_INCREMENTING:
+                    errors.append("cti {}".format(cti))
+        yield
+        for csr in ["offset", "frame_length", "frame_count"]:
+            status[csr] = (yield getattr(dma, "_" + csr).status)
+
+    run_simulation(dut, [source_generator(), memory_generator()])
+
+    return memory, expected, status, bursts, errors, cycles
+
+
+def check(name, dut, frames, partial, ack_rate, source_rate):
+    memory, expected, status, bursts, errors, cycles = main_generator(
+        dut, frames, partial, ack_rate, source_rate)
+
+    words = sum((len(frame) + 3)//4 for frame in frames)
+    expected_status = {
+        "offset": 4*(words % (length//4)),
+        "frame_length": len(frames[-1]),
+        "frame_count": len(frames)
+    }
+    print("{}: {} words in {} bursts, {:.3f} words per clock cycle".format(
+          name, words, len(bursts), words/cycles))
+    if memory == expected and status == expected_status and not errors:
+        print("Match")
+    else:
+        print("Mismatch", errors, status, expected_status)
+
+
+if __name__ == "__main__":
+    frames = [[random.randint(0, 255) for i in range(random.randint(50, 300))]
+              for n in range(3)]
+    check("Partial words, random wait states", TB(), frames, True, 0.7, 0.7)
+    frames = [[random.randint(0, 255) for i in range(1024)]]
+    check("Full words, no wait state", TB(), frames, False, 1, 1)
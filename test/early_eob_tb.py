@@ -0,0 +1,128 @@
+# !/usr/bin/env python3
+# This is the module for testing the early end of block.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.quantization import QuantZigZag, quant_inverse, quant_values
+from litejpeg.core.zigzag import zigzag_rom
+from litejpeg.core.rle.rlemain import RLEMain
+
+"""
+Random blocks of DCT coefficients, with the magnitudes decreasing with the
+frequency, go through QuantZigZag and RLEMain with the ``eob`` flag. The
+symbols are compared with the ones computed in python: the end of block
+follows the last non-zero coefficient, without (15, 0) symbols before it.
+"""
+
+blocks = 16
+
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.quantzigzag = QuantZigZag(eob=True)
+        self.submodules.rlemain = RLEMain(eob=True)
+        self.comb += self.quantzigzag.source.connect(self.rlemain.sink)
+
+        self.sink = self.quantzigzag.sink
+        self.source = self.rlemain.source
+
+
+def size(value):
+    return len(bin(abs(value))) - 2 if value else 0
+
+
+def quantize(block):
+    output = []
+    for i, inverse in enumerate(quant_inverse(quant_values)):
+        value = (abs(block[i])*inverse + 2**15) >> 16
+        output.append(-value if block[i] < 0 else value)
+    return [output[zigzag_rom[i]] for i in range(64)]
+
+
+def reference(block, prev_dc):
+    symbols = [((block[0] - prev_dc) & 0xfff, size(block[0]), 0)]
+    zero_count = 0
+    for i in range(1, 64):
+        if block[i] == 0:
+            zero_count += 1
+        else:
+            while zero_count > 15:
+                symbols.append((0, 0, 15))
+                zero_count -= 16
+            symbols.append((block[i] & 0xfff, size(block[i]), zero_count))
+            zero_count = 0
+    if block[63] == 0:
+        symbols.append((0, 0, 0))
+    return symbols
+
+
+def random_block():
+    block = []
+    for i in range(64):
+        limit = 1024 >> (i//8 + i%8)//2
+        block.append(random.randint(-limit, limit))
+    # A high frequency coefficient after a long run of zeros.
+    if random.random() < 0.5:
+        block[random.choice([55, 62, 63])] = random.choice([-500, 500])
+    return block
+
+
+def main_generator(dut):
+    data = [random_block() for i in range(blocks)]
+    expected = []
+    prev_dc = 0
+    for block in data:
+        quantized = quantize(block)
+        expected.append(reference(quantized, prev_dc))
+        prev_dc = quantized[0]
+
+    output = []
+    zrl = 0
+
+    def source_generator():
+        for block in data:
+            for i in range(64):
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(block[i] & 0xfff)
+                yield dut.sink.last.eq(i == 63)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        nonlocal zrl
+        symbols = []
+        while len(output) < blocks:
+            ready = random.random() < 0.8
+            yield dut.source.ready.eq(ready)
+            yield
+            if ready and (yield dut.source.valid):
+                entry = (yield dut.source.data)
+                if entry & (1 << 20):
+                    symbols.append((entry & 0xfff, (entry >> 12) & 0xf,
+                                    (entry >> 16) & 0xf))
+                    if symbols[-1] == (0, 0, 15):
+                        zrl += 1
+                if (yield dut.source.last):
+                    output.append(symbols)
+                    symbols = []
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("{} symbols, {} (15, 0) symbols".format(
+          sum(len(symbols) for symbols in output), zrl))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    tb = TB()
+    main_generator(tb)
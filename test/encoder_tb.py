@@ -0,0 +1,123 @@
+# !/usr/bin/env python3
+# This is the module for testing the LiteJPEGEncoder.
+
+import io
+import math
+
+from PIL import Image
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs
+from litejpeg.core.encoder import LiteJPEGEncoder
+
+from common import *
+
+"""
+The image is given to the encoder in MCU order, the JFIF file given by the
+encoder (with its headers) is saved as lena_encoder.jpg, which is then
+decoded with PIL. The PSNR of the decoded image must be within 0.5 dB of the
+one of the image encoded by PIL with the same tables (quality 50, 4:4:4).
+The throughput is given over the frame and while the pixels are taken.
+"""
+
+size = 32
+
+
+def psnr(image, pixels):
+    decoded = list(image.convert("RGB").getdata())
+    error = 0
+    for p, q in zip(decoded, pixels):
+        error += sum((a - b)**2 for a, b in zip(p, q))
+    return 10*math.log10(255**2*3*len(pixels)/error)
+
+
+def main_generator(dut):
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+
+    # MCU order: the pixels of each 8x8 block in raster order.
+    pixels = []
+    for by in range(size//8):
+        for bx in range(size//8):
+            for y in range(8):
+                for x in range(8):
+                    i = (by*8 + y)*size + bx*8 + x
+                    pixels.append((raw_image.r[i], raw_image.g[i],
+                                   raw_image.b[i]))
+
+    output = []
+    cycles = 0
+    taken = 0
+
+    def sink_generator():
+        nonlocal cycles
+        yield dut.source.ready.eq(1)
+        while True:
+            yield
+            cycles += 1
+            if (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    output.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    break
+
+    def source_generator():
+        nonlocal taken
+        for i, (r, g, b) in enumerate(pixels):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.r.eq(r)
+            yield dut.sink.g.eq(g)
+            yield dut.sink.b.eq(b)
+            yield dut.sink.last.eq(i == len(pixels) - 1)
+            yield
+            taken += 1
+            while not (yield dut.sink.ready):
+                yield
+                taken += 1
+        yield dut.sink.valid.eq(0)
+
+    generators = [source_generator(), sink_generator()]
+    return generators, output, lambda: (cycles, taken)
+
+
+if __name__ == "__main__":
+    tb = LiteJPEGEncoder(32, headers=True)
+    tb.comb += [
+        tb.width.eq(size),
+        tb.height.eq(size)
+    ]
+    generators, output, cycles = main_generator(tb)
+    run_simulation(tb, {"sys": generators}, {"sys": 10}, vcd_name="sim.vcd")
+
+    with open("lena_encoder.jpg", "wb") as f:
+        f.write(bytes(output))
+
+    print("JFIF file: {} bytes".format(len(output)))
+    frame_cycles, taken = cycles()
+    print("Throughput: {:.3f} pixel per clock cycle ({:.3f} while taking "
+          "the pixels)".format(size*size/frame_cycles, size*size/taken))
+
+    img = Image.open("lena_encoder.jpg")
+    img.load()
+    print("Decoded image: {} {}x{}".format(img.mode, *img.size))
+
+    # Same image encoded by PIL.
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+    pixels = list(zip(raw_image.r, raw_image.g, raw_image.b))
+    reference = Image.new("RGB", (size, size))
+    reference.putdata(pixels)
+    f = io.BytesIO()
+    reference.save(f, "JPEG", quality=50, subsampling=0)
+    f.seek(0)
+    quality = psnr(img, pixels)
+    reference_quality = psnr(Image.open(f), pixels)
+    print("PSNR: {:.2f} dB, {:.2f} dB with PIL".format(quality,
+                                                      reference_quality))
+    if quality > reference_quality - 0.5:
+        print("Match")
+    else:
+        print("Mismatch")
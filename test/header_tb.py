@@ -0,0 +1,81 @@
+# !/usr/bin/env python3
+# This is the module for testing the JFIFHeader.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.header import JFIFHeader, jfif_header, eoi
+
+"""
+Random entropy coded segments of two frames of different sizes go through
+the JFIFHeader with 8, 32 and 64 bits words and a random ``ready`` at the
+output. The files must be the headers given by ``jfif_header`` (with a DRI
+marker), the segment and the EOI marker.
+"""
+
+frames = [(64, 48, 0, 37), (1920, 1080, 240, 102)]
+
+
+def main_generator(dut, dw):
+    word_bytes = dw//8
+    segments = [[random.randint(0, 255) for i in range(length)]
+                for width, height, interval, length in frames]
+    expected = []
+    for (width, height, interval, length), segment in zip(frames, segments):
+        expected.append(jfif_header(width, height, interval, dri=True) +
+                        segment + eoi)
+
+    output = []
+
+    def source_generator():
+        for n, (width, height, interval, length) in enumerate(frames):
+            segment = segments[n]
+            yield dut.width.eq(width)
+            yield dut.height.eq(height)
+            yield dut.restart_interval.eq(interval)
+            for i in range(0, length, word_bytes):
+                word = segment[i:i + word_bytes]
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(sum(byte << 8*k
+                                           for k, byte in enumerate(word)))
+                yield dut.sink.bytes.eq(len(word))
+                yield dut.sink.last.eq(i + word_bytes >= length)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+            yield dut.sink.valid.eq(0)
+            # The fields are changed between the frames.
+            while len(output) < n + 1:
+                yield
+
+    def sink_generator():
+        file = []
+        while len(output) < len(expected):
+            ready = random.random() < 0.7
+            yield dut.source.ready.eq(ready)
+            yield
+            if ready and (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    file.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    output.append(file)
+                    file = []
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("{} bits words: {} bytes of headers".format(
+          dw, len(expected[0]) - len(segments[0]) - len(eoi)))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    for dw in [8, 32, 64]:
+        main_generator(JFIFHeader(dw), dw)
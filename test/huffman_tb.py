@@ -0,0 +1,72 @@
+# !/usr/bin/env python3
+# This is the module for testing the HuffmanEncoder.
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.rle.rlemain import RLEMain
+from litejpeg.core.rle.huffman import *
+
+from common import *
+
+
+class TB(Module):
+    def __init__(self):
+        # Streamer : gives the zigzagged block to RLEMain.
+        # The codes of the HuffmanEncoder are collected by the
+        # main generator as PacketLogger only keeps ``data``.
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", 12)]))
+        self.submodules.rlemain = RLEMain()
+        self.submodules.huffman = HuffmanEncoder()
+
+        self.comb += [
+            self.streamer.source.connect(self.rlemain.sink),
+            self.rlemain.source.connect(self.huffman.sink),
+            self.huffman.source.ready.eq(1)
+        ]
+
+
+def main_generator(dut):
+    model = RLE()
+    reference = Huffman(huffman_codes(dc_luma_bits, dc_luma_huffval),
+                        huffman_codes(ac_luma_bits, ac_luma_huffval))
+    print("The Input Module:")
+    print(model.red_pixels_1)
+    print("\n")
+    print("Expected output:")
+    expected = reference.encode(model.red_pixels_1)
+    print(expected)
+
+    dut.streamer.send(Packet(model.red_pixels_1))
+    output = ""
+    while True:
+        yield
+        if (yield dut.huffman.source.valid):
+            length = (yield dut.huffman.source.length)
+            data = (yield dut.huffman.source.data)
+            if length:
+                output += format(data, "0%db" % length)
+            if (yield dut.huffman.source.last):
+                break
+    print("\n")
+    print("Output of the HuffmanEncoder module:")
+    print(output)
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+# Going through the main module
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys" :   [main_generator(tb),
+                   tb.streamer.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
@@ -0,0 +1,79 @@
+# !/usr/bin/env python3
+# This is the module for testing the LineBuffer.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.linebuffer import LineBuffer
+
+"""
+The pixels of a 32x32 frame are given in raster order, ``r`` and ``g``
+holding the x and y of the pixel, and compared at the output with the MCU
+order, for the 8x8 and the 16x16 MCUs. The number of clock cycles the
+input was stalled is printed, first with an output always ready then with
+a random backpressure.
+"""
+
+width = 32
+height = 32
+
+
+def mcu_order(lines):
+    order = []
+    for sy in range(0, height, lines):
+        for mx in range(0, width, lines):
+            for by in range(0, lines, 8):
+                for bx in range(0, lines, 8):
+                    for y in range(8):
+                        for x in range(8):
+                            order.append((mx + bx + x, sy + by + y))
+    return order
+
+
+def main_generator(dut, lines, backpressure):
+    pixels = [(x, y) for y in range(height) for x in range(width)]
+    output = []
+    stalls = 0
+
+    def source_generator():
+        nonlocal stalls
+        for i, (x, y) in enumerate(pixels):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.r.eq(x)
+            yield dut.sink.g.eq(y)
+            yield dut.sink.last.eq(i == len(pixels) - 1)
+            yield
+            while not (yield dut.sink.ready):
+                stalls += 1
+                yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        while True:
+            ready = random.random() > 0.3 if backpressure else 1
+            yield dut.source.ready.eq(ready)
+            yield
+            if ready and (yield dut.source.valid):
+                output.append(((yield dut.source.r), (yield dut.source.g)))
+                if (yield dut.source.last):
+                    break
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("{}x{} MCUs, backpressure {}:".format(lines, lines, backpressure))
+    print("Input stalled for {} clock cycles".format(stalls))
+    if output == mcu_order(lines):
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    for lines in [8, 16]:
+        for backpressure in [False, True]:
+            main_generator(LineBuffer(rgb_layout(8), width, lines),
+                           lines, backpressure)
@@ -3,6 +3,8 @@ import numpy as np
 from itertools import groupby,chain
 import math
 
+from litejpeg.core.header import jfif_header, eoi
+
 def readRgbImageBlocks(name):
     arr = np.array(Image.open(name))
     r = arr[...,0]
@@ -187,15 +189,8 @@ if __name__ == '__main__':
     blocks_number = len(r88_blocks)
 
     fileJpeg = open("modelGenerated" + ".jpeg", "wb")
-    jpegHeaderAPP0      = [0xFF,0xD8,0xFF,0xE0,0x00,0x10,'J','F','I','F', 1,1,0,1,1,0,0]
-    jpegHeaderDQTy      = [0xFF,0xDB]+  int(len(y_quant_table)+3) + [0x01] + y_quant_table
-    jpegHeaderDQTcbcr   = [0xFF, 0xDB] + int(len(cbcr_quant_table) + 3) + [0x01] + cbcr_quant_table
-    jpegHeaderSOF0      = [0xFF, 0xc0, 17,8,64,64,3,12,2,0,2,1,1,1,3,1,1,1]
-    jpegHeaderDHT       = [0xFF, 0xC4, len(HuffmanTable)+3,0,0]
-    jpegHeaderDATA      = [0xFF, 0xDA, 12, 3,0x01,0x00,0x02,Ss,Se,AhAi]
-    'Here goes image bytes'
-    jpegHeaderEnd = [0xFF, 0xD9]
-    header = jpegHeaderAPP0 + jpegHeaderDQTy + jpegHeaderDQTcbcr + jpegHeaderSOF0 + jpegHeaderDHT + jpegHeaderDATA
+    header = jfif_header(width, height,
+                         tables=(y_quant_table, cbcr_quant_table))
     bytesToAdd = bytearray(header)
     fileJpeg.write(bytesToAdd)
 
@@ -237,5 +232,5 @@ if __name__ == '__main__':
         huffman(cb_rle)
         huffman(cr_rle)
 
-
-
+    fileJpeg.write(bytearray(eoi))
+    fileJpeg.close()
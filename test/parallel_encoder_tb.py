@@ -0,0 +1,157 @@
+# !/usr/bin/env python3
+# This is the module for testing the LiteJPEGParallelEncoder.
+
+import random
+
+from PIL import Image
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs
+from litejpeg.core.encoder import LiteJPEGEncoder, LiteJPEGParallelEncoder
+
+from common import *
+
+"""
+The rows of MCUs of the image are given to the LiteJPEGParallelEncoder with 1
+and 2 pipelines, each pipeline taking its rows on its sink at the same time
+as the others, a row per restart interval. Both entropy coded segments must
+be the same, and decode with PIL (with a DRI marker in the headers) to the
+image given by the LiteJPEGEncoder without restart markers.
+
+The throughput is then measured on a frame of noise, with more than 64 codes
+per MCU: the LiteJPEGEncoder is limited by its BitPacker (one code per clock
+cycle), the 2 pipelines must encode more than one pixel per clock cycle over
+the frame.
+"""
+
+size = 32
+
+def mcu_rows():
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+
+    # Pixels of each row of MCUs, in MCU order.
+    rows = []
+    for by in range(size//8):
+        row = []
+        for bx in range(size//8):
+            for y in range(8):
+                for x in range(8):
+                    i = (by*8 + y)*size + bx*8 + x
+                    row.append((raw_image.r[i], raw_image.g[i],
+                                raw_image.b[i]))
+        rows.append(row)
+    return rows
+
+
+def noise_rows(height):
+    random.seed(0)
+    return [[(random.randrange(256), random.randrange(256),
+              random.randrange(256)) for i in range(8*size)]
+            for row in range(height//8)]
+
+
+def run(dut, sinks, rows):
+    # Cycles of the frame and cycles until its last pixel is taken, the
+    # rows go to the sinks in turn.
+    output = []
+    cycles = 0
+    taken = 0
+
+    def sink_generator():
+        nonlocal cycles
+        yield dut.source.ready.eq(1)
+        while True:
+            yield
+            cycles += 1
+            if (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    output.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    break
+
+    def source_generator(sink, pixels, last):
+        nonlocal taken
+        cycle = 0
+        for i, (r, g, b) in enumerate(pixels):
+            yield sink.valid.eq(1)
+            yield sink.r.eq(r)
+            yield sink.g.eq(g)
+            yield sink.b.eq(b)
+            yield sink.last.eq(last and i == len(pixels) - 1)
+            yield
+            cycle += 1
+            while not (yield sink.ready):
+                yield
+                cycle += 1
+        yield sink.valid.eq(0)
+        taken = max(taken, cycle)
+
+    generators = [sink_generator()]
+    for i, sink in enumerate(sinks):
+        pixels = sum(rows[i::len(sinks)], [])
+        last = (len(rows) - 1) % len(sinks) == i
+        generators.append(source_generator(sink, pixels, last))
+    run_simulation(dut, generators)
+    return output, cycles, taken
+
+
+def decode(name, output, height=size, restart_interval=0):
+    jpeg = jfif_header(size, height, restart_interval) + output + [0xff, 0xd9]
+    with open(name, "wb") as f:
+        f.write(bytes(jpeg))
+    img = Image.open(name)
+    img.load()
+    return list(img.getdata())
+
+
+def report(name, pixels, output, cycles, taken):
+    print("{}: {} bytes, {:.3f} pixel per clock cycle ({:.3f} while "
+          "taking the pixels)".format(name, len(output), len(pixels)/cycles,
+                                      len(pixels)/taken))
+
+
+if __name__ == "__main__":
+    rows = mcu_rows()
+    pixels = sum(rows, [])
+
+    dut = LiteJPEGEncoder(32)
+    reference, cycles, taken = run(dut, [dut.sink], rows)
+    report("LiteJPEGEncoder", pixels, reference, cycles, taken)
+    image = decode("lena_reference.jpg", reference)
+
+    outputs = []
+    for n in [1, 2]:
+        dut = LiteJPEGParallelEncoder(n, size, 32)
+        output, cycles, taken = run(dut, dut.sinks, rows)
+        report("{} pipelines".format(n), pixels, output, cycles, taken)
+        outputs.append(output)
+    restart_image = decode("lena_parallel.jpg", outputs[-1],
+                           restart_interval=size//8)
+
+    print("\nNoise:")
+    height = 2*size
+    rows = noise_rows(height)
+    pixels = sum(rows, [])
+
+    dut = LiteJPEGEncoder(32)
+    output, cycles, taken = run(dut, [dut.sink], rows)
+    report("LiteJPEGEncoder", pixels, output, cycles, taken)
+    noise_image = decode("noise_reference.jpg", output, height)
+
+    dut = LiteJPEGParallelEncoder(2, size, 32)
+    output, cycles, taken = run(dut, dut.sinks, rows)
+    report("2 pipelines", pixels, output, cycles, taken)
+    throughput = len(pixels)/cycles
+    restart_noise_image = decode("noise_parallel.jpg", output, height,
+                                 size//8)
+
+    if (outputs[0] == outputs[1] and restart_image == image and
+        restart_noise_image == noise_image and throughput > 1):
+        print("Match")
+    else:
+        print("Mismatch")
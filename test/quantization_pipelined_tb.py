@@ -0,0 +1,93 @@
+# !/usr/bin/env python3
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.quantization import Quantization, quant_inverse
+
+from common import *
+
+"""
+Testbench for the pipelined Quantizer module. The block of the model and
+random blocks are given with random gaps at the input and a random ``ready``
+at the output, so the pipeline is stalled with data in all its stages. Each
+block must give its 64 quantized values with ``last`` on the last one.
+"""
+
+blocks = 16
+
+
+def quantize(block, table):
+    # Division of the block by the quantization table, using the same
+    # reciprocals and rounding as the quantizer module.
+    output = []
+    for i, inverse in enumerate(quant_inverse(table)):
+        value = (abs(block[i])*inverse + 2**15) >> 16
+        output.append(-value if block[i] < 0 else value)
+    return output
+
+
+def main_generator(dut, input_rate, output_rate):
+    model = Quantizer()
+    data = [model.quantizer_input]
+    while len(data) < blocks:
+        data.append([random.randint(-2048, 2047) for i in range(64)])
+    expected = [quantize(block, model.quantizer_table) for block in data]
+
+    output = []
+
+    def source_generator():
+        for block in data:
+            for i in range(64):
+                while random.random() > input_rate:
+                    yield dut.sink.valid.eq(0)
+                    yield
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(block[i] & 0xfff)
+                yield dut.sink.last.eq(i == 63)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        # The blocks lost by the pipeline end the test after a while.
+        values = []
+        for cycle in range(64*blocks*20):
+            if len(output) == blocks:
+                break
+            ready = random.random() < output_rate
+            yield dut.source.ready.eq(ready)
+            yield
+            if ready and (yield dut.source.valid):
+                value = (yield dut.source.data)
+                values.append(value - 2**12 if value >= 2**11 else value)
+                # last must be on the 64th value of the block only.
+                if (yield dut.source.last) != (len(values) == 64):
+                    values.append(None)
+                if (yield dut.source.last) or len(values) > 64:
+                    output.append(values)
+                    values = []
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("Input rate {}, output rate {}:".format(input_rate, output_rate))
+    print("Output of the pipelined quantizer module (first block):")
+    print(output[0])
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+# Going through the main module
+if __name__ == "__main__":
+    random.seed(0)
+    model = Quantizer()
+    print("Expected output (first block):")
+    print(quantize(model.quantizer_input, model.quantizer_table))
+    for input_rate, output_rate in [(1, 1), (1, 0.5), (0.7, 0.7), (0.5, 0.3)]:
+        main_generator(Quantization(pipelined=True), input_rate, output_rate)
@@ -0,0 +1,149 @@
+# !/usr/bin/env python3
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.quantization import Quantization, QuantTables, \
+                                       quant_inverse, quant_table
+
+from common import *
+
+
+# Testbench for the Quantizer module with the tables loaded over CSRs.
+class TB(Module):
+    def __init__(self):
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", 12)]))
+        self.submodules.quantizer = Quantization(runtime_tables=True)
+        self.submodules.logger = PacketLogger(
+                                     EndpointDescription([("data", 12)]))
+
+        # Component of the blocks sent by the streamer.
+        self.component = Signal(2)
+
+        self.comb += [
+            self.streamer.source.connect(self.quantizer.sink),
+            self.quantizer.sink.component.eq(self.component),
+            self.quantizer.source.connect(self.logger.sink,
+                                          omit={"component"})
+        ]
+
+
+def quantize(block, table):
+    # Division of the block by the quantization table, using the same
+    # reciprocals and rounding as the quantizer module.
+    output = []
+    for i, inverse in enumerate(quant_inverse(table)):
+        value = (abs(block[i])*inverse + 2**15) >> 16
+        output.append(-value if block[i] < 0 else value)
+    return output
+
+
+def write_table(dut, table, values):
+    # Writing the reciprocals of a table in the shadow bank.
+    tables = dut.quantizer.tables
+    for i, value in enumerate(quant_inverse(values)):
+        yield tables._adr.storage.eq(i + 64*table)
+        yield tables._dat.storage.eq(value)
+        yield tables._dat.re.eq(1)
+        yield
+        yield tables._dat.re.eq(0)
+        yield
+
+
+def swap(dut):
+    tables = dut.quantizer.tables
+    yield tables._swap.re.eq(1)
+    yield
+    yield tables._swap.re.eq(0)
+    yield
+
+
+def send_block(dut, component, table, name):
+    model = Quantizer()
+    yield dut.component.eq(component)
+    dut.streamer.send(Packet(model.quantizer_input))
+    yield from dut.logger.receive()
+    output = [v - 2**12 if v >= 2**11 else v for v in dut.logger.packet]
+    print("\n")
+    print(name)
+    print("Expected output:")
+    print(quantize(model.quantizer_input, table))
+    print("Output of the quantizer module:")
+    print(output)
+    if output == quantize(model.quantizer_input, table):
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+def main_generator(dut):
+    model = Quantizer()
+
+    # Default tables.
+    yield from send_block(dut, 0, model.quantizer_table, "Luminance block:")
+    yield from send_block(dut, 1, model.quantizer_cr, "Chrominance block:")
+
+    # Loading a coarser luminance table and swapping the banks.
+    coarse = [min(2*q, 255) for q in model.quantizer_table]
+    yield from write_table(dut, 0, coarse)
+    yield from write_table(dut, 1, model.quantizer_cr)
+    yield from swap(dut)
+    yield from send_block(dut, 0, coarse, "Luminance block, coarse table:")
+    yield from send_block(dut, 2, model.quantizer_cr, "Chrominance block:")
+
+    # Loading the tables of the quality 100, all the values are 1 (the
+    # reciprocal is 2**16): the blocks are given unchanged.
+    finest = quant_table(100, model.quantizer_table)
+    yield from write_table(dut, 0, finest)
+    yield from write_table(dut, 1, finest)
+    yield from swap(dut)
+    yield from send_block(dut, 0, finest, "Luminance block, quality 100:")
+
+
+def swap_generator(dut, output):
+    # A swap requested again in the cycle of the block start of a pending
+    # one: the bank must be swapped once and stay swapped.
+    yield dut._adr.storage.eq(0)
+    yield dut._dat.storage.eq(12345)
+    yield dut._dat.re.eq(1)
+    yield
+    yield dut._dat.re.eq(0)
+    yield dut._swap.re.eq(1)
+    yield
+    yield dut.block_start.eq(1)
+    yield
+    yield dut._swap.re.eq(0)
+    yield
+    for i in range(4):
+        yield dut.block_start.eq(1)
+        yield
+        yield dut.block_start.eq(0)
+        yield
+        output.append(((yield dut.inverse), (yield dut._swap_pending.status)))
+
+
+# Going through the main module
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys":   [main_generator(tb),
+                  tb.streamer.generator(),
+                  tb.logger.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+
+    dut = QuantTables()
+    output = []
+    run_simulation(dut, swap_generator(dut, output))
+    print("\n")
+    print("Swap requested with the block start of a pending swap "
+          "(reciprocal, swap_pending):")
+    print(output)
+    if output == [(12345, 0)]*4:
+        print("Match")
+    else:
+        print("Mismatch")
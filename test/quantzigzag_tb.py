@@ -0,0 +1,65 @@
+# !/usr/bin/env python3
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.quantization import QuantZigZag, quant_inverse
+
+from litejpeg.core.zigzag import zigzag_rom
+
+from common import *
+
+
+# Testbench for the QuantZigZag module.
+class TB(Module):
+    def __init__(self):
+        self.submodules.streamer = PacketStreamer(
+                                       EndpointDescription([("data", 12)]))
+        self.submodules.quantizer = QuantZigZag()
+        self.submodules.logger = PacketLogger(
+                                     EndpointDescription([("data", 12)]))
+
+        self.comb += [
+            self.streamer.source.connect(self.quantizer.sink),
+            self.quantizer.source.connect(self.logger.sink)
+        ]
+
+
+def main_generator(dut):
+    model = Quantizer()
+    expected = []
+    for i, inverse in enumerate(quant_inverse(model.quantizer_table)):
+        value = (abs(model.quantizer_input[i])*inverse + 2**15) >> 16
+        if model.quantizer_input[i] < 0:
+            value = -value
+        expected.append(value)
+    expected = [expected[zigzag_rom[i]] for i in range(64)]
+    print("Expected output:")
+    print(expected)
+
+    packet = Packet(model.quantizer_input)
+    for i in range(3):
+        dut.streamer.send(packet)
+        yield from dut.logger.receive()
+        output = [v - 2**12 if v >= 2**11 else v for v in dut.logger.packet]
+        print("\n")
+        print("Output of the QuantZigZag module:")
+        print(output)
+        if output == expected:
+            print("Match")
+        else:
+            print("Mismatch")
+
+
+# Going through the main module
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys":   [main_generator(tb),
+                  tb.streamer.generator(),
+                  tb.logger.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
@@ -0,0 +1,110 @@
+# !/usr/bin/env python3
+# This is the module for testing the restart intervals of the
+# LiteJPEGEncoder.
+
+from PIL import Image
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs
+from litejpeg.core.encoder import LiteJPEGEncoder
+
+from common import *
+
+"""
+The image is encoded without restart interval, then with restart intervals
+of 1 and 3 MCUs (two frames for the later). The RSTn markers of each frame
+must go from RST0 to RST7 then RST0 again, one between each interval, and
+the frames must decode with PIL (with a DRI marker in the headers) to the
+image given without restart interval.
+"""
+
+size = 32
+
+
+def mcu_pixels():
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", size)
+    pixels = []
+    for by in range(size//8):
+        for bx in range(size//8):
+            for y in range(8):
+                for x in range(8):
+                    i = (by*8 + y)*size + bx*8 + x
+                    pixels.append((raw_image.r[i], raw_image.g[i],
+                                   raw_image.b[i]))
+    return pixels
+
+
+def run(dut, pixels, frames):
+    outputs = []
+
+    def sink_generator():
+        output = []
+        yield dut.source.ready.eq(1)
+        while len(outputs) < frames:
+            yield
+            if (yield dut.source.valid):
+                data = (yield dut.source.data)
+                for i in range((yield dut.source.bytes)):
+                    output.append((data >> 8*i) & 0xff)
+                if (yield dut.source.last):
+                    outputs.append(output)
+                    output = []
+
+    def source_generator():
+        for n in range(frames):
+            for i, (r, g, b) in enumerate(pixels):
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.r.eq(r)
+                yield dut.sink.g.eq(g)
+                yield dut.sink.b.eq(b)
+                yield dut.sink.last.eq(i == len(pixels) - 1)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+    return outputs
+
+
+def decode(name, output, restart_interval=0):
+    jpeg = jfif_header(size, size, restart_interval) + output + [0xff, 0xd9]
+    with open(name, "wb") as f:
+        f.write(bytes(jpeg))
+    img = Image.open(name)
+    img.load()
+    return list(img.getdata())
+
+
+def markers(output):
+    # The 0xFF bytes of the entropy coded segment are followed by 0x00.
+    return [output[i + 1] for i in range(len(output) - 1)
+            if output[i] == 0xff and output[i + 1] != 0x00]
+
+
+if __name__ == "__main__":
+    pixels = mcu_pixels()
+    mcus = (size//8)**2
+
+    reference = run(LiteJPEGEncoder(32), pixels, 1)[0]
+    image = decode("lena_reference.jpg", reference)
+    print("No restart interval: {} bytes".format(len(reference)))
+
+    for interval, frames in [(1, 1), (3, 2)]:
+        outputs = run(LiteJPEGEncoder(32, restart_interval=interval),
+                      pixels, frames)
+        expected = [0xd0 + n % 8 for n in range((mcus - 1)//interval)]
+        match = True
+        for output in outputs:
+            match &= markers(output) == expected
+            match &= decode("lena_restart.jpg", output, interval) == image
+        print("Restart interval of {} MCUs: {} bytes, {} markers".format(
+              interval, len(outputs[0]), len(markers(outputs[0]))))
+        if match:
+            print("Match")
+        else:
+            print("Mismatch")
@@ -0,0 +1,104 @@
+from litex.gen import *
+from litex.soc.interconnect.stream import *
+from litex.soc.interconnect.stream_sim import *
+
+from litejpeg.core.common import *
+from litejpeg.core.csc import rgb2ycbcr_coefs, RGB2YCbCr
+
+from common import *
+
+"""
+Testbench for the multi-lane RGB2YCbCr module. Two pixels are packed on each
+beat of the stream (lane 0 in the LSBs), the same image is given to a single
+lane RGB2YCbCr and the pixels of each lane must be the ones of the single
+lane module. The resulting image is saved as lena_rgb2ycbcr_lanes.png.
+"""
+
+lanes = 2
+
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24*lanes)]))
+        self.submodules.rgb2ycbcr = RGB2YCbCr(lanes=lanes)
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24*lanes)]))
+
+        self.comb += [
+            Record.connect(self.streamer.source, self.rgb2ycbcr.sink, omit=["data"]),
+            Record.connect(self.rgb2ycbcr.source, self.logger.sink, omit=["y", "cb", "cr"])
+        ]
+        for i in range(lanes):
+            self.comb += [
+                self.rgb2ycbcr.sink.r[8*i:8*(i+1)].eq(self.streamer.source.data[24*i+16:24*i+24]),
+                self.rgb2ycbcr.sink.g[8*i:8*(i+1)].eq(self.streamer.source.data[24*i+8:24*i+16]),
+                self.rgb2ycbcr.sink.b[8*i:8*(i+1)].eq(self.streamer.source.data[24*i+0:24*i+8]),
+
+                self.logger.sink.data[24*i+16:24*i+24].eq(self.rgb2ycbcr.source.y[8*i:8*(i+1)]),
+                self.logger.sink.data[24*i+8:24*i+16].eq(self.rgb2ycbcr.source.cb[8*i:8*(i+1)]),
+                self.logger.sink.data[24*i+0:24*i+8].eq(self.rgb2ycbcr.source.cr[8*i:8*(i+1)])
+            ]
+
+        # Single lane reference.
+        self.submodules.ref_streamer = PacketStreamer(EndpointDescription([("data", 24)]))
+        self.submodules.ref_rgb2ycbcr = RGB2YCbCr()
+        self.submodules.ref_logger = PacketLogger(EndpointDescription([("data", 24)]))
+
+        self.comb += [
+            Record.connect(self.ref_streamer.source, self.ref_rgb2ycbcr.sink, omit=["data"]),
+            self.ref_rgb2ycbcr.sink.r.eq(self.ref_streamer.source.data[16:24]),
+            self.ref_rgb2ycbcr.sink.g.eq(self.ref_streamer.source.data[8:16]),
+            self.ref_rgb2ycbcr.sink.b.eq(self.ref_streamer.source.data[0:8]),
+
+            Record.connect(self.ref_rgb2ycbcr.source, self.ref_logger.sink, omit=["y", "cb", "cr"]),
+            self.ref_logger.sink.data[16:24].eq(self.ref_rgb2ycbcr.source.y),
+            self.ref_logger.sink.data[8:16].eq(self.ref_rgb2ycbcr.source.cb),
+            self.ref_logger.sink.data[0:8].eq(self.ref_rgb2ycbcr.source.cr)
+        ]
+
+
+def main_generator(dut):
+    for i in range(16):
+        yield
+
+    # convert image using the multi-lane and the single lane implementations
+    raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", 64)
+    raw_image.pack_rgb()
+    data = []
+    for i in range(0, len(raw_image.data), lanes):
+        beat = 0
+        for j in range(lanes):
+            beat |= raw_image.data[i+j] << 24*j
+        data.append(beat)
+    dut.streamer.send(Packet(data))
+    dut.ref_streamer.send(Packet(raw_image.data))
+    yield from dut.logger.receive()
+    yield from dut.ref_logger.receive()
+    data = []
+    for beat in dut.logger.packet:
+        for j in range(lanes):
+            data.append((beat >> 24*j) & 0xffffff)
+    reference = list(dut.ref_logger.packet)
+
+    for j in range(lanes):
+        print("Lane {}: {} pixels".format(j, len(data[j::lanes])))
+        if data[j::lanes] == reference[j::lanes]:
+            print("Match")
+        else:
+            print("Mismatch")
+
+    raw_image.set_data(data)
+    raw_image.unpack_ycbcr()
+    raw_image.ycbcr2rgb()
+    raw_image.save("lena_rgb2ycbcr_lanes.png")
+
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys" :   [main_generator(tb),
+                   tb.streamer.generator(),
+                   tb.logger.generator(),
+                   tb.ref_streamer.generator(),
+                   tb.ref_logger.generator()]
+    }
+    clocks = {"sys": 10}
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
@@ -14,13 +14,16 @@ Than the RGB is than converted into YCbCr matrix and than the matrix again
 converted into RGB matrix and than the image is again constructed and compared
 with the original image to check the correctness for the module.
 
+The image is also converted by a RGB2YCbCr using shift/add trees (csd=True),
+its output must be identical to the one with multipliers and be given after
+the latency of its datapath.
 """
 
 class TB(Module):
-    def __init__(self):
+    def __init__(self, use_csd=False):
         # Making pipeline for getting RGB2YCbCr module.
         self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)]))
-        self.submodules.rgb2ycbcr = RGB2YCbCr()
+        self.submodules.rgb2ycbcr = RGB2YCbCr(csd=use_csd)
         self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)]))
 
         # Combining test bench with the RGB2YCbCr module.
@@ -37,7 +40,18 @@ class TB(Module):
         ]
 
 
-def main_generator(dut):
+def latency_generator(dut):
+    # Cycles between the first pixel taken and the first pixel given.
+    while not ((yield dut.rgb2ycbcr.sink.valid) and
+               (yield dut.rgb2ycbcr.sink.ready)):
+        yield
+    dut.latency = 0
+    while not (yield dut.rgb2ycbcr.source.valid):
+        dut.latency += 1
+        yield
+
+
+def main_generator(dut, name):
     # convert image using rgb2ycbcr model
     raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", 64)
     raw_image.rgb2ycbcr_model()
@@ -56,15 +70,29 @@ def main_generator(dut):
     raw_image.set_data(dut.logger.packet)
     raw_image.unpack_ycbcr()
     raw_image.ycbcr2rgb()
-    raw_image.save("lena_rgb2ycbcr.png")
+    raw_image.save(name)
+    dut.output = list(dut.logger.packet)
 
 if __name__ == "__main__":
-    tb = TB()
-    generators = {"sys" : [main_generator(tb)]}
-    generators = {
-        "sys" :   [main_generator(tb),
-                   tb.streamer.generator(),
-                   tb.logger.generator()]
-    }
-    clocks = {"sys": 10}
-    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    tbs = []
+    for use_csd, name in [(False, "lena_rgb2ycbcr.png"), (True, "lena_rgb2ycbcr_csd.png")]:
+        tb = TB(use_csd)
+        generators = {
+            "sys" :   [main_generator(tb, name),
+                       latency_generator(tb),
+                       tb.streamer.generator(),
+                       tb.logger.generator()]
+        }
+        clocks = {"sys": 10}
+        run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+        tbs.append(tb)
+
+    tb, tb_csd = tbs
+    print("Latency: {} cycles, {} cycles with csd (datapath: {})".format(
+          tb.latency, tb_csd.latency, tb_csd.rgb2ycbcr.latency))
+    if (tb_csd.output == tb.output and len(tb.output) == 64*64 and
+        tb.latency == tb.rgb2ycbcr.latency and
+        tb_csd.latency == tb_csd.rgb2ycbcr.latency):
+        print("Match")
+    else:
+        print("Mismatch")
@@ -0,0 +1,119 @@
+# !/usr/bin/env python3
+# This is the module for testing the interleaving of the components in
+# RLEMain and RLEScan.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.rle.rlemain import RLEMain
+from litejpeg.core.rle.rlescan import RLEScan
+
+"""
+Random Y, Cb and Cr blocks are interleaved (4 Y blocks and a Cb and a Cr
+block per MCU, as for 4:2:0) through a single RLEMain and a single RLEScan,
+with a random backpressure at the output. The DC differences must be taken
+from the previous block of the same component, and the component given
+with the symbols.
+"""
+
+mcus = 4
+
+
+def size(value):
+    return len(bin(abs(value))) - 2 if value else 0
+
+
+def reference(block, prev_dc, zrl_at_end):
+    # zrl_at_end : (15, 0) symbols for all the runs of 16 zeros (RLEMain)
+    # or only before a non-zero coefficient (RLEScan).
+    symbols = [((block[0] - prev_dc) & 0xfff, size(block[0]), 0)]
+    zero_count = 0
+    for i in range(1, 64):
+        if block[i] == 0:
+            zero_count += 1
+            if zrl_at_end and zero_count == 16:
+                symbols.append((0, 0, 15))
+                zero_count = 0
+        else:
+            while zero_count > 15:
+                symbols.append((0, 0, 15))
+                zero_count -= 16
+            symbols.append((block[i] & 0xfff, size(block[i]), zero_count))
+            zero_count = 0
+    # RLEMain gives no end of block after a (15, 0) on the last coefficient.
+    if block[63] == 0 and not (zrl_at_end and zero_count == 0):
+        symbols.append((0, 0, 0))
+    return symbols
+
+
+def random_block():
+    block = [random.randint(-1024, 1023)]
+    for i in range(63):
+        if random.random() < 0.2:
+            block.append(random.randint(-1023, 1023))
+        else:
+            block.append(0)
+    return block
+
+
+def main_generator(dut, lanes):
+    data = []
+    for i in range(mcus):
+        for component in [0, 0, 0, 0, 1, 2]:
+            data.append((component, random_block()))
+    expected = []
+    prev_dc = [0, 0, 0]
+    for component, block in data:
+        symbols = reference(block, prev_dc[component], lanes == 1)
+        expected.append([(component, symbol) for symbol in symbols])
+        prev_dc[component] = block[0]
+
+    output = []
+
+    def source_generator():
+        for component, block in data:
+            for i in range(0, 64, lanes):
+                word = 0
+                for k in range(lanes):
+                    word |= (block[i + k] & 0xfff) << 12*k
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(word)
+                yield dut.sink.component.eq(component)
+                yield dut.sink.last.eq(i == 64 - lanes)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        symbols = []
+        while len(output) < len(data):
+            ready = random.random() < 0.7
+            yield dut.source.ready.eq(ready)
+            yield
+            if ready and (yield dut.source.valid):
+                entry = (yield dut.source.data)
+                if entry & (1 << 20):
+                    symbols.append(((yield dut.source.component),
+                                    (entry & 0xfff, (entry >> 12) & 0xf,
+                                     (entry >> 16) & 0xf)))
+                if (yield dut.source.last):
+                    output.append(symbols)
+                    symbols = []
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("{}:".format(dut.__class__.__name__))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    main_generator(RLEMain(tagged=True), 1)
+    main_generator(RLEScan(4, tagged=True), 4)
@@ -0,0 +1,112 @@
+# !/usr/bin/env python3
+# This is the module for testing the RLEMain under backpressure.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.rle.rlemain import RLEMain
+
+"""
+Random blocks are given to RLEMain with random gaps at the input and a
+random ``ready`` at the output. The symbols of the output (the entries
+with data_valid) are compared with the ones computed in python, and each
+block must give 64 entries with ``last`` on the last one.
+"""
+
+blocks = 16
+
+
+def size(value):
+    return len(bin(abs(value))) - 2 if value else 0
+
+
+def reference(block, prev_dc):
+    symbols = [((block[0] - prev_dc) & 0xfff, size(block[0]), 0)]
+    zero_count = 0
+    for i in range(1, 64):
+        if block[i] == 0:
+            if zero_count == 15:
+                symbols.append((0, 0, 15))
+                zero_count = 0
+            elif i == 63:
+                symbols.append((0, 0, 0))
+            else:
+                zero_count += 1
+        else:
+            symbols.append((block[i] & 0xfff, size(block[i]), zero_count))
+            zero_count = 0
+    return symbols
+
+
+def random_block():
+    block = [random.randint(-1024, 1023)]
+    for i in range(63):
+        if random.random() < 0.3:
+            block.append(random.randint(-1023, 1023))
+        else:
+            block.append(0)
+    return block
+
+
+def main_generator(dut, input_rate, output_rate):
+    data = [random_block() for i in range(blocks)]
+    expected = []
+    prev_dc = 0
+    for block in data:
+        expected.append(reference(block, prev_dc))
+        prev_dc = block[0]
+
+    output = []
+    cycles = 0
+
+    def source_generator():
+        for n, block in enumerate(data):
+            for i in range(64):
+                while random.random() > input_rate:
+                    yield dut.sink.valid.eq(0)
+                    yield
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(block[i] & 0xfff)
+                yield dut.sink.last.eq(i == 63)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        nonlocal cycles
+        symbols = []
+        count = 0
+        while len(output) < blocks:
+            ready = random.random() < output_rate
+            yield dut.source.ready.eq(ready)
+            yield
+            cycles += 1
+            if ready and (yield dut.source.valid):
+                entry = (yield dut.source.data)
+                count += 1
+                if entry & (1 << 20):
+                    symbols.append((entry & 0xfff, (entry >> 12) & 0xf,
+                                    (entry >> 16) & 0xf))
+                if (yield dut.source.last):
+                    output.append((count, symbols))
+                    symbols = []
+                    count = 0
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("Input rate {}, output rate {}: {} coefficients per clock cycle".format(
+          input_rate, output_rate, round(64*blocks/cycles, 3)))
+    if output == [(64, symbols) for symbols in expected]:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    for input_rate, output_rate in [(1, 1), (1, 0.5), (0.7, 0.7)]:
+        main_generator(RLEMain(), input_rate, output_rate)
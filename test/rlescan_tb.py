@@ -0,0 +1,109 @@
+# !/usr/bin/env python3
+# This is the module for testing the RLEScan.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.rle.rlescan import RLEScan
+
+"""
+Random blocks, from dense to sparse, are given to RLEScan with a random
+``ready`` at the output. The symbols are compared with the ones computed in
+python and the number of clock cycles per block is printed for each
+density, with 4 and 8 coefficients per word.
+"""
+
+blocks = 16
+
+
+def size(value):
+    return len(bin(abs(value))) - 2 if value else 0
+
+
+def reference(block, prev_dc):
+    symbols = [((block[0] - prev_dc) & 0xfff, size(block[0]), 0)]
+    zero_count = 0
+    for i in range(1, 64):
+        if block[i] == 0:
+            zero_count += 1
+        else:
+            while zero_count > 15:
+                symbols.append((0, 0, 15))
+                zero_count -= 16
+            symbols.append((block[i] & 0xfff, size(block[i]), zero_count))
+            zero_count = 0
+    if block[63] == 0:
+        symbols.append((0, 0, 0))
+    return symbols
+
+
+def random_block(density):
+    block = [random.randint(-1024, 1023)]
+    for i in range(63):
+        if random.random() < density:
+            block.append(random.randint(-1023, 1023))
+        else:
+            block.append(0)
+    return block
+
+
+def main_generator(dut, lanes, density, output_rate):
+    data = [random_block(density) for i in range(blocks)]
+    expected = []
+    prev_dc = 0
+    for block in data:
+        expected.append(reference(block, prev_dc))
+        prev_dc = block[0]
+
+    output = []
+    cycles = 0
+
+    def source_generator():
+        for block in data:
+            for i in range(0, 64, lanes):
+                word = 0
+                for k in range(lanes):
+                    word |= (block[i + k] & 0xfff) << 12*k
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(word)
+                yield dut.sink.last.eq(i == 64 - lanes)
+                yield
+                while not (yield dut.sink.ready):
+                    yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator():
+        nonlocal cycles
+        symbols = []
+        while len(output) < blocks:
+            ready = random.random() < output_rate
+            yield dut.source.ready.eq(ready)
+            yield
+            cycles += 1
+            if ready and (yield dut.source.valid):
+                entry = (yield dut.source.data)
+                symbols.append((entry & 0xfff, (entry >> 12) & 0xf,
+                                (entry >> 16) & 0xf))
+                if (yield dut.source.last):
+                    output.append(symbols)
+                    symbols = []
+
+    run_simulation(dut, [source_generator(), sink_generator()])
+
+    print("{} lanes, density {}, output rate {}: {} clock cycles per block".format(
+          lanes, density, output_rate, round(cycles/blocks, 1)))
+    if output == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    for lanes in [4, 8]:
+        for density in [0.5, 0.1, 0.02]:
+            main_generator(RLEScan(lanes), lanes, density, 1)
+        main_generator(RLEScan(lanes), lanes, 0.1, 0.5)
@@ -0,0 +1,132 @@
+# !/usr/bin/env python3
+# This is the module for testing the MCUScheduler.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.scheduler import MCUScheduler
+from litejpeg.core.new_dct6 import SerialDCT
+from litejpeg.core.quantization import QuantZigZag, quant_values, \
+                                       chroma_quant_values
+from litejpeg.core.rle.rlemain import RLEMain
+from litejpeg.core.rle.huffman import HuffmanEncoder
+
+"""
+The blocks of 3 MCUs in 4:2:0 go through the MCUScheduler and a single
+tagged SerialDCT -> QuantZigZag -> RLEMain -> HuffmanEncoder pipeline. The
+same blocks go through a pipeline per component, with the chrominance
+quantization and Huffman tables for Cb and Cr. The codes of each block of the
+shared pipeline must be the ones of the pipeline of its component: the tables
+and the prediction of the DC cofficients follow the component of the blocks.
+"""
+
+mcus = 3
+
+
+class Pipeline(Module):
+    def __init__(self, tagged, chroma=False):
+        self.submodules.dct = SerialDCT(tagged=tagged)
+        if tagged:
+            self.submodules.quantzigzag = QuantZigZag(runtime_tables=True)
+        elif chroma:
+            self.submodules.quantzigzag = QuantZigZag(table=chroma_quant_values)
+        else:
+            self.submodules.quantzigzag = QuantZigZag(table=quant_values)
+        self.submodules.rlemain = RLEMain(tagged=tagged)
+        self.submodules.huffman = HuffmanEncoder(tagged=tagged)
+        self.comb += [
+            self.dct.source.connect(self.quantzigzag.sink),
+            self.quantzigzag.source.connect(self.rlemain.sink),
+            self.rlemain.source.connect(self.huffman.sink)
+        ]
+        if not tagged:
+            self.comb += self.huffman.table.eq(chroma)
+        self.sink = self.dct.sink
+        self.source = self.huffman.source
+
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.scheduler = MCUScheduler("4:2:0")
+        self.submodules.shared = Pipeline(True)
+        self.comb += [
+            self.shared.sink.valid.eq(self.scheduler.source.valid),
+            self.shared.sink.last.eq(self.scheduler.source.last),
+            self.shared.sink.data.eq(self.scheduler.source.data),
+            self.shared.sink.component.eq(self.scheduler.source.component),
+            self.scheduler.source.ready.eq(self.shared.sink.ready)
+        ]
+
+        self.submodules.y = Pipeline(False)
+        self.submodules.cb = Pipeline(False, chroma=True)
+        self.submodules.cr = Pipeline(False, chroma=True)
+
+
+def feed(sink, blocks):
+    for block in blocks:
+        for i in range(64):
+            yield sink.valid.eq(1)
+            yield sink.data.eq(block[i])
+            yield sink.last.eq(i == 63)
+            yield
+            while not (yield sink.ready):
+                yield
+    yield sink.valid.eq(0)
+
+
+def collect(source, count, output):
+    # The codes of each block, without the entries of 0 bits.
+    codes = []
+    yield source.ready.eq(1)
+    while len(output) < count:
+        yield
+        if (yield source.valid):
+            length = (yield source.length)
+            if length:
+                data = (yield source.data)
+                codes.append((data & ((1 << length) - 1), length))
+            if (yield source.last):
+                output.append(codes)
+                codes = []
+
+
+def main_generator(dut):
+    blocks = {}
+    for name, count in [("y", 4*mcus), ("cb", mcus), ("cr", mcus)]:
+        blocks[name] = [[random.randint(0, 255) for i in range(64)]
+                        for n in range(count)]
+
+    shared = []
+    separate = {"y": [], "cb": [], "cr": []}
+    generators = [collect(dut.shared.source, 6*mcus, shared)]
+    for name in ["y", "cb", "cr"]:
+        generators += [
+            feed(getattr(dut.scheduler, "sink_" + name), blocks[name]),
+            feed(getattr(dut, name).sink, blocks[name]),
+            collect(getattr(dut, name).source, len(blocks[name]),
+                    separate[name])
+        ]
+    run_simulation(dut, generators)
+
+    expected = []
+    for n in range(mcus):
+        for i in range(4):
+            expected.append(separate["y"][4*n + i])
+        expected.append(separate["cb"][n])
+        expected.append(separate["cr"][n])
+
+    print("Codes of the blocks:")
+    print([len(codes) for codes in shared])
+    if shared == expected:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    tb = TB()
+    main_generator(tb)
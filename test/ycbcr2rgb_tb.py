@@ -7,10 +7,17 @@ from litejpeg.core.csc import ycbcr2rgb_coefs, YCbCr2RGB
 
 from common import *
 
+"""
+The image is converted to YCbCr, then back to RGB by the YCbCr2RGB module with
+multipliers and with shift/add trees (csd=True). The outputs must be identical
+and be given after the latency of the datapaths. The canonical signed digit
+recoding of the coefficients (some of them negative) is checked first.
+"""
+
 class TB(Module):
-    def __init__(self):
+    def __init__(self, use_csd=False):
         self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)]))
-        self.submodules.ycbcr2rgb = YCbCr2RGB()
+        self.submodules.ycbcr2rgb = YCbCr2RGB(csd=use_csd)
         self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)]))
 
         self.comb += [
@@ -25,7 +32,32 @@ class TB(Module):
             self.logger.sink.data[0:8].eq(self.ycbcr2rgb.source.b)
         ]
 
-def main_generator(dut):
+def csd_check():
+    # The digits must give the value back, without two adjacent non-zero digits.
+    values = list(range(-1024, 1025))
+    values += [v for v in ycbcr2rgb_coefs(8, 8).values()]
+    for value in values:
+        digits = csd(value)
+        shifts = [shift for shift, sign in digits]
+        if sum(sign << shift for shift, sign in digits) != value:
+            return False
+        if any(b - a < 2 for a, b in zip(shifts, shifts[1:])):
+            return False
+    return True
+
+
+def latency_generator(dut):
+    # Cycles between the first pixel taken and the first pixel given.
+    while not ((yield dut.ycbcr2rgb.sink.valid) and
+               (yield dut.ycbcr2rgb.sink.ready)):
+        yield
+    dut.latency = 0
+    while not (yield dut.ycbcr2rgb.source.valid):
+        dut.latency += 1
+        yield
+
+
+def main_generator(dut, name):
     # convert image using ycbcr2rgb model
     raw_image = RAWImage(ycbcr2rgb_coefs(8), "lena.png", 64)
     raw_image.rgb2ycbcr()
@@ -44,16 +76,33 @@ def main_generator(dut):
     yield from dut.logger.receive()
     raw_image.set_data(dut.logger.packet)
     raw_image.unpack_rgb()
-    raw_image.save("lena_ycbcr2rgb.png")
+    raw_image.save(name)
+    dut.output = list(dut.logger.packet)
 
 
 if __name__ == "__main__":
-    tb = TB()
-    generators = {"sys" : [main_generator(tb)]}
-    generators = {
-        "sys" :   [main_generator(tb),
-                   tb.streamer.generator(),
-                   tb.logger.generator()]
-    }
-    clocks = {"sys": 10}
-    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    print("CSD recoding:")
+    print("Match" if csd_check() else "Mismatch")
+
+    tbs = []
+    for use_csd, name in [(False, "lena_ycbcr2rgb.png"), (True, "lena_ycbcr2rgb_csd.png")]:
+        tb = TB(use_csd)
+        generators = {
+            "sys" :   [main_generator(tb, name),
+                       latency_generator(tb),
+                       tb.streamer.generator(),
+                       tb.logger.generator()]
+        }
+        clocks = {"sys": 10}
+        run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+        tbs.append(tb)
+
+    tb, tb_csd = tbs
+    print("Latency: {} cycles, {} cycles with csd (datapath: {})".format(
+          tb.latency, tb_csd.latency, tb_csd.ycbcr2rgb.latency))
+    if (tb_csd.output == tb.output and len(tb.output) == 64*64 and
+        tb.latency == tb.ycbcr2rgb.latency and
+        tb_csd.latency == tb_csd.ycbcr2rgb.latency):
+        print("Match")
+    else:
+        print("Mismatch")
@@ -0,0 +1,90 @@
+# !/usr/bin/env python3
+# This is the module for testing the YCbCr444to420 module.
+
+import random
+
+from litex.gen import *
+
+from litex.soc.interconnect.stream import *
+
+from litejpeg.core.common import *
+from litejpeg.core.crs import YCbCr444to420
+
+from common import *
+
+"""
+A 32x32 image of lena is converted in YCbCr and given in raster order with
+a random backpressure on each of the outputs. The Y plane must be the one
+of the image, the Cb and Cr planes the means of the 2x2 pixels computed in
+python, with a quarter of the samples of the Y plane each.
+"""
+
+size = 32
+
+
+def reference(raw_image):
+    planes = {"y": list(raw_image.y), "cb": [], "cr": []}
+    for name, component in [("cb", raw_image.cb), ("cr", raw_image.cr)]:
+        for l in range(0, size, 2):
+            for x in range(0, size, 2):
+                i = l*size + x
+                square = [i, i + 1, i + size, i + size + 1]
+                planes[name].append(
+                    (sum(component[k] for k in square) + 2) >> 2)
+    return planes
+
+
+def main_generator(dut):
+    raw_image = RAWImage(None, "lena.png", size)
+    raw_image.rgb2ycbcr()
+    planes = {"y": [], "cb": [], "cr": []}
+    lasts = {"y": 0, "cb": 0, "cr": 0}
+    cycles = 0
+
+    def source_generator():
+        for i in range(size*size):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.y.eq(raw_image.y[i])
+            yield dut.sink.cb.eq(raw_image.cb[i])
+            yield dut.sink.cr.eq(raw_image.cr[i])
+            yield dut.sink.last.eq(i == size*size - 1)
+            yield
+            while not (yield dut.sink.ready):
+                yield
+        yield dut.sink.valid.eq(0)
+
+    def sink_generator(name):
+        nonlocal cycles
+        source = getattr(dut, "source_" + name)
+        count = 0
+        while True:
+            ready = random.random() > 0.2
+            yield source.ready.eq(ready)
+            yield
+            count += 1
+            if ready and (yield source.valid):
+                planes[name].append((yield source.data))
+                if (yield source.last):
+                    lasts[name] = len(planes[name])
+                    break
+        cycles = max(cycles, count)
+
+    run_simulation(dut, [source_generator(), sink_generator("y"),
+                         sink_generator("cb"), sink_generator("cr")],
+                   vcd_name="sim.vcd")
+
+    print("{} clock cycles, Y: {} samples, Cb: {} samples, Cr: {} samples".format(
+          cycles, len(planes["y"]), len(planes["cb"]), len(planes["cr"])))
+    match = planes == reference(raw_image)
+    for name in ["cb", "cr"]:
+        match &= 4*len(planes[name]) == len(planes["y"])
+    for name in ["y", "cb", "cr"]:
+        match &= lasts[name] == len(planes[name])
+    if match:
+        print("Match")
+    else:
+        print("Mismatch")
+
+
+if __name__ == "__main__":
+    main_generator(YCbCr444to420(8, size))